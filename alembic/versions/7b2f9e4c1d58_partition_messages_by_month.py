@@ -0,0 +1,107 @@
+"""partition messages by month on created_at
+
+Revision ID: 7b2f9e4c1d58
+Revises: e93b6f0c4a71
+Create Date: 2026-10-18 14:02:51.318277
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitions import create_message_partitions, maintain_message_partitions
+from app.db.types import LTree
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2f9e4c1d58'
+down_revision: Union[str, None] = 'e93b6f0c4a71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    'id, content, message_type, chat_id, sender_id, parent_message_id, branch_path, '
+    'branch_level, is_branch_root, created_at, updated_at, deleted_at'
+)
+
+
+def create_indexes() -> None:
+    op.create_index('ix_messages_chat_id_created_at_id', 'messages', ['chat_id', 'created_at', 'id'])
+    op.create_index('ix_messages_branch_path', 'messages', ['branch_path'], postgresql_using='gist')
+
+
+def set_aside_messages() -> None:
+    """Rename the current table out of the way, freeing its index and key names."""
+    op.drop_index('ix_messages_branch_path', table_name='messages')
+    op.drop_index('ix_messages_chat_id_created_at_id', table_name='messages')
+    op.rename_table('messages', 'messages_old')
+    op.execute('ALTER TABLE messages_old RENAME CONSTRAINT messages_pkey TO messages_old_pkey')
+
+
+def upgrade() -> None:
+    set_aside_messages()
+    # Partition keys must be part of the primary key and can't be NULL
+    op.execute('UPDATE messages_old SET created_at = coalesce(updated_at, now()) WHERE created_at IS NULL')
+
+    op.create_table(
+        'messages',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('message_type', sa.String(), nullable=False),
+        sa.Column('chat_id', sa.UUID(), nullable=False),
+        sa.Column('sender_id', sa.UUID(), nullable=False),
+        # No self-reference: a foreign key into a partitioned table would have to include created_at
+        sa.Column('parent_message_id', sa.UUID(), nullable=True),
+        sa.Column('branch_path', LTree(), nullable=True),
+        sa.Column('branch_level', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('is_branch_root', sa.Boolean(), server_default='false', nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['chat_id'], ['chats.id']),
+        sa.ForeignKeyConstraint(['sender_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+
+    connection = op.get_bind()
+    first = connection.execute(sa.text('SELECT min(created_at) FROM messages_old')).scalar()
+    last = connection.execute(sa.text('SELECT max(created_at) FROM messages_old')).scalar()
+    if first is not None:
+        create_message_partitions(connection, first.date(), last.date())
+    maintain_message_partitions(connection, retention_months=0)
+
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_old')
+    op.drop_table('messages_old')
+    # Built after the copy; indexes on a partitioned table can't be created concurrently
+    create_indexes()
+
+
+def downgrade() -> None:
+    set_aside_messages()
+    op.create_table(
+        'messages',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('message_type', sa.String(), nullable=False),
+        sa.Column('chat_id', sa.UUID(), nullable=False),
+        sa.Column('sender_id', sa.UUID(), nullable=False),
+        sa.Column('parent_message_id', sa.UUID(), nullable=True),
+        sa.Column('branch_path', LTree(), nullable=True),
+        sa.Column('branch_level', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('is_branch_root', sa.Boolean(), server_default='false', nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['chat_id'], ['chats.id']),
+        sa.ForeignKeyConstraint(['sender_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_old')
+    op.create_foreign_key(
+        'messages_parent_message_id_fkey', 'messages', 'messages', ['parent_message_id'], ['id']
+    )
+    # Dropping the partitioned parent drops its partitions with it
+    op.drop_table('messages_old')
+    create_indexes()
@@ -0,0 +1,49 @@
+"""add hot path indexes for participant, chat and message lookups
+
+Revision ID: 8d4e2b6f1a93
+Revises: 3f9a1c7d2e84
+Create Date: 2026-10-18 10:03:47.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d4e2b6f1a93'
+down_revision: Union[str, None] = '3f9a1c7d2e84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY can't run inside a transaction, and avoids locking the tables while building
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chat_participants_user_id_chat_id',
+            'chat_participants',
+            ['user_id', 'chat_id'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_chats_created_by_active',
+            'chats',
+            ['created_by'],
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_messages_chat_id_created_at',
+            'messages',
+            ['chat_id', 'created_at'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_messages_chat_id_created_at', table_name='messages', postgresql_concurrently=True)
+        op.drop_index('ix_chats_created_by_active', table_name='chats', postgresql_concurrently=True)
+        op.drop_index('ix_chat_participants_user_id_chat_id', table_name='chat_participants', postgresql_concurrently=True)
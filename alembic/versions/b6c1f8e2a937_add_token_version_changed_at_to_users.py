@@ -0,0 +1,31 @@
+"""add token_version_changed_at to users
+
+Revision ID: b6c1f8e2a937
+Revises: d2a8c5e17f40
+Create Date: 2026-10-18 16:05:12.518734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6c1f8e2a937'
+down_revision: Union[str, None] = 'd2a8c5e17f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version_changed_at', sa.DateTime(), nullable=True))
+    # When revoked users last bumped their version is unknown, so keep them in the
+    # version map for one more token lifetime
+    op.execute("UPDATE users SET token_version_changed_at = now() AT TIME ZONE 'utc' WHERE token_version > 0")
+    op.create_index('ix_users_token_version_changed_at', 'users', ['token_version_changed_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_token_version_changed_at', table_name='users')
+    op.drop_column('users', 'token_version_changed_at')
@@ -0,0 +1,48 @@
+"""add keyset pagination indexes on (created_at, id)
+
+Revision ID: c41e7a9d5b20
+Revises: 8d4e2b6f1a93
+Create Date: 2026-10-18 11:24:09.731640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7a9d5b20'
+down_revision: Union[str, None] = '8d4e2b6f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_created_at_id',
+            'users',
+            ['created_at', 'id'],
+            postgresql_concurrently=True,
+        )
+        # Extends ix_messages_chat_id_created_at with the id tie-breaker of the cursor
+        op.create_index(
+            'ix_messages_chat_id_created_at_id',
+            'messages',
+            ['chat_id', 'created_at', 'id'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_messages_chat_id_created_at', table_name='messages', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_messages_chat_id_created_at',
+            'messages',
+            ['chat_id', 'created_at'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_messages_chat_id_created_at_id', table_name='messages', postgresql_concurrently=True)
+        op.drop_index('ix_users_created_at_id', table_name='users', postgresql_concurrently=True)
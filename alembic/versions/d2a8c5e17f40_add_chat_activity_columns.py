@@ -0,0 +1,42 @@
+"""add denormalized activity columns to chats
+
+Revision ID: d2a8c5e17f40
+Revises: 7b2f9e4c1d58
+Create Date: 2026-10-18 14:47:12.506193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a8c5e17f40'
+down_revision: Union[str, None] = '7b2f9e4c1d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('chats', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+    op.add_column('chats', sa.Column('last_message_preview', sa.String(length=140), nullable=True))
+    # Messages live in Mongo: fill the new columns with `python -m app.services.chat_activity`
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chats_last_activity_at_id',
+            'chats',
+            [sa.text('coalesce(last_message_at, created_at) DESC'), sa.text('id DESC')],
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_chats_last_activity_at_id', table_name='chats', postgresql_concurrently=True)
+    op.drop_column('chats', 'last_message_preview')
+    op.drop_column('chats', 'last_message_at')
+    op.drop_column('chats', 'message_count')
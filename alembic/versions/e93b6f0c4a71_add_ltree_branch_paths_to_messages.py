@@ -0,0 +1,63 @@
+"""add ltree branch paths to messages
+
+Revision ID: e93b6f0c4a71
+Revises: 5a7d3c18e6f2
+Create Date: 2026-10-18 13:15:36.842915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.types import LTree
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e93b6f0c4a71'
+down_revision: Union[str, None] = '5a7d3c18e6f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS ltree')
+    op.execute(sa.schema.CreateSequence(sa.Sequence('message_branch_label_seq')))
+    op.add_column('messages', sa.Column('branch_path', LTree(), nullable=True))
+    op.add_column('messages', sa.Column('branch_level', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('messages', sa.Column('is_branch_root', sa.Boolean(), server_default='false', nullable=False))
+
+    # Walk the existing reply trees from their roots and give every message a path
+    op.execute("""
+        WITH RECURSIVE tree AS (
+            SELECT id, text2ltree(nextval('message_branch_label_seq')::text) AS path, 0 AS level
+            FROM messages
+            WHERE parent_message_id IS NULL
+            UNION ALL
+            SELECT m.id, tree.path || nextval('message_branch_label_seq')::text, tree.level + 1
+            FROM messages m
+            JOIN tree ON m.parent_message_id = tree.id
+        )
+        UPDATE messages
+        SET branch_path = tree.path, branch_level = tree.level
+        FROM tree
+        WHERE messages.id = tree.id
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_messages_branch_path',
+            'messages',
+            ['branch_path'],
+            postgresql_using='gist',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_messages_branch_path', table_name='messages', postgresql_concurrently=True)
+    op.drop_column('messages', 'is_branch_root')
+    op.drop_column('messages', 'branch_level')
+    op.drop_column('messages', 'branch_path')
+    op.execute(sa.schema.DropSequence(sa.Sequence('message_branch_label_seq')))
@@ -1,13 +1,20 @@
-from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status, WebSocket
+from typing import AsyncGenerator, Generator, NamedTuple, Optional
+from uuid import UUID
+from fastapi import Depends, HTTPException, Query, status, WebSocket
 from fastapi.security import OAuth2PasswordBearer
+from starlette.requests import HTTPConnection
 from jose import jwt, JWTError
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import logging
+import time
 
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, AsyncSessionLocal, pin_to_primary, track_session_user
 from app.core.config import settings
+from app.core.cache import CachedPrincipal, principal_cache, token_versions
+from app.core.pagination import decode_cursor
+from app.core.query_stats import set_query_budget
 from app.schemas.token import TokenPayload
 from app.crud.user import get
 from app import crud, models, schemas
@@ -25,10 +32,75 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+# Requests with any other method may write, and their writes are often based
+# on what they read first (diffs, get-then-update), so the whole request runs
+# on the primary. Websockets read and write over one session, so they do too.
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+async def get_async_db(connection: HTTPConnection) -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        if connection.scope["type"] != "http" or connection.scope["method"] not in READ_ONLY_METHODS:
+            pin_to_primary(db)
+        yield db
+
+async def use_primary(db: AsyncSession = Depends(get_async_db)) -> None:
+    """For read-only methods that still write: keep the request's reads on the primary too."""
+    pin_to_primary(db)
+
+def _cache_principal(token: str, user: models.User, payload: dict) -> schemas.User:
+    """Snapshot a verified user and cache it until the token (or cache TTL) expires."""
+    principal = schemas.User.model_validate(user)
+    expires_in = payload["exp"] - time.time() if "exp" in payload else None
+    principal_cache.set(token, CachedPrincipal(principal, payload.get("ver")), ttl=expires_in)
+    return principal
+
+async def _is_revoked(db: AsyncSession, user_id: UUID, ver: int) -> bool:
+    """Whether a token of version `ver` was revoked, refreshing the version map if it is stale."""
+    if token_versions.is_stale():
+        token_versions.replace(await crud.user["get_token_versions"](db))
+    return ver < token_versions.get(user_id)
+
+async def _cached_principal(db: AsyncSession, token: str) -> Optional[schemas.User]:
+    """
+    The principal cached for `token`. Revocations on other workers only reach
+    this one through the version map, so versioned tokens are checked against
+    it on every hit; a revoked token is dropped and left to the full check.
+    """
+    cached = principal_cache.get(token)
+    if cached is None:
+        return None
+    if cached.ver is not None and await _is_revoked(db, cached.principal.id, cached.ver):
+        principal_cache.delete(token)
+        return None
+    return cached.principal
+
+async def _principal_from_claims(db: AsyncSession, token_data: TokenPayload) -> Optional[schemas.User]:
+    """Authorize a self-contained token from its claims; None if its version was revoked."""
+    if await _is_revoked(db, token_data.sub, token_data.ver):
+        return None
+    return schemas.User(
+        id=token_data.sub,
+        username=token_data.username,
+        email=token_data.email,
+        is_active=token_data.is_active,
+        created_at=token_data.created_at,
+        updated_at=token_data.updated_at,
+    )
+
 async def get_current_user(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(oauth2_scheme)
-) -> dict:
+) -> schemas.User:
+    principal = await _authenticate(db, token)
+    # Reads of a user who just wrote must not hit a lagging replica
+    track_session_user(db, principal.id)
+    return principal
+
+async def _authenticate(db: AsyncSession, token: str) -> schemas.User:
+    principal = await _cached_principal(db, token)
+    if principal is not None:
+        return principal
+
     try:
         logger.info("Validating access token")
         logger.debug(f"Token received: {token[:10]}...")  # Log first 10 chars of token
@@ -52,8 +124,24 @@ async def get_current_user(
             detail="Could not validate credentials",
         )
     
+    if token_data.ver is not None:
+        principal = await _principal_from_claims(db, token_data)
+        if principal is None:
+            logger.warning(f"Revoked token used for user: {token_data.sub}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Token has been revoked",
+            )
+        if not principal.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Inactive user",
+            )
+        principal_cache.set(token, CachedPrincipal(principal, token_data.ver), ttl=payload["exp"] - time.time())
+        return principal
+
     # Fetch user from database
-    user = get(db, id=token_data.sub)
+    user = await get(db, id=token_data.sub)
     if not user:
         logger.error(f"User not found for token sub: {token_data.sub}")
         raise HTTPException(
@@ -68,24 +156,28 @@ async def get_current_user(
         )
     
     logger.info(f"User authenticated: {user.email}")
-    return user 
+    return _cache_principal(token, user, payload)
 
 async def get_current_user_ws(
     websocket: WebSocket,
-    db: Session = Depends(get_db)
-) -> models.User:
+    db: AsyncSession = Depends(get_async_db)
+) -> schemas.User:
+    # Extract token from query parameters
+    query_params = dict(websocket.query_params)
+    token = query_params.get("token")
+
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    principal = await _cached_principal(db, token)
+    if principal is not None:
+        return principal
+
     try:
-        # Extract token from query parameters
-        query_params = dict(websocket.query_params)
-        token = query_params.get("token")
-        
-        if not token:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not authenticated",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-            
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
@@ -105,7 +197,23 @@ async def get_current_user_ws(
             headers={"WWW-Authenticate": "Bearer"},
         )
         
-    user = crud.user["get"](db, id=token_data.sub)
+    if token_data.ver is not None:
+        principal = await _principal_from_claims(db, token_data)
+        if principal is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if not principal.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Inactive user",
+            )
+        principal_cache.set(token, CachedPrincipal(principal, token_data.ver), ttl=payload["exp"] - time.time())
+        return principal
+
+    user = await crud.user["get"](db, id=token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -115,4 +223,78 @@ async def get_current_user_ws(
         )
         
     logger.info(f"User authenticated: {user.email}")
-    return user 
\ No newline at end of file
+    return _cache_principal(token, user, payload) 
+
+def get_cursor(
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from the X-Next-Cursor header of the previous page"
+    )
+) -> Optional[str]:
+    """Validate a keyset pagination cursor up front so bad tokens fail with 400."""
+    if cursor is None:
+        return None
+    try:
+        decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return cursor
+
+def query_budget(budget: int):
+    """
+    Route dependency declaring how many SQL statements a request may issue,
+    authentication included; going over is logged as a warning and fails the
+    tests/api budget fixture:
+        @router.get("/", dependencies=[Depends(deps.query_budget(3))])
+    """
+    def declare_budget() -> None:
+        set_query_budget(budget)
+    declare_budget.query_budget = budget
+    return declare_budget
+
+class ChatAccess(NamedTuple):
+    """A chat the current user may access, with their participant role."""
+    chat: models.Chat
+    role: str
+
+async def resolve_chat_access(db: AsyncSession, chat_id: UUID, user) -> ChatAccess:
+    """
+    Authorize `user` for `chat_id` with a single joined query.
+    Raises 404 for missing or deleted chats and 403 for non-participants.
+    """
+    access = await crud.chat["get_chat_access"](db, chat_id, user.id)
+    if not access or access[0].deleted_at is not None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Chat {chat_id} not found"
+        )
+    chat, role = access
+    if role is None and chat.created_by == user.id:
+        # Confirm on the primary before repairing; a lagging replica may not have the row yet
+        pin_to_primary(db)
+        chat, role = await crud.chat["get_chat_access"](db, chat_id, user.id)
+    if role is None:
+        if chat.created_by != user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"User {user.id} is not a participant in chat {chat_id}"
+            )
+        # The creator is always a participant; repair chats that lost the row
+        logger.warning(f"Restoring creator {user.id} as admin of chat {chat_id}")
+        role = "admin"
+        await crud.chat["add_participant"](db=db, chat_id=chat_id, user_id=user.id, role=role)
+    return ChatAccess(chat=chat, role=role)
+
+async def get_chat_access(
+    chat_id: UUID,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_user),
+) -> ChatAccess:
+    """
+    Chat-scoped endpoints depend on this instead of loading the chat and the
+    participant row themselves. FastAPI caches dependency results per request,
+    so sub-dependencies sharing it still cost one query.
+    """
+    return await resolve_chat_access(db, chat_id, current_user)
@@ -1,9 +1,11 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, users, chat, websocket
+from app.api.v1.endpoints import auth, users, chat, chats, websocket
 
 api_router = APIRouter()
  
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
+# Before chat.router, whose /{chat_id} routes would otherwise claim /my-chats
+api_router.include_router(chats.router, prefix="/chats", tags=["chats"])
 api_router.include_router(chat.router, prefix="/chats", tags=["chats"])
 api_router.include_router(websocket.router, prefix="/ws", tags=["websocket"]) 
\ No newline at end of file
@@ -4,7 +4,7 @@ import logging
 
 from fastapi import APIRouter, Depends, HTTPException, status, Form, Body
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import schemas
 from app.api import deps
@@ -20,7 +20,7 @@ router = APIRouter()
 
 @router.post("/login", response_model=schemas.Token)
 async def login(
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
@@ -46,7 +46,7 @@ async def login(
             )
         
         # Authenticate user
-        user = authenticate(
+        user = await authenticate(
             db, email=form_data.username, password=form_data.password
         )
         if not user:
@@ -65,8 +65,9 @@ async def login(
             
         # Create access token
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        claims = security.user_claims(user) if settings.SELF_CONTAINED_TOKENS else None
         access_token = security.create_access_token(
-            user.id, expires_delta=access_token_expires
+            user.id, expires_delta=access_token_expires, claims=claims
         )
         logger.info(f"Login successful for user: {form_data.username}")
         return {
@@ -77,6 +78,13 @@ async def login(
     except HTTPException:
         # Re-raise HTTP exceptions as they are already properly formatted
         raise
+    except security.PasswordHasherBusy as e:
+        logger.warning(f"Login rejected, password hashing busy: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
         logger.error(f"Login error: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -87,7 +95,7 @@ async def login(
 @router.post("/register", response_model=schemas.User)
 async def register(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     user_in: schemas.UserCreate = Body(
         ...,
         example={
@@ -104,7 +112,7 @@ async def register(
         logger.info(f"Registration attempt with data: {user_in.dict(exclude={'password'})}")
         
         # Check if user exists
-        user = get_by_email(db, email=user_in.email)
+        user = await get_by_email(db, email=user_in.email)
         if user:
             logger.warning(f"Registration failed: Email {user_in.email} already exists")
             raise HTTPException(
@@ -113,7 +121,7 @@ async def register(
             )
         
         # Check if username exists
-        user = get_by_username(db, username=user_in.username)
+        user = await get_by_username(db, username=user_in.username)
         if user:
                 logger.warning(f"Registration failed: Username {user_in.username} already taken")
                 raise HTTPException(
@@ -123,12 +131,19 @@ async def register(
         
         # Create user
         logger.info(f"Creating new user with username: {user_in.username}")
-        user = create(db, obj_in=user_in)
+        user = await create(db, obj_in=user_in)
         logger.info(f"User created successfully with ID: {user.id}")
         return user
     except HTTPException:
         # Re-raise HTTP exceptions as they are already properly formatted
         raise
+    except security.PasswordHasherBusy as e:
+        logger.warning(f"Registration rejected, password hashing busy: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
         logger.error(f"Registration error: {str(e)}", exc_info=True)
         raise HTTPException(
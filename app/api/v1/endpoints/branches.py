@@ -1,6 +1,6 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.schemas.chat import MessageResponse
 from app.crud import branch as branch_crud
@@ -14,7 +14,7 @@ async def create_branch(
     chat_id: str,
     parent_message_id: str,
     content: str,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Create a new branch from a message."""
@@ -46,7 +46,8 @@ async def create_branch(
 async def get_branch(
     chat_id: str,
     message_id: str,
-    db: Session = Depends(deps.get_db),
+    max_depth: Optional[int] = Query(None, ge=0, description="Levels below the message to include"),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Get all messages in a branch."""
@@ -59,6 +60,31 @@ async def get_branch(
         )
     
     messages = await branch_crud.get_branch_tree(
+        db=db,
+        chat_id=chat_id,
+        message_id=message_id,
+        max_depth=max_depth
+    )
+    return messages
+
+@router.get("/get-ancestors/{chat_id}/{message_id}", response_model=List[MessageResponse])
+@cache(expire=60)
+async def get_ancestors(
+    chat_id: str,
+    message_id: str,
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user = Depends(deps.get_current_user)
+):
+    """Get the chain of messages from the thread root down to a message."""
+    # Verify user has access to the chat
+    chat = await chat_crud.get_chat(db, chat_id, current_user.id)
+    if not chat:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found or you don't have access to it"
+        )
+    
+    messages = await branch_crud.get_ancestors(
         db=db,
         chat_id=chat_id,
         message_id=message_id
@@ -69,7 +95,7 @@ async def get_branch(
 @cache(expire=60)
 async def get_active_branches(
     chat_id: str,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Get all active branch roots in a chat."""
@@ -92,7 +118,8 @@ async def get_active_branches(
 async def get_thread(
     chat_id: str,
     message_id: str,
-    db: Session = Depends(deps.get_db),
+    max_depth: Optional[int] = Query(None, ge=0, description="Levels of replies to include"),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Get a message and its entire thread."""
@@ -107,7 +134,8 @@ async def get_thread(
     message, thread_messages = await branch_crud.get_message_thread(
         db=db,
         chat_id=chat_id,
-        message_id=message_id
+        message_id=message_id,
+        max_depth=max_depth
     )
     
     if not message:
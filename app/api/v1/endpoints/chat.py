@@ -1,24 +1,69 @@
-from typing import List, Optional
-from uuid import UUID
+from typing import AbstractSet, Any, List, Literal, Optional
+from uuid import UUID, uuid4
 from datetime import datetime
+import logging
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud
 from app.api import deps
-from app.schemas.chat import Chat, ChatCreate, ChatUpdate, Message, MessageCreate, MessageUpdate
-from app.models.chat import Chat as ChatModel, chat_participants
-from app.services.mongodb.message_service import message_service
+from app.core.config import settings
+from app.core.pagination import NEXT_CURSOR_HEADER, next_cursor
+from app.crud.chat import INBOX_ORDERS
+from app.schemas.chat import (
+    Chat,
+    ChatCreate,
+    ChatUpdate,
+    Message,
+    MessageBatchCreate,
+    MessageBatchResponse,
+    MessageBatchResult,
+    MessageCreate,
+    MessageTree,
+    MessageUpdate,
+)
+from app.models.chat import chat_participants
+from app.services.mongodb.message_service import MESSAGE_EXISTS, MessageTreeTooLarge, message_service
 from app.models.mongodb.message import MongoMessage
 from app.core.websocket import manager
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# The message fields a Message response serializes; the sender is joined in from Postgres
+MESSAGE_FIELDS = frozenset(Message.model_fields) - {"sender"}
+
+def _sender_summary(user: Any) -> dict:
+    """The sender fields embedded in a Message."""
+    return {
+        "id": str(user.id),
+        "username": user.username,
+        "email": user.email,
+        "is_active": user.is_active,
+        "created_at": user.created_at
+    }
+
+async def _with_senders(db: AsyncSession, messages: List[Any]) -> List[Message]:
+    """Messages with their senders, loaded with one query; messages whose sender is gone are skipped."""
+    senders = await crud.user["get_many"](db, {message.sender_id for message in messages})
+    messages_with_sender = []
+    for message in messages:
+        sender = senders.get(message.sender_id)
+        if not sender:
+            continue
+        try:
+            messages_with_sender.append(
+                Message.model_validate({**message.model_dump(), "sender": _sender_summary(sender)})
+            )
+        except ValueError as e:
+            logger.error(f"Error processing message {message.id}: {str(e)}")
+    return messages_with_sender
 
 @router.post("/", response_model=Chat)
 async def create_chat(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_in: ChatCreate,
     current_user = Depends(deps.get_current_user)
 ) -> Chat:
@@ -33,78 +78,53 @@ async def create_chat(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[Chat])
+@router.get("/", response_model=List[Chat], dependencies=[Depends(deps.query_budget(2))])
 async def read_chats(
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    cursor: Optional[str] = Depends(deps.get_cursor),
+    skip: int = Query(0, ge=0, deprecated=True),
     limit: int = 100,
+    order: Literal["created", "activity"] = "created",
     current_user = Depends(deps.get_current_user)
 ) -> List[Chat]:
     """
-    Retrieve chats.
+    Retrieve chats, newest first, or most recently active first with
+    order=activity. Follow the X-Next-Cursor header for the next page.
     """
-    created_chats, participated_chats = await crud.chat["get_user_chats"](
-        db=db, current_user_id=current_user.id, skip=skip, limit=limit
+    inbox = await crud.chat["get_user_chats"](
+        db=db, current_user_id=current_user.id, cursor=cursor, skip=skip, limit=limit, order=order
     )
-    return created_chats + participated_chats
+    chats = [chat for chat, _ in inbox]
+    next_page = next_cursor(chats, limit, key=INBOX_ORDERS[order])
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
+    return chats
 
-@router.get("/{chat_id}", response_model=Chat)
+@router.get("/{chat_id}", response_model=Chat, dependencies=[Depends(deps.query_budget(2))])
 async def read_chat(
     *,
-    db: Session = Depends(deps.get_db),
-    chat_id: UUID,
-    current_user = Depends(deps.get_current_user)
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> Chat:
     """
     Get chat by ID.
     """
-    # First check if chat exists
-    chat = db.query(ChatModel).filter(ChatModel.id == chat_id).first()
-    if not chat:
-        raise HTTPException(status_code=404, detail=f"Chat with ID {chat_id} not found")
-    
-    # Then check if user is a participant
-    participant = db.execute(
-        chat_participants.select().where(
-            chat_participants.c.chat_id == chat_id,
-            chat_participants.c.user_id == current_user.id
-        )
-    ).first()
-    
-    if not participant:
-        # Try to fix participant status
-        fixed = await crud.chat["fix_chat_participant_status"](
-            db=db,
-            chat_id=chat_id,
-            user_id=current_user.id
-        )
-        if not fixed:
-            raise HTTPException(
-                status_code=403,
-                detail=f"User {current_user.id} is not a participant in chat {chat_id}"
-            )
-    
-    if chat.deleted_at is not None:
-        raise HTTPException(
-            status_code=404,
-            detail=f"Chat {chat_id} has been deleted"
-        )
-    
-    return chat
+    return access.chat
 
 @router.put("/{chat_id}", response_model=Chat)
 async def update_chat(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
     chat_in: ChatUpdate,
-    current_user = Depends(deps.get_current_user)
+    current_user = Depends(deps.get_current_user),
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> Chat:
     """
     Update chat.
     """
     chat = await crud.chat["update_chat"](
-        db=db, chat_id=chat_id, chat_in=chat_in, current_user_id=current_user.id
+        db=db, chat_id=chat_id, chat_in=chat_in, current_user_id=current_user.id, chat=access.chat
     )
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
@@ -113,43 +133,34 @@ async def update_chat(
 @router.delete("/{chat_id}", response_model=Chat)
 async def delete_chat(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
-    current_user = Depends(deps.get_current_user)
+    current_user = Depends(deps.get_current_user),
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> Chat:
     """
     Delete chat.
     """
-    # First get the chat to return it
-    chat = db.query(ChatModel).filter(ChatModel.id == chat_id).first()
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found")
-    
-    # Then delete it
-    success = await crud.chat["delete_chat"](db=db, chat_id=chat_id, current_user_id=current_user.id)
+    success = await crud.chat["delete_chat"](
+        db=db, chat_id=chat_id, current_user_id=current_user.id, chat=access.chat
+    )
     if not success:
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    return chat
+    return access.chat
 
-@router.post("/{chat_id}/messages", response_model=Message)
+@router.post("/{chat_id}/messages", response_model=Message, dependencies=[Depends(deps.query_budget(3))])
 async def create_message(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
     message_in: MessageCreate,
-    current_user = Depends(deps.get_current_user)
+    current_user = Depends(deps.get_current_user),
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> Message:
     """
     Create new message.
     """
-    # Check if user is participant
-    participant = crud.chat["get_participant"](
-        db=db, chat_id=chat_id, user_id=current_user.id
-    )
-    if not participant:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
     # Validate parent message if provided
     parent_message_id = message_in.parent_message_id
     if parent_message_id:
@@ -172,21 +183,13 @@ async def create_message(
     )
     
     created_message = await message_service.create_message(mongo_message)
+    await crud.chat["record_message"](
+        db, chat_id=chat_id, created_at=created_message.created_at, content=created_message.content
+    )
     
-    # Get sender information
-    sender = crud.user["get"](db=db, id=current_user.id)
-    if not sender:
-        raise HTTPException(status_code=404, detail="Sender not found")
-    
-    # Convert message to dict and add sender info
+    # The authenticated principal already carries every sender field
     message_dict = created_message.model_dump()
-    message_dict["sender"] = {
-        "id": str(sender.id),
-        "username": sender.username,
-        "email": sender.email,
-        "is_active": sender.is_active,
-        "created_at": sender.created_at
-    }
+    message_dict["sender"] = _sender_summary(current_user)
     
     # Create the message response
     message_response = Message.model_validate(message_dict)
@@ -202,121 +205,183 @@ async def create_message(
     
     return message_response
 
-@router.get("/{chat_id}/participants", response_model=List[dict])
+def _fail_orphans(
+    messages: List[MongoMessage], errors: List[Optional[str]], existing: AbstractSet[UUID] = frozenset()
+) -> List[int]:
+    """
+    Fail every message whose parent is a failed message of the same batch,
+    and their replies in turn; parents in `existing` are already in the chat.
+    Returns the indexes it failed.
+    """
+    batch_ids = {message.id for message in messages} - existing
+    failed = []
+    while True:
+        failed_parents = batch_ids - {message.id for message, error in zip(messages, errors) if error is None}
+        orphans = [
+            index for index, (message, error) in enumerate(zip(messages, errors))
+            if error is None and message.parent_message_id in failed_parents
+        ]
+        if not orphans:
+            return failed
+        for index in orphans:
+            errors[index] = "Parent failed in this batch"
+        failed.extend(orphans)
+
+@router.post(
+    "/{chat_id}/messages/batch",
+    response_model=MessageBatchResponse,
+    dependencies=[Depends(deps.query_budget(4))]
+)
+async def create_messages_batch(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    chat_id: UUID,
+    batch_in: MessageBatchCreate,
+    current_user = Depends(deps.get_current_user),
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
+) -> MessageBatchResponse:
+    """
+    Create many messages at once, e.g. to import history. Replies may point at
+    messages earlier in the batch by their id; replies to a message that fails
+    fail too. Returns a result per message, in request order; chat
+    participants get a single new_messages event.
+    """
+    now = datetime.utcnow()
+    messages = [
+        MongoMessage(
+            id=item.id or uuid4(),
+            chat_id=chat_id,
+            sender_id=current_user.id,
+            content=item.content,
+            message_type=item.message_type,
+            parent_message_id=item.parent_message_id,
+            created_at=item.created_at or now,
+            updated_at=item.created_at or now
+        )
+        for item in batch_in.messages
+    ]
+
+    # Validate every message up front; parents outside the batch are looked up with one query
+    batch_ids = {message.id for message in messages}
+    outside = {message.parent_message_id for message in messages} - batch_ids - {None}
+    known_parents = batch_ids | await message_service.existing_message_ids(chat_id, list(outside))
+    errors = []
+    seen = set()
+    for message in messages:
+        if message.id in seen:
+            errors.append("Duplicate id in batch")
+        elif message.parent_message_id and message.parent_message_id not in known_parents:
+            errors.append(f"Parent message {message.parent_message_id} not found in chat {chat_id}")
+        else:
+            errors.append(None)
+        seen.add(message.id)
+    _fail_orphans(messages, errors)
+    if batch_in.ordered and any(errors):
+        first = next(index for index, error in enumerate(errors) if error)
+        errors[first + 1:] = ["Not attempted after an earlier failure"] * (len(errors) - first - 1)
+
+    valid = [index for index, error in enumerate(errors) if error is None]
+    insert_errors = await message_service.create_messages(
+        [messages[index] for index in valid], ordered=batch_in.ordered
+    )
+    for index, error in zip(valid, insert_errors):
+        errors[index] = error
+    # A retried import finds its parents already written; they only count if they are in this chat
+    parent_ids = {message.parent_message_id for message in messages}
+    rewritten = [
+        message.id for message, error in zip(messages, errors)
+        if error == MESSAGE_EXISTS and message.id in parent_ids
+    ]
+    existing = await message_service.existing_message_ids(chat_id, rewritten)
+    # Replies may have been written before their parent's insert failed; take them back out
+    orphans = _fail_orphans(messages, errors, existing)
+    await message_service.remove_messages([messages[index].id for index in orphans])
+
+    created = [message for message, error in zip(messages, errors) if error is None]
+    if created:
+        latest = max(created, key=lambda message: message.created_at)
+        await crud.chat["record_message"](
+            db, chat_id=chat_id, created_at=latest.created_at, content=latest.content, count=len(created)
+        )
+
+        # One event for the whole batch instead of one per message
+        sender = _sender_summary(current_user)
+        await manager.broadcast_to_chat(
+            {
+                "type": "new_messages",
+                "data": [
+                    Message.model_validate({**message.model_dump(), "sender": sender}).model_dump()
+                    for message in created
+                ]
+            },
+            chat_id
+        )
+
+    return MessageBatchResponse(
+        created=len(created),
+        failed=len(messages) - len(created),
+        results=[
+            MessageBatchResult(index=index, id=message.id, created=error is None, error=error)
+            for index, (message, error) in enumerate(zip(messages, errors))
+        ]
+    )
+
+@router.get("/{chat_id}/participants", response_model=List[dict], dependencies=[Depends(deps.query_budget(3))])
 async def get_chat_participants(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
-    current_user = Depends(deps.get_current_user)
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> List[dict]:
     """
     Get chat participants.
     """
-    # First check if chat exists
-    chat = db.query(ChatModel).filter(ChatModel.id == chat_id).first()
-    if not chat:
-        raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
-    
     # Get all participants
-    participants = db.execute(
+    participants = (await db.execute(
         chat_participants.select().where(chat_participants.c.chat_id == chat_id)
-    ).fetchall()
+    )).fetchall()
     
     # Convert to list of dicts
     return [dict(p._mapping) for p in participants]
 
-@router.get("/{chat_id}/messages", response_model=List[Message])
+@router.get("/{chat_id}/messages", response_model=List[Message], dependencies=[Depends(deps.query_budget(3))])
 async def read_messages(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
-    skip: int = 0,
+    cursor: Optional[str] = Depends(deps.get_cursor),
+    skip: int = Query(0, ge=0, deprecated=True),
     limit: int = 100,
-    current_user = Depends(deps.get_current_user)
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> List[Message]:
     """
-    Retrieve messages.
+    Retrieve messages, newest first. Follow the X-Next-Cursor header for the next page.
     """
-    # First check if chat exists
-    chat = db.query(ChatModel).filter(ChatModel.id == chat_id).first()
-    if not chat:
-        raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
-    
-    # Check if user is participant
-    participant = crud.chat["get_participant"](
-        db=db, chat_id=chat_id, user_id=current_user.id
-    )
-    if not participant:
-        # Try to fix participant status
-        fixed = await crud.chat["fix_chat_participant_status"](
-            db=db,
-            chat_id=chat_id,
-            user_id=current_user.id
-        )
-        if not fixed:
-            raise HTTPException(
-                status_code=403,
-                detail=f"User {current_user.id} is not a participant in chat {chat_id}"
-            )
-    
     # Get messages from MongoDB
     messages = await message_service.get_chat_messages(
         chat_id=chat_id,
+        cursor=cursor,
         skip=skip,
-        limit=limit
+        limit=limit,
+        fields=MESSAGE_FIELDS
     )
+    # Taken before hydration, which may drop messages whose sender is gone
+    next_page = next_cursor(messages, limit)
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
     
-    # Add sender information to each message
-    messages_with_sender = []
-    for message in messages:
-        try:
-            # Get sender information
-            sender = crud.user["get"](db=db, id=message.sender_id)
-            if not sender:
-                continue
-
-            # Convert message to dict and add sender info
-            message_dict = message.model_dump()
-            message_dict["sender"] = {
-                "id": str(sender.id),
-                "username": sender.username,
-                "email": sender.email,
-                "is_active": sender.is_active,
-                "created_at": sender.created_at
-            }
-
-            # Process thread messages if any
-            if message.thread_messages:
-                thread_messages = []
-                for thread_msg in message.thread_messages:
-                    thread_sender = crud.user["get"](db=db, id=thread_msg.sender_id)
-                    if thread_sender:
-                        thread_dict = thread_msg.model_dump()
-                        thread_dict["sender"] = {
-                            "id": str(thread_sender.id),
-                            "username": thread_sender.username,
-                            "email": thread_sender.email,
-                            "is_active": thread_sender.is_active,
-                            "created_at": thread_sender.created_at
-                        }
-                        thread_messages.append(thread_dict)
-                message_dict["thread_messages"] = thread_messages
-
-            messages_with_sender.append(Message.model_validate(message_dict))
-        except Exception as e:
-            print(f"Error processing message: {str(e)}")  # Add logging
-            continue
-    
-    return messages_with_sender
+    return await _with_senders(db, messages)
 
-@router.put("/{chat_id}/messages/{message_id}", response_model=Message)
+@router.put("/{chat_id}/messages/{message_id}", response_model=Message, dependencies=[Depends(deps.query_budget(2))])
 async def update_message(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
     message_id: UUID,
     message_in: MessageUpdate,
-    current_user = Depends(deps.get_current_user)
+    current_user = Depends(deps.get_current_user),
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> Message:
     """
     Update message.
@@ -336,13 +401,16 @@ async def update_message(
     
     return Message.model_validate(updated_message)
 
-@router.delete("/{chat_id}/messages/{message_id}", response_model=Message)
+@router.delete(
+    "/{chat_id}/messages/{message_id}", response_model=Message, dependencies=[Depends(deps.query_budget(2))]
+)
 async def delete_message(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
     message_id: UUID,
-    current_user = Depends(deps.get_current_user)
+    current_user = Depends(deps.get_current_user),
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> Message:
     """
     Delete message.
@@ -359,106 +427,114 @@ async def delete_message(
     
     return Message.model_validate(message)
 
-@router.get("/{chat_id}/messages/{message_id}/thread", response_model=List[Message])
+@router.get(
+    "/{chat_id}/messages/{message_id}/thread", response_model=List[Message], dependencies=[Depends(deps.query_budget(3))]
+)
 async def get_message_thread(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
     message_id: UUID,
-    current_user = Depends(deps.get_current_user)
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> List[Message]:
     """
     Get a message and its entire thread (parent and replies).
     """
-    # Check if user is participant
-    participant = crud.chat["get_participant"](
-        db=db, chat_id=chat_id, user_id=current_user.id
-    )
-    if not participant:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
     # Get thread messages from MongoDB
     thread_messages = await message_service.get_message_thread(
         chat_id=chat_id,
-        message_id=message_id
+        message_id=message_id,
+        fields=MESSAGE_FIELDS
     )
     
-    # Add sender information to each message
-    messages_with_sender = []
-    for message in thread_messages:
-        try:
-            message_with_sender = await message_service.get_message_with_sender(message, db)
-            messages_with_sender.append(Message.model_validate(message_with_sender))
-        except ValueError as e:
-            # Skip messages with invalid sender
-            continue
-    
-    return messages_with_sender
+    return await _with_senders(db, thread_messages)
+
+@router.get(
+    "/{chat_id}/messages/{message_id}/tree", response_model=MessageTree, dependencies=[Depends(deps.query_budget(3))]
+)
+async def get_message_tree(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    chat_id: UUID,
+    message_id: UUID,
+    max_depth: int = Query(settings.MESSAGE_TREE_MAX_DEPTH, ge=1, le=settings.MESSAGE_TREE_MAX_DEPTH),
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
+) -> MessageTree:
+    """
+    Get a message with all the replies below it, nested, down to `max_depth`
+    levels. Fails with 400 if that is more than MESSAGE_TREE_MAX_NODES replies.
+    """
+    try:
+        root = await message_service.get_message_tree(
+            chat_id,
+            message_id,
+            max_depth=max_depth,
+            max_nodes=settings.MESSAGE_TREE_MAX_NODES,
+            fields=MESSAGE_FIELDS | {"thread_messages"}
+        )
+    except MessageTreeTooLarge as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not root:
+        raise HTTPException(status_code=404, detail="Message not found")
 
-@router.get("/{chat_id}/branches", response_model=List[Message])
+    # Every sender in the tree with one query
+    nodes, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.thread_messages)
+    senders = await crud.user["get_many"](db, {node.sender_id for node in nodes})
+
+    def with_sender(node) -> Optional[dict]:
+        sender = senders.get(node.sender_id)
+        if not sender:
+            # Like the other message endpoints, skip messages with an invalid sender
+            return None
+        node_dict = node.model_dump(exclude={"thread_messages"})
+        node_dict["sender"] = _sender_summary(sender)
+        node_dict["thread_messages"] = [
+            reply for reply in map(with_sender, node.thread_messages) if reply is not None
+        ]
+        return node_dict
+
+    tree = with_sender(root)
+    if tree is None:
+        raise HTTPException(status_code=404, detail="Sender not found")
+    return MessageTree.model_validate(tree)
+
+@router.get("/{chat_id}/branches", response_model=List[Message], dependencies=[Depends(deps.query_budget(3))])
 async def get_chat_branches(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
-    current_user = Depends(deps.get_current_user)
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> List[Message]:
     """
     Get all root messages (messages without parents) in a chat.
     """
-    # Check if user is participant
-    participant = crud.chat["get_participant"](
-        db=db, chat_id=chat_id, user_id=current_user.id
-    )
-    if not participant:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
     # Get root messages from MongoDB
-    root_messages = await message_service.get_chat_branches(chat_id=chat_id)
+    root_messages = await message_service.get_chat_branches(chat_id=chat_id, fields=MESSAGE_FIELDS)
     
-    # Add sender information to each message
-    messages_with_sender = []
-    for message in root_messages:
-        try:
-            message_with_sender = await message_service.get_message_with_sender(message, db)
-            messages_with_sender.append(Message.model_validate(message_with_sender))
-        except ValueError as e:
-            # Skip messages with invalid sender
-            continue
-    
-    return messages_with_sender
+    return await _with_senders(db, root_messages)
 
-@router.get("/{chat_id}/messages/{message_id}/branch", response_model=List[Message])
+@router.get(
+    "/{chat_id}/messages/{message_id}/branch", response_model=List[Message], dependencies=[Depends(deps.query_budget(3))]
+)
 async def get_message_branch(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     chat_id: UUID,
     message_id: UUID,
-    current_user = Depends(deps.get_current_user)
+    access: deps.ChatAccess = Depends(deps.get_chat_access)
 ) -> List[Message]:
     """
     Get a message and all its replies in a branch.
     """
-    # Check if user is participant
-    participant = crud.chat["get_participant"](
-        db=db, chat_id=chat_id, user_id=current_user.id
-    )
-    if not participant:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
     # Get branch messages from MongoDB
     branch_messages = await message_service.get_message_branch(
         chat_id=chat_id,
-        message_id=message_id
+        message_id=message_id,
+        fields=MESSAGE_FIELDS
     )
     
-    # Add sender information to each message
-    messages_with_sender = []
-    for message in branch_messages:
-        try:
-            message_with_sender = await message_service.get_message_with_sender(message, db)
-            messages_with_sender.append(Message.model_validate(message_with_sender))
-        except ValueError as e:
-            # Skip messages with invalid sender
-            continue
-    
-    return messages_with_sender 
\ No newline at end of file
+    return await _with_senders(db, branch_messages) 
\ No newline at end of file
@@ -1,25 +1,28 @@
-from typing import List, Dict
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import List, Dict, Literal, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import crud
 from app.api import deps
 from app.schemas.chat import ChatCreate, ChatUpdate, ChatResponse
-from app.crud import chat as chat_crud
-from app.core.cache import cache
+from app.crud.chat import INBOX_ORDERS
+from app.core.pagination import NEXT_CURSOR_HEADER, next_cursor
 
 router = APIRouter()
 
 @router.post("/create-chat", response_model=ChatResponse)
 async def create_chat(
     chat_in: ChatCreate,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Create a new chat with participants."""
     try:
-        chat = await chat_crud.create_chat(
+        chat = await crud.chat["create_chat"](
             db=db,
             chat_in=chat_in,
-            current_user_id=current_user.id
+            current_user_id=current_user.id,
+            load="participants"
         )
         return chat
     except ValueError as e:
@@ -28,18 +31,18 @@ async def create_chat(
             detail=str(e)
         )
 
-@router.get("/get-chat/{chat_id}", response_model=ChatResponse)
-@cache(expire=60)
+@router.get("/get-chat/{chat_id}", response_model=ChatResponse, dependencies=[Depends(deps.query_budget(3))])
 async def get_chat(
-    chat_id: str,
-    db: Session = Depends(deps.get_db),
+    chat_id: UUID,
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Get chat details and messages."""
-    chat = await chat_crud.get_chat(
+    chat = await crud.chat["get_chat"](
         db=db,
         chat_id=chat_id,
-        current_user_id=current_user.id
+        current_user_id=current_user.id,
+        load="participants"
     )
     if not chat:
         raise HTTPException(
@@ -48,38 +51,48 @@ async def get_chat(
         )
     return chat
 
-@router.get("/my-chats", response_model=Dict[str, List[ChatResponse]])
+@router.get("/my-chats", response_model=Dict[str, List[ChatResponse]], dependencies=[Depends(deps.query_budget(3))])
 async def get_my_chats(
-    skip: int = 0,
+    response: Response,
+    cursor: Optional[str] = Depends(deps.get_cursor),
+    skip: int = Query(0, ge=0, deprecated=True),
     limit: int = 100,
-    db: Session = Depends(deps.get_db),
+    order: Literal["created", "activity"] = "created",
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Get all chats for the current user, separated into created and participated."""
-    created_chats, participated_chats = await chat_crud.get_user_chats(
+    inbox = await crud.chat["get_user_chats"](
         db=db,
         current_user_id=current_user.id,
+        cursor=cursor,
         skip=skip,
-        limit=limit
+        limit=limit,
+        load="participants",
+        order=order
     )
+    next_page = next_cursor([chat for chat, _ in inbox], limit, key=INBOX_ORDERS[order])
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
     return {
-        "created_chats": created_chats,
-        "participated_chats": participated_chats
+        "created_chats": [chat for chat, is_creator in inbox if is_creator],
+        "participated_chats": [chat for chat, is_creator in inbox if not is_creator]
     }
 
 @router.put("/update-chat/{chat_id}", response_model=ChatResponse)
 async def update_chat(
-    chat_id: str,
+    chat_id: UUID,
     chat_in: ChatUpdate,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Update chat metadata and participants."""
-    chat = await chat_crud.update_chat(
+    chat = await crud.chat["update_chat"](
         db=db,
         chat_id=chat_id,
         chat_in=chat_in,
-        current_user_id=current_user.id
+        current_user_id=current_user.id,
+        load="participants"
     )
     if not chat:
         raise HTTPException(
@@ -90,12 +103,12 @@ async def update_chat(
 
 @router.delete("/delete-chat/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_chat(
-    chat_id: str,
-    db: Session = Depends(deps.get_db),
+    chat_id: UUID,
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Soft delete a chat."""
-    success = await chat_crud.delete_chat(
+    success = await crud.chat["delete_chat"](
         db=db,
         chat_id=chat_id,
         current_user_id=current_user.id
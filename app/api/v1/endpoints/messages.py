@@ -1,6 +1,6 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.schemas.chat import MessageCreate, MessageResponse
 from app.crud import chat as chat_crud
@@ -11,7 +11,7 @@ router = APIRouter()
 @router.post("/add-message", response_model=MessageResponse)
 async def add_message(
     message_in: MessageCreate,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Add a new message to a chat."""
@@ -35,9 +35,10 @@ async def add_message(
 @cache(expire=60)
 async def get_messages(
     chat_id: str,
-    skip: int = 0,
+    cursor: Optional[str] = Depends(deps.get_cursor),
+    skip: int = Query(0, ge=0, deprecated=True),
     limit: int = 100,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_user = Depends(deps.get_current_user)
 ):
     """Get all messages in a chat."""
@@ -53,6 +54,7 @@ async def get_messages(
         db=db,
         chat_id=chat_id,
         current_user_id=current_user.id,
+        cursor=cursor,
         skip=skip,
         limit=limit
     )
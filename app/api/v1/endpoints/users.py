@@ -1,17 +1,20 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas
 from app.api import deps
+from app.core.cache import typeahead_cache
+from app.core.config import settings
+from app.core.pagination import NEXT_CURSOR_HEADER, keyset_filter, keyset_order, next_cursor
 
 router = APIRouter()
 
-@router.get("/me", response_model=schemas.User)
-def read_user_me(
+@router.get("/me", response_model=schemas.User, dependencies=[Depends(deps.query_budget(1))])
+async def read_user_me(
     current_user = Depends(deps.get_current_user),
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Get current user.
@@ -19,28 +22,59 @@ def read_user_me(
     return current_user
 
 @router.put("/me", response_model=schemas.User)
-def update_user_me(
+async def update_user_me(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     user_in: schemas.UserUpdate,
     current_user = Depends(deps.get_current_user),
 ) -> Any:
     """
     Update own user.
     """
-    user = crud.user.update(db=db, db_obj=current_user, obj_in=user_in)
+    # current_user is a cached snapshot, so load the row to update it
+    db_user = await crud.user["get"](db=db, id=current_user.id)
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    user = await crud.user["update"](db=db, db_obj=db_user, obj_in=user_in)
     return user
 
-@router.get("/{user_id}", response_model=schemas.User)
-def read_user_by_id(
+@router.get("/typeahead", response_model=List[schemas.UserSummary], dependencies=[Depends(deps.query_budget(2))])
+async def search_users_typeahead(
+    q: str = Query(..., min_length=1, max_length=50, description="Username prefix or fragment"),
+    limit: int = Query(10, ge=1, le=20, description="Number of suggestions to return"),
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Suggest active users for a participant picker, prefix matches first.
+    """
+    term = q.strip().lower()
+    if not term:
+        return []
+    cacheable = len(term) <= settings.USER_TYPEAHEAD_CACHE_MAX_PREFIX
+    if cacheable:
+        cached = typeahead_cache.get((term, limit))
+        if cached is not None:
+            return cached
+    rows = await crud.user["search_typeahead"](db, term=term, limit=limit)
+    users = [schemas.UserSummary(id=row.id, username=row.username) for row in rows]
+    if cacheable:
+        typeahead_cache.set((term, limit), users)
+    return users
+
+@router.get("/{user_id}", response_model=schemas.User, dependencies=[Depends(deps.query_budget(2))])
+async def read_user_by_id(
     user_id: str,
     current_user = Depends(deps.get_current_user),
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Get a specific user by id.
     """
-    user = crud.user.get(db=db, id=user_id)
+    user = await crud.user["get"](db=db, id=user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -48,10 +82,12 @@ def read_user_by_id(
         )
     return user
 
-@router.get("/", response_model=List[schemas.User])
-def read_users(
-    db: Session = Depends(deps.get_db),
-    skip: int = Query(0, ge=0, description="Number of records to skip"),
+@router.get("/", response_model=List[schemas.User], dependencies=[Depends(deps.query_budget(2))])
+async def read_users(
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    cursor: Optional[str] = Depends(deps.get_cursor),
+    skip: int = Query(0, ge=0, deprecated=True, description="Number of records to skip; use cursor instead"),
     limit: int = Query(100, ge=1, le=100, description="Number of records to return"),
     search: Optional[str] = Query(None, description="Search term for username or email"),
     current_user = Depends(deps.get_current_user),
@@ -59,20 +95,27 @@ def read_users(
     """
     Retrieve users with optional search and pagination.
     
-    - **skip**: Number of records to skip (for pagination)
+    - **cursor**: Cursor of the next page, taken from the X-Next-Cursor header
+    - **skip**: Deprecated offset pagination, slow on deep pages
     - **limit**: Number of records to return (max 100)
     - **search**: Optional search term to filter users by username or email
     """
-    query = db.query(models.User)
+    query = select(models.User).order_by(*keyset_order(models.User, descending=False))
+    if cursor:
+        query = query.where(keyset_filter(models.User, cursor, descending=False))
     
     if search:
         search_term = f"%{search}%"
-        query = query.filter(
+        query = query.where(
             or_(
                 models.User.username.ilike(search_term),
                 models.User.email.ilike(search_term)
             )
         )
     
-    users = query.offset(skip).limit(limit).all()
+    result = await db.execute(query.offset(skip).limit(limit))
+    users = result.scalars().all()
+    next_page = next_cursor(users, limit)
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
     return users 
\ No newline at end of file
@@ -4,7 +4,7 @@ from uuid import UUID
 from app.core.websocket import manager
 from app.api import deps
 from app import crud
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from app.models.mongodb.message import MongoMessage
 from app.services.mongodb.message_service import message_service
@@ -37,6 +37,8 @@ async def websocket_endpoint(websocket: WebSocket, user_id: UUID):
                     updated_at=datetime.utcnow()
                 )
                 
+                # Not counted in the chat's activity: this socket is unauthenticated
+                # and the chat_id comes from the client
                 created_message = await message_service.create_message(mongo_message)
                 
                 # Send notification to recipient
@@ -55,7 +57,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: UUID):
 async def chat_websocket_endpoint(
     websocket: WebSocket,
     chat_id: UUID,
-    db: Session = Depends(deps.get_db)
+    db: AsyncSession = Depends(deps.get_async_db)
 ):
     """
     WebSocket endpoint for chat room messages.
@@ -74,16 +76,15 @@ async def chat_websocket_endpoint(
             await websocket.close(code=4001, reason="Authentication failed")
             return
         
-        # Verify user is participant in chat
+        # Verify user is participant in chat; resolved once for the whole connection
         try:
-            participant = crud.chat["get_participant"](
-                db=db, chat_id=chat_id, user_id=current_user.id
-            )
-            if not participant:
-                logger.warning(f"User {current_user.email} is not a participant in chat {chat_id}")
-                await websocket.close(code=4003, reason="Not enough permissions")
-                return
+            await deps.resolve_chat_access(db, chat_id, current_user)
             logger.info(f"User {current_user.email} verified as participant in chat {chat_id}")
+        except HTTPException as e:
+            logger.warning(f"User {current_user.email} denied access to chat {chat_id}: {e.detail}")
+            code = 4004 if e.status_code == 404 else 4003
+            await websocket.close(code=code, reason=e.detail)
+            return
         except Exception as e:
             logger.error(f"Error verifying chat participant: {str(e)}")
             await websocket.close(code=4000, reason="Error verifying chat participant")
@@ -111,29 +112,35 @@ async def chat_websocket_endpoint(
                         updated_at=datetime.utcnow()
                     )
                     
-                    created_message = await message_service.create_message(mongo_message)
+                    # Shares an insert_many with other senders when the write buffer is on
+                    created_message = await message_service.create_message(mongo_message, buffered=True)
+                    await websocket.send_json({
+                        "type": "message_ack",
+                        "data": {"id": str(created_message.id), "client_id": message_data.get("client_id")}
+                    })
+                    await crud.chat["record_message"](
+                        db, chat_id=chat_id, created_at=created_message.created_at, content=created_message.content
+                    )
                     
-                    # Get sender information
-                    sender = crud.user["get"](db=db, id=current_user.id)
-                    if sender:
-                        message_dict = created_message.model_dump()
-                        message_dict["sender"] = {
-                            "id": str(sender.id),
-                            "username": sender.username,
-                            "email": sender.email,
-                            "is_active": sender.is_active,
-                            "created_at": sender.created_at
-                        }
-                        
-                        # Broadcast to all chat participants
-                        await manager.broadcast_to_chat(
-                            {
-                                "type": "new_message",
-                                "data": message_dict
-                            },
-                            chat_id
-                        )
-                        logger.info(f"Message broadcasted in chat {chat_id}")
+                    # The authenticated principal already carries every sender field
+                    message_dict = created_message.model_dump()
+                    message_dict["sender"] = {
+                        "id": str(current_user.id),
+                        "username": current_user.username,
+                        "email": current_user.email,
+                        "is_active": current_user.is_active,
+                        "created_at": current_user.created_at
+                    }
+
+                    # Broadcast to all chat participants
+                    await manager.broadcast_to_chat(
+                        {
+                            "type": "new_message",
+                            "data": message_dict
+                        },
+                        chat_id
+                    )
+                    logger.info(f"Message broadcasted in chat {chat_id}")
             except Exception as e:
                 logger.error(f"Error processing message: {str(e)}")
                 await websocket.send_json({
@@ -1,3 +1,8 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Hashable, NamedTuple, Optional, Set
+
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from fastapi_cache.decorator import cache
@@ -11,4 +16,138 @@ async def init_cache():
         encoding="utf8",
         decode_responses=True
     )
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache") 
\ No newline at end of file
+    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+
+class TTLCache:
+    """
+    Process-local LRU cache whose entries expire after a TTL.
+    **Parameters**
+    * `maxsize`: Maximum number of entries before the least recently used one is evicted
+    * `ttl`: Default lifetime of an entry in seconds
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Sync endpoints run in the threadpool, so guard the dict
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= monotonic():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (monotonic() + ttl, value)
+            self._stored(key, value)
+            while len(self._data) > self.maxsize:
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._data):
+                self._pop(key)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _pop(self, key: Hashable) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._removed(key, item[1])
+
+    # Hooks for subclasses keeping secondary indexes; called with the lock held
+    def _stored(self, key: Hashable, value: Any) -> None:
+        pass
+
+    def _removed(self, key: Hashable, value: Any) -> None:
+        pass
+
+class CachedPrincipal(NamedTuple):
+    """A verified principal and the version of the token it was verified from (None if it has none)."""
+    principal: Any
+    ver: Optional[int]
+
+class PrincipalCache(TTLCache):
+    """CachedPrincipals keyed by access token, invalidated per user."""
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self._tokens_by_user: Dict[str, Set[Hashable]] = {}
+
+    def invalidate_user(self, user_id: Any) -> None:
+        with self._lock:
+            for token in list(self._tokens_by_user.get(str(user_id), ())):
+                self._pop(token)
+
+    def _stored(self, key: Hashable, value: CachedPrincipal) -> None:
+        self._tokens_by_user.setdefault(str(value.principal.id), set()).add(key)
+
+    def _removed(self, key: Hashable, value: CachedPrincipal) -> None:
+        tokens = self._tokens_by_user.get(str(value.principal.id))
+        if tokens is not None:
+            tokens.discard(key)
+            if not tokens:
+                del self._tokens_by_user[str(value.principal.id)]
+
+class TokenVersionMap:
+    """
+    In-memory copy of users.token_version for users whose tokens were revoked
+    within the access token lifetime. Users absent from the map are treated as
+    on version 0: any token they revoked before that has expired.
+    """
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._versions: Dict[str, int] = {}
+        self._refreshed_at: Optional[float] = None
+        self._lock = Lock()
+
+    def is_stale(self) -> bool:
+        return self._refreshed_at is None or monotonic() - self._refreshed_at >= self.refresh_interval
+
+    def replace(self, versions: Dict[Any, int]) -> None:
+        with self._lock:
+            self._versions = {str(user_id): version for user_id, version in versions.items()}
+            self._refreshed_at = monotonic()
+
+    def set(self, user_id: Any, version: int) -> None:
+        with self._lock:
+            self._versions[str(user_id)] = version
+
+    def get(self, user_id: Any) -> int:
+        return self._versions.get(str(user_id), 0)
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+token_versions = TokenVersionMap(refresh_interval=settings.TOKEN_VERSION_REFRESH_SECONDS)
+
+# Users who committed a write recently; their reads are pinned to the primary
+recent_writers = TTLCache(
+    maxsize=settings.REPLICA_STICKY_MAX_USERS,
+    ttl=settings.REPLICA_READ_YOUR_WRITES_SECONDS
+)
+
+# Short typeahead prefixes match the most users and are typed by everyone
+typeahead_cache = TTLCache(
+    maxsize=settings.USER_TYPEAHEAD_CACHE_MAX_SIZE,
+    ttl=settings.USER_TYPEAHEAD_CACHE_TTL_SECONDS
+)
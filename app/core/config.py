@@ -31,10 +31,55 @@ class Settings(BaseSettings):
             return v
         return f"postgresql://{values.get('POSTGRES_USER')}:{values.get('POSTGRES_PASSWORD')}@{values.get('POSTGRES_SERVER')}/{values.get('POSTGRES_DB')}"
 
+    SQLALCHEMY_ASYNC_DATABASE_URI: Optional[str] = None
+
+    @validator("SQLALCHEMY_ASYNC_DATABASE_URI", pre=True)
+    def assemble_async_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+        return values.get("SQLALCHEMY_DATABASE_URI").replace("postgresql://", "postgresql+asyncpg://", 1)
+
+    # Read replicas as a JSON list of postgresql:// URIs; empty sends every query to the primary
+    SQLALCHEMY_REPLICA_URIS: List[str] = []
+    # After a user writes, their reads stay on the primary this long to cover replication lag
+    REPLICA_READ_YOUR_WRITES_SECONDS: float = 5.0
+    REPLICA_STICKY_MAX_USERS: int = 100000
+
+    # Monthly partitions of the messages table (app/db/partitions.py)
+    MESSAGE_PARTITIONS_AHEAD: int = 3
+    # Months of message history kept; older partitions are dropped. 0 keeps everything
+    MESSAGE_RETENTION_MONTHS: int = 0
+
+    # Group commit of websocket message inserts (app/services/mongodb/write_buffer.py)
+    MESSAGE_WRITE_BUFFER: bool = False
+    MESSAGE_WRITE_BUFFER_MAX_BATCH: int = 500
+    MESSAGE_WRITE_BUFFER_MAX_DELAY_MS: float = 5.0
+
+    # Limits of GET /chats/{chat_id}/messages/{message_id}/tree
+    MESSAGE_TREE_MAX_DEPTH: int = 50
+    MESSAGE_TREE_MAX_NODES: int = 2000
+
+    # Most messages POST /chats/{chat_id}/messages/batch accepts at once
+    MESSAGE_BATCH_MAX_SIZE: int = 5000
+
+    # Report per-request SQL count and time as X-DB-Query-* response headers
+    QUERY_STATS_HEADERS: bool = True
+
     # MongoDB Configuration
     MONGODB_URL: str = "mongodb://localhost:27017"
     MONGODB_DB: str = "chat_db"
     MONGODB_UUID_REPRESENTATION: str = "standard"
+    # Connection pool of the shared client (app/db/mongodb.py), per uvicorn worker
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    # Close connections idle this long; None keeps them open
+    MONGODB_MAX_IDLE_TIME_MS: Optional[int] = None
+    # Fail fast instead of hanging requests when no server is reachable
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    # Also match UUIDs stored as strings; turn off once app.services.mongodb.uuid_backfill has finished
+    MONGODB_UUID_DUAL_READ: bool = True
+    # Also find messages by their pre-_id id field; turn off once app.services.mongodb.id_migration has finished
+    MONGODB_LEGACY_MESSAGE_IDS: bool = True
 
     # Redis Configuration
     REDIS_HOST: str = "localhost"
@@ -44,6 +89,23 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-here"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Embed user claims in access tokens so requests can skip the users lookup
+    SELF_CONTAINED_TOKENS: bool = False
+    TOKEN_VERSION_REFRESH_SECONDS: int = 30
+
+    # Password hashing worker pool
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    PASSWORD_HASH_TIMEOUT_SECONDS: float = 5.0
+
+    # Authenticated principal cache (per process)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+
+    # User typeahead search; prefixes up to USER_TYPEAHEAD_CACHE_MAX_PREFIX chars are cached
+    USER_TYPEAHEAD_CACHE_MAX_PREFIX: int = 3
+    USER_TYPEAHEAD_CACHE_TTL_SECONDS: int = 30
+    USER_TYPEAHEAD_CACHE_MAX_SIZE: int = 5000
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,54 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, tuple_
+
+# Response header carrying the cursor of the next page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, id: Any) -> str:
+    """Opaque token pointing just past the row with this (created_at, id)."""
+    raw = json.dumps([created_at.isoformat(), str(id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError on a malformed token."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(uuid.UUID(id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+# The helpers below page on (created_at, id) unless given another timestamp
+# attribute as `key`; cursors must be decoded with the key they were made with.
+
+def next_cursor(items: Sequence[Any], limit: int, key: str = "created_at") -> Optional[str]:
+    """Cursor for the page after `items`, or None if it was the last one."""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(getattr(last, key), last.id)
+
+def keyset_filter(model, cursor: str, descending: bool = True, key: str = "created_at"):
+    """
+    WHERE clause selecting the rows after `cursor` in (key, id) order.
+    The plain bound on the key repeats the row comparison in a form the
+    planner can prune time-partitioned tables with.
+    """
+    value, id = decode_cursor(cursor)
+    boundary = (value, uuid.UUID(id))
+    column = getattr(model, key)
+    row = tuple_(column, model.id)
+    if descending:
+        return and_(row < boundary, column <= value)
+    return and_(row > boundary, column >= value)
+
+def keyset_order(model, descending: bool = True, key: str = "created_at") -> list:
+    column = getattr(model, key)
+    if descending:
+        return [column.desc(), model.id.desc()]
+    return [column.asc(), model.id.asc()]
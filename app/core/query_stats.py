@@ -0,0 +1,121 @@
+"""
+Per-request SQL accounting.
+
+Engine-level listeners count every statement sent to Postgres (primary and
+replicas) and time it; QueryStatsMiddleware attributes them to the HTTP request
+that issued them, reports them as X-DB-Query-Count / X-DB-Query-Time-Ms
+headers and a log line, and warns when the route's declared budget
+(deps.query_budget) was exceeded. Tests register a recorder to fail instead.
+"""
+import logging
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+QUERY_TIME_HEADER = "X-DB-Query-Time-Ms"
+
+class QueryStats:
+    """Statements issued while handling one request, and their total time."""
+    __slots__ = ("method", "path", "count", "duration", "budget")
+
+    def __init__(self, method: str = "", path: str = ""):
+        self.method = method
+        self.path = path
+        self.count = 0
+        self.duration = 0.0
+        self.budget: Optional[int] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration * 1000
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+# The stats object is shared, not copied, by the tasks and greenlets a request
+# spawns, so their statements all land on it
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# Called with the stats of every finished request (the tests/api budget fixture)
+recorders: List[Callable[[QueryStats], None]] = []
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+def set_query_budget(budget: int) -> None:
+    """Declare how many statements the current request may issue."""
+    stats = _current.get()
+    if stats is not None:
+        stats.budget = budget
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += time.perf_counter() - started
+
+@event.listens_for(Engine, "handle_error")
+def _discard_timer(exception_context) -> None:
+    # after_cursor_execute doesn't run for a failed statement
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.count += 1
+
+class QueryStatsMiddleware:
+    """ASGI middleware reporting the SQL each HTTP request issued."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope["method"], scope["path"])
+        token = _current.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start" and settings.QUERY_STATS_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_COUNT_HEADER.lower().encode(), str(stats.count).encode()))
+                headers.append((QUERY_TIME_HEADER.lower().encode(), f"{stats.duration_ms:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+            finish_request(stats)
+
+def finish_request(stats: QueryStats) -> None:
+    fields = {"db_query_count": stats.count, "db_query_ms": round(stats.duration_ms, 2), "db_query_budget": stats.budget}
+    logger.info(
+        f"{stats.method} {stats.path}: {stats.count} queries in {stats.duration_ms:.2f}ms", extra=fields
+    )
+    if stats.over_budget:
+        logger.warning(
+            f"{stats.method} {stats.path} issued {stats.count} queries, over its budget of {stats.budget}",
+            extra=fields
+        )
+    for recorder in recorders:
+        recorder(stats)
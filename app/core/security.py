@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Callable, Dict, Optional, Union
 
 from jose import jwt
 from passlib.context import CryptContext
@@ -10,8 +12,20 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 ALGORITHM = "HS256"
 
+# bcrypt releases the GIL, so a small thread pool keeps it off the event loop
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+_pending_password_jobs = 0
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password pool is saturated or a job times out."""
+
 def create_access_token(
-    subject: Union[str, Any], expires_delta: timedelta = None
+    subject: Union[str, Any],
+    expires_delta: timedelta = None,
+    claims: Optional[Dict[str, Any]] = None
 ) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -19,12 +33,53 @@ def create_access_token(
         expire = datetime.utcnow() + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def user_claims(user: Any) -> Dict[str, Any]:
+    """Claims that let get_current_user authorize a self-contained token without a DB lookup."""
+    return {
+        "ver": user.token_version or 0,
+        "username": user.username,
+        "email": user.email,
+        "is_active": user.is_active,
+        "created_at": user.created_at.isoformat(),
+        "updated_at": user.updated_at.isoformat(),
+    }
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password) 
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def _release_password_job(_future) -> None:
+    global _pending_password_jobs
+    _pending_password_jobs -= 1
+
+async def _run_password_job(func: Callable, *args: Any) -> Any:
+    """
+    Run a bcrypt call in the password pool.
+    Fails fast with PasswordHasherBusy instead of queueing past PASSWORD_HASH_MAX_PENDING.
+    """
+    global _pending_password_jobs
+    if _pending_password_jobs >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHasherBusy("Password hashing queue is full")
+
+    _pending_password_jobs += 1
+    future = asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    # A timed out job keeps its worker busy, so only release the slot once it finishes
+    future.add_done_callback(_release_password_job)
+    try:
+        return await asyncio.wait_for(
+            asyncio.shield(future), timeout=settings.PASSWORD_HASH_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        raise PasswordHasherBusy("Password hashing timed out")
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_password_job(get_password_hash, password)
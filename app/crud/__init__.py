@@ -1,14 +1,19 @@
 from app.crud.user import (
     get,
+    get_many,
     get_by_email,
     get_by_username,
     get_multi,
     create,
     update,
     authenticate,
+    get_token_versions,
+    revoke_tokens,
+    search_typeahead,
 )
 from app.crud.chat import (
     get_chat,
+    get_chat_access,
     get_multi as get_chats,
     get_user_chats,
     create_chat,
@@ -18,22 +23,28 @@ from app.crud.chat import (
     remove_participant,
     get_chat_messages,
     fix_chat_participant_status,
+    record_message,
     chat as chat_crud,
 )
 from app.crud.crud_message import message_crud
 
 user = {
     "get": get,
+    "get_many": get_many,
     "get_by_email": get_by_email,
     "get_by_username": get_by_username,
     "get_multi": get_multi,
     "create": create,
     "update": update,
     "authenticate": authenticate,
+    "get_token_versions": get_token_versions,
+    "revoke_tokens": revoke_tokens,
+    "search_typeahead": search_typeahead,
 }
 
 chat = {
     "get_chat": get_chat,
+    "get_chat_access": get_chat_access,
     "get_multi": get_chats,
     "get_user_chats": get_user_chats,
     "create_chat": create_chat,
@@ -44,6 +55,7 @@ chat = {
     "get_participant": chat_crud.get_participant,
     "get_chat_messages": get_chat_messages,
     "fix_chat_participant_status": fix_chat_participant_status,
+    "record_message": record_message,
 }
 
 message = message_crud
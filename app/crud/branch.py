@@ -1,95 +1,141 @@
 from typing import List, Optional, Tuple
-from sqlalchemy.orm import Session
-from app.models.chat import Message
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.message import Message, branch_label_seq
 from app.schemas.chat import MessageCreate
 import uuid
 
+# Branch paths are ltree values ('12.40.41'): every query below is a GiST
+# lookup on ix_messages_branch_path (<@ subtree, @> ancestors) instead of a
+# recursive walk over parent_message_id.
+
+async def _get_message(db: AsyncSession, chat_id: uuid.UUID, message_id: uuid.UUID) -> Optional[Message]:
+    return (await db.execute(
+        select(Message).where(
+            Message.id == message_id,
+            Message.chat_id == chat_id
+        )
+    )).scalars().first()
+
 async def create_branch(
-    db: Session,
+    db: AsyncSession,
     chat_id: uuid.UUID,
     parent_message_id: uuid.UUID,
     content: str,
     sender_id: uuid.UUID
 ) -> Message:
     # Get parent message
-    parent_message = db.query(Message).filter(
-        Message.id == parent_message_id,
-        Message.chat_id == chat_id
-    ).first()
-    
+    parent_message = await _get_message(db, chat_id, parent_message_id)
+
     if not parent_message:
         raise ValueError("Parent message not found")
-    
-    # Calculate new branch path and level
-    new_level = parent_message.branch_level + 1
-    new_path = f"{parent_message.branch_path}.{new_level}" if parent_message.branch_path else str(new_level)
-    
+
+    # Extend the parent's path with a fresh label
+    label = await db.scalar(select(branch_label_seq.next_value()))
+
     # Create new message
     message = Message(
         chat_id=chat_id,
         sender_id=sender_id,
         parent_message_id=parent_message_id,
         content=content,
-        branch_level=new_level,
-        branch_path=new_path,
+        branch_level=parent_message.branch_level + 1,
+        branch_path=f"{parent_message.branch_path}.{label}",
         is_branch_root=True
     )
-    
+
     db.add(message)
-    db.commit()
-    db.refresh(message)
+    await db.commit()
+    await db.refresh(message)
     return message
 
 async def get_branch_tree(
-    db: Session,
+    db: AsyncSession,
     chat_id: uuid.UUID,
-    message_id: uuid.UUID
+    message_id: uuid.UUID,
+    max_depth: Optional[int] = None
 ) -> List[Message]:
-    """Get all messages in a branch tree."""
-    message = db.query(Message).filter(
-        Message.id == message_id,
-        Message.chat_id == chat_id
-    ).first()
-    
+    """
+    Get a message and the messages below it, depth first. `max_depth` limits
+    how many levels below the message are returned.
+    """
+    message = await _get_message(db, chat_id, message_id)
+
     if not message:
         return []
-    
-    # Get all messages in the same branch path
-    branch_messages = db.query(Message).filter(
+
+    query = select(Message).where(
         Message.chat_id == chat_id,
-        Message.branch_path.like(f"{message.branch_path}%")
-    ).order_by(Message.branch_path, Message.created_at).all()
-    
+        Message.branch_path.descendant_of(message.branch_path)
+    )
+    if max_depth is not None:
+        query = query.where(
+            func.nlevel(Message.branch_path) <= message.branch_level + 1 + max_depth
+        )
+    # ltree ordering is depth-first: each message directly precedes its subtree
+    branch_messages = (await db.execute(
+        query.order_by(Message.branch_path)
+    )).scalars().all()
+
     return branch_messages
 
+async def get_ancestors(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    message_id: uuid.UUID
+) -> List[Message]:
+    """Get the chain from the thread root down to and including the message."""
+    message = await _get_message(db, chat_id, message_id)
+
+    if not message:
+        return []
+
+    result = await db.execute(
+        select(Message).where(
+            Message.chat_id == chat_id,
+            Message.branch_path.ancestor_of(message.branch_path)
+        ).order_by(Message.branch_level)
+    )
+    return result.scalars().all()
+
 async def get_active_branches(
-    db: Session,
+    db: AsyncSession,
     chat_id: uuid.UUID
 ) -> List[Message]:
     """Get all active branch roots in a chat."""
-    return db.query(Message).filter(
-        Message.chat_id == chat_id,
-        Message.is_branch_root == True
-    ).order_by(Message.created_at).all()
+    result = await db.execute(
+        select(Message).where(
+            Message.chat_id == chat_id,
+            Message.is_branch_root == True
+        ).order_by(Message.created_at)
+    )
+    return result.scalars().all()
 
 async def get_message_thread(
-    db: Session,
+    db: AsyncSession,
     chat_id: uuid.UUID,
-    message_id: uuid.UUID
+    message_id: uuid.UUID,
+    max_depth: Optional[int] = None
 ) -> Tuple[Message, List[Message]]:
-    """Get a message and its entire thread (parent and children)."""
-    message = db.query(Message).filter(
-        Message.id == message_id,
-        Message.chat_id == chat_id
-    ).first()
-    
+    """
+    Get a message and its entire thread: the ancestor chain above it and the
+    replies below it (up to `max_depth` levels), in one depth-first list.
+    """
+    message = await _get_message(db, chat_id, message_id)
+
     if not message:
         return None, []
-    
+
+    below = Message.branch_path.descendant_of(message.branch_path)
+    if max_depth is not None:
+        below = below & (func.nlevel(Message.branch_path) <= message.branch_level + 1 + max_depth)
+
     # Get all messages in the thread
-    thread_messages = db.query(Message).filter(
-        Message.chat_id == chat_id,
-        Message.branch_path.like(f"{message.branch_path}%")
-    ).order_by(Message.branch_path, Message.created_at).all()
-    
-    return message, thread_messages 
\ No newline at end of file
+    thread_messages = (await db.execute(
+        select(Message).where(
+            Message.chat_id == chat_id,
+            or_(Message.branch_path.ancestor_of(message.branch_path), below)
+        ).order_by(Message.branch_path)
+    )).scalars().all()
+
+    return message, thread_messages
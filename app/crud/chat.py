@@ -1,6 +1,8 @@
-from typing import Optional, List, Tuple
-from sqlalchemy.orm import Session
-from app.models.chat import Chat, chat_participants
+from typing import Optional, List, Set, Tuple
+from sqlalchemy import and_, case, literal, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload, selectinload
+from app.models.chat import MESSAGE_PREVIEW_LENGTH, Chat, chat_participants
 from app.models.message import Message
 from app.models.user import User
 from app.schemas.chat import ChatCreate, ChatUpdate, MessageCreate, MessageUpdate
@@ -8,37 +10,39 @@ from datetime import datetime
 import uuid
 import logging
 
+from app.core.pagination import keyset_filter, keyset_order
 from app.crud.base import CRUDBase
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 class CRUDChat(CRUDBase[Chat, ChatCreate, ChatUpdate]):
-    def get_by_name(self, db: Session, *, name: str) -> Optional[Chat]:
-        return db.query(Chat).filter(Chat.name == name).first()
+    async def get_by_name(self, db: AsyncSession, *, name: str) -> Optional[Chat]:
+        result = await db.execute(select(Chat).where(Chat.name == name))
+        return result.scalars().first()
 
-    def get_user_chats(
-        self, db: Session, *, user_id: uuid.UUID, skip: int = 0, limit: int = 100
+    async def get_user_chats(
+        self, db: AsyncSession, *, user_id: uuid.UUID, skip: int = 0, limit: int = 100
     ) -> List[Chat]:
-        return (
-            db.query(Chat)
+        result = await db.execute(
+            select(Chat)
             .join(chat_participants)
-            .filter(chat_participants.c.user_id == user_id)
+            .where(chat_participants.c.user_id == user_id)
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return result.scalars().all()
 
-    def get_participant(
-        self, db: Session, *, chat_id: uuid.UUID, user_id: uuid.UUID
+    async def get_participant(
+        self, db: AsyncSession, *, chat_id: uuid.UUID, user_id: uuid.UUID
     ) -> Optional[dict]:
         try:
-            result = db.execute(
+            result = (await db.execute(
                 chat_participants.select().where(
                     chat_participants.c.chat_id == chat_id,
                     chat_participants.c.user_id == user_id
             )
-            ).first()
+            )).first()
             
             if not result:
                 return None
@@ -49,59 +53,90 @@ class CRUDChat(CRUDBase[Chat, ChatCreate, ChatUpdate]):
             logger.error(f"Error getting participant: {str(e)}", exc_info=True)
             raise
 
-    def add_participant(
-        self, db: Session, *, chat_id: uuid.UUID, user_id: uuid.UUID, role: str = "member"
+    async def add_participant(
+        self, db: AsyncSession, *, chat_id: uuid.UUID, user_id: uuid.UUID, role: str = "member"
     ) -> None:
         stmt = chat_participants.insert().values(
             chat_id=chat_id,
             user_id=user_id,
             role=role
         )
-        db.execute(stmt)
-        db.commit()
+        await db.execute(stmt)
+        await db.commit()
 
-    def remove_participant(
-        self, db: Session, *, chat_id: uuid.UUID, user_id: uuid.UUID
+    async def remove_participant(
+        self, db: AsyncSession, *, chat_id: uuid.UUID, user_id: uuid.UUID
     ) -> None:
         stmt = chat_participants.delete().where(
             chat_participants.c.chat_id == chat_id,
             chat_participants.c.user_id == user_id
             )
-        db.execute(stmt)
-        db.commit()
+        await db.execute(stmt)
+        await db.commit()
 
 class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
-    def get_chat_messages(
-        self, db: Session, *, chat_id: uuid.UUID, skip: int = 0, limit: int = 100
+    async def get_chat_messages(
+        self, db: AsyncSession, *, chat_id: uuid.UUID, skip: int = 0, limit: int = 100
     ) -> List[Message]:
-        return (
-            db.query(Message)
-            .filter(Message.chat_id == chat_id)
+        result = await db.execute(
+            select(Message)
+            .where(Message.chat_id == chat_id)
             .order_by(Message.created_at.desc())
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return result.scalars().all()
 
-    def get_user_messages(
-        self, db: Session, *, user_id: uuid.UUID, skip: int = 0, limit: int = 100
+    async def get_user_messages(
+        self, db: AsyncSession, *, user_id: uuid.UUID, skip: int = 0, limit: int = 100
     ) -> List[Message]:
-        return (
-            db.query(Message)
-            .filter(Message.sender_id == user_id)
+        result = await db.execute(
+            select(Message)
+            .where(Message.sender_id == user_id)
             .order_by(Message.created_at.desc())
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return result.scalars().all()
 
 chat = CRUDChat(Chat)
 message = CRUDMessage(Message)
 
-async def create_chat(db: Session, chat_in: ChatCreate, current_user_id: uuid.UUID) -> Chat:
+# Named relationship loading profiles. Endpoints that serialize relationships
+# (ChatResponse) must pick one: lazy loads can't run under AsyncSession, and
+# would cost a SELECT per chat if they could.
+CHAT_LOAD_PROFILES = {
+    # Columns only; relationships serialize as empty lists
+    "summary": (noload(Chat.participants), noload(Chat.messages)),
+    # One extra SELECT for the participants of every chat in the result, no messages
+    "participants": (selectinload(Chat.participants), noload(Chat.messages)),
+}
+
+def chat_load_options(load: Optional[str]) -> tuple:
+    return CHAT_LOAD_PROFILES[load] if load else ()
+
+async def reload_chat(db: AsyncSession, chat_id: uuid.UUID, load: str) -> Optional[Chat]:
+    """Re-read a chat with a loading profile, overwriting what the session already holds."""
+    result = await db.execute(
+        select(Chat)
+        .where(Chat.id == chat_id)
+        .options(*chat_load_options(load))
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+async def create_chat(
+    db: AsyncSession,
+    chat_in: ChatCreate,
+    current_user_id: uuid.UUID,
+    load: Optional[str] = None
+) -> Chat:
     # Validate participants exist
-    participants = db.query(User).filter(User.id.in_(chat_in.participant_ids)).all()
-    if len(participants) != len(chat_in.participant_ids):
+    participant_ids = set(chat_in.participant_ids)
+    found = set((
+        await db.execute(select(User.id).where(User.id.in_(participant_ids)))
+    ).scalars().all())
+    if found != participant_ids:
         raise ValueError("One or more participants not found")
     
     # Create chat
@@ -111,40 +146,61 @@ async def create_chat(db: Session, chat_in: ChatCreate, current_user_id: uuid.UU
         created_by=current_user_id
     )
     db.add(chat)
-    db.flush()  # Flush to get the chat ID
+    await db.flush()  # Flush to get the chat ID
     
-    # Add participants
-    for participant in participants:
-        # Set role as 'admin' for chat creator, 'member' for others
-        role = "admin" if participant.id == current_user_id else "member"
-        db.execute(
-            chat_participants.insert().values(
-                chat_id=chat.id,
-                user_id=participant.id,
-                role=role
-            )
-        )
+    # Add participants in one multi-row INSERT; the creator is always an admin
+    participant_ids.add(current_user_id)
+    await db.execute(
+        chat_participants.insert().values([
+            {
+                "chat_id": chat.id,
+                "user_id": user_id,
+                "role": "admin" if user_id == current_user_id else "member"
+            }
+            for user_id in participant_ids
+        ])
+    )
     
-    db.commit()
-    db.refresh(chat)
+    await db.commit()
+    if load:
+        return await reload_chat(db, chat.id, load)
+    await db.refresh(chat)
     return chat
 
-async def get_chat(db: Session, chat_id: uuid.UUID, current_user_id: uuid.UUID) -> Optional[Chat]:
-    # First check if chat exists
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
-    if not chat:
+async def get_chat_access(
+    db: AsyncSession, chat_id: uuid.UUID, user_id: uuid.UUID, load: Optional[str] = None
+) -> Optional[Tuple[Chat, Optional[str]]]:
+    """
+    Load a chat together with the user's participant role in one query.
+    Returns None if the chat doesn't exist; the role is None if the user is not a participant.
+    `load` names an entry of CHAT_LOAD_PROFILES.
+    """
+    row = (await db.execute(
+        select(Chat, chat_participants.c.role)
+        .outerjoin(
+            chat_participants,
+            and_(
+                chat_participants.c.chat_id == Chat.id,
+                chat_participants.c.user_id == user_id
+            )
+        )
+        .where(Chat.id == chat_id)
+        .options(*chat_load_options(load))
+    )).first()
+    if row is None:
+        return None
+    return row[0], row[1]
+
+async def get_chat(
+    db: AsyncSession, chat_id: uuid.UUID, current_user_id: uuid.UUID, load: Optional[str] = None
+) -> Optional[Chat]:
+    access = await get_chat_access(db, chat_id, current_user_id, load=load)
+    if not access:
         logger.info(f"Chat with ID {chat_id} not found")
         return None
+    chat, role = access
     
-    # Then check if user is a participant
-    participant = db.execute(
-        chat_participants.select().where(
-            chat_participants.c.chat_id == chat_id,
-            chat_participants.c.user_id == current_user_id
-        )
-    ).first()
-    
-    if not participant:
+    if role is None:
         logger.info(f"User {current_user_id} is not a participant in chat {chat_id}")
         return None
     
@@ -156,12 +212,16 @@ async def get_chat(db: Session, chat_id: uuid.UUID, current_user_id: uuid.UUID)
     return chat
 
 async def update_chat(
-    db: Session,
+    db: AsyncSession,
     chat_id: uuid.UUID,
     chat_in: ChatUpdate,
-    current_user_id: uuid.UUID
+    current_user_id: uuid.UUID,
+    chat: Optional[Chat] = None,
+    load: Optional[str] = None
 ) -> Optional[Chat]:
-    chat = await get_chat(db, chat_id, current_user_id)
+    """Update a chat; pass `chat` if the caller already authorized it to skip the lookup."""
+    if chat is None:
+        chat = await get_chat(db, chat_id, current_user_id)
     if not chat:
         return None
     
@@ -172,79 +232,157 @@ async def update_chat(
     
     # Update participants if provided
     if chat_in.participant_ids is not None:
-        # Remove existing participants
-        db.execute(
-            chat_participants.delete().where(chat_participants.c.chat_id == chat_id)
-        )
-        
-        # Add new participants
-        participants = db.query(User).filter(User.id.in_(chat_in.participant_ids)).all()
-        for participant in participants:
-            db.execute(
-                chat_participants.insert().values(
-                    chat_id=chat_id,
-                    user_id=participant.id
-                )
-            )
+        await sync_participants(db, chat, set(chat_in.participant_ids))
     
     chat.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(chat)
+    await db.commit()
+    if load:
+        return await reload_chat(db, chat.id, load)
+    await db.refresh(chat)
     return chat
 
-async def delete_chat(db: Session, chat_id: uuid.UUID, current_user_id: uuid.UUID) -> bool:
-    chat = await get_chat(db, chat_id, current_user_id)
+async def sync_participants(db: AsyncSession, chat: Chat, user_ids: Set[uuid.UUID]) -> None:
+    """
+    Make the chat's participants match `user_ids` without committing.
+    Only the difference is written, so existing rows keep their role; the
+    creator is never removed and ids of unknown users are ignored.
+    """
+    current = set((await db.execute(
+        select(chat_participants.c.user_id).where(chat_participants.c.chat_id == chat.id)
+    )).scalars().all())
+    to_remove = current - user_ids - {chat.created_by}
+    to_add = user_ids - current
+
+    if to_remove:
+        await db.execute(
+            chat_participants.delete().where(
+                chat_participants.c.chat_id == chat.id,
+                chat_participants.c.user_id.in_(to_remove)
+            )
+        )
+    if to_add:
+        # INSERT ... SELECT skips ids with no matching user in the same statement
+        await db.execute(
+            chat_participants.insert().from_select(
+                ["chat_id", "user_id", "role"],
+                select(
+                    literal(chat.id, type_=chat_participants.c.chat_id.type),
+                    User.id,
+                    literal("member", type_=chat_participants.c.role.type)
+                ).where(User.id.in_(to_add))
+            )
+        )
+    logger.info(f"Chat {chat.id} participants: +{len(to_add)} -{len(to_remove)}")
+
+async def delete_chat(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    current_user_id: uuid.UUID,
+    chat: Optional[Chat] = None
+) -> bool:
+    """Soft-delete a chat; pass `chat` if the caller already authorized it to skip the lookup."""
+    if chat is None:
+        chat = await get_chat(db, chat_id, current_user_id)
     if not chat:
         return False
     
     chat.deleted_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
     return True
 
+# Inbox orderings accepted by get_user_chats, and the Chat attribute each one pages on
+INBOX_ORDERS = {
+    "created": "created_at",
+    "activity": "last_activity_at",
+}
+
 async def get_user_chats(
-    db: Session,
+    db: AsyncSession,
     current_user_id: uuid.UUID,
+    cursor: Optional[str] = None,
     skip: int = 0,
-    limit: int = 100
-) -> Tuple[List[Chat], List[Chat]]:
-    """Get both created and participated chats for a user."""
+    limit: int = 100,
+    load: Optional[str] = None,
+    order: str = "created"
+) -> List[Tuple[Chat, bool]]:
+    """
+    Get the user's inbox: chats they created or participate in, newest first,
+    or most recently active first with order="activity". Returns
+    (chat, is_creator) pairs fetched in a single query, so the cursor (or the
+    deprecated skip) pages through the merged list.
+    """
+    key = INBOX_ORDERS[order]
     logger.info(f"Getting chats for user {current_user_id}")
-    
-    # Get created chats
-    created_chats = db.query(Chat).filter(
-        Chat.created_by == current_user_id,
-        Chat.deleted_at.is_(None)
-    ).offset(skip).limit(limit).all()
-    logger.info(f"Found {len(created_chats)} created chats")
-    
-    # Get participated chats (excluding created ones)
-    participated_chats = db.query(Chat).join(
-        chat_participants,
-        Chat.id == chat_participants.c.chat_id
-    ).filter(
-        chat_participants.c.user_id == current_user_id,
-        Chat.created_by != current_user_id,
-        Chat.deleted_at.is_(None)
-    ).offset(skip).limit(limit).all()
-    logger.info(f"Found {len(participated_chats)} participated chats")
-    
-    # Verify participant status for each chat
-    for chat in created_chats + participated_chats:
-        participant = db.execute(
-            chat_participants.select().where(
-                chat_participants.c.chat_id == chat.id,
-                chat_participants.c.user_id == current_user_id
-            )
-        ).first()
-        if not participant:
-            logger.warning(f"User {current_user_id} is not a participant in chat {chat.id} but chat appears in their list")
-    
-    return created_chats, participated_chats
+
+    # Both branches are served by indexes (ix_chats_created_by_active and
+    # ix_chat_participants_user_id_chat_id); UNION also drops the overlap
+    inbox = union(
+        select(Chat.id.label("chat_id")).where(
+            Chat.created_by == current_user_id,
+            Chat.deleted_at.is_(None)
+        ),
+        select(chat_participants.c.chat_id).where(
+            chat_participants.c.user_id == current_user_id
+        )
+    ).subquery()
+
+    query = (
+        select(Chat, (Chat.created_by == current_user_id).label("is_creator"))
+        .join(inbox, Chat.id == inbox.c.chat_id)
+        .where(Chat.deleted_at.is_(None))
+    )
+    if cursor:
+        query = query.where(keyset_filter(Chat, cursor, key=key))
+    rows = (await db.execute(
+        query.options(*chat_load_options(load))
+        .order_by(*keyset_order(Chat, key=key))
+        .offset(skip)
+        .limit(limit)
+    )).all()
+    logger.info(f"Found {len(rows)} chats")
+
+    return [(chat, bool(is_creator)) for chat, is_creator in rows]
+
+def message_preview(content: str) -> str:
+    """The start of a message as shown in inbox rows, on a single line."""
+    preview = " ".join(content.split())
+    if len(preview) > MESSAGE_PREVIEW_LENGTH:
+        preview = preview[:MESSAGE_PREVIEW_LENGTH - 1] + "\u2026"
+    return preview
+
+async def record_message(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    created_at: datetime,
+    content: str,
+    count: int = 1
+) -> None:
+    """
+    Count `count` new messages against their chat and, unless a later one was
+    already recorded, make the one at `created_at` (the newest of them) the
+    chat's latest. One UPDATE, so concurrent senders can't lose each other's
+    increments.
+    """
+    chats = Chat.__table__
+    is_latest = or_(chats.c.last_message_at.is_(None), chats.c.last_message_at <= created_at)
+    await db.execute(
+        chats.update()
+        .where(chats.c.id == chat_id)
+        .values(
+            message_count=chats.c.message_count + count,
+            last_message_at=case((is_latest, created_at), else_=chats.c.last_message_at),
+            last_message_preview=case((is_latest, message_preview(content)), else_=chats.c.last_message_preview),
+            # Activity isn't an edit of the chat itself
+            updated_at=chats.c.updated_at
+        )
+    )
+    await db.commit()
 
 async def get_chat_messages(
-    db: Session,
+    db: AsyncSession,
     chat_id: uuid.UUID,
     current_user_id: uuid.UUID,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100
 ) -> List[Message]:
@@ -252,19 +390,28 @@ async def get_chat_messages(
     if not chat:
         return []
     
-    return db.query(Message).filter(
-        Message.chat_id == chat_id
-    ).order_by(Message.created_at.desc()).offset(skip).limit(limit).all() 
+    query = select(Message).where(Message.chat_id == chat_id)
+    if cursor:
+        query = query.where(keyset_filter(Message, cursor))
+    result = await db.execute(
+        query.order_by(*keyset_order(Message)).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
 
-def get(db: Session, id: uuid.UUID) -> Optional[Chat]:
-    return db.query(Chat).filter(Chat.id == id).first()
+async def get(db: AsyncSession, id: uuid.UUID) -> Optional[Chat]:
+    result = await db.execute(select(Chat).where(Chat.id == id))
+    return result.scalars().first()
 
-def get_multi(
-    db: Session, *, skip: int = 0, limit: int = 100
+async def get_multi(
+    db: AsyncSession, *, cursor: Optional[str] = None, skip: int = 0, limit: int = 100
 ) -> List[Chat]:
-    return db.query(Chat).offset(skip).limit(limit).all()
+    query = select(Chat).order_by(*keyset_order(Chat, descending=False))
+    if cursor:
+        query = query.where(keyset_filter(Chat, cursor, descending=False))
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
 
-def create(db: Session, *, obj_in: ChatCreate) -> Chat:
+async def create(db: AsyncSession, *, obj_in: ChatCreate) -> Chat:
     try:
         logger.info(f"Creating chat with name: {obj_in.name}")
         db_obj = Chat(
@@ -272,44 +419,44 @@ def create(db: Session, *, obj_in: ChatCreate) -> Chat:
             description=obj_in.description,
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
         logger.info(f"Chat created successfully with ID: {db_obj.id}")
         return db_obj
     except Exception as e:
         logger.error(f"Error creating chat: {str(e)}", exc_info=True)
-        db.rollback()
+        await db.rollback()
         raise
 
-def update(
-    db: Session, *, db_obj: Chat, obj_in: ChatUpdate
+async def update(
+    db: AsyncSession, *, db_obj: Chat, obj_in: ChatUpdate
 ) -> Chat:
     try:
         update_data = obj_in.dict(exclude_unset=True)
         for field in update_data:
             setattr(db_obj, field, update_data[field])
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
         return db_obj
     except Exception as e:
         logger.error(f"Error updating chat: {str(e)}", exc_info=True)
-        db.rollback()
+        await db.rollback()
         raise
 
-def remove(db: Session, *, id: uuid.UUID) -> Chat:
+async def remove(db: AsyncSession, *, id: uuid.UUID) -> Chat:
     try:
-        obj = db.query(Chat).get(id)
-        db.delete(obj)
-        db.commit()
+        obj = await db.get(Chat, id)
+        await db.delete(obj)
+        await db.commit()
         return obj
     except Exception as e:
         logger.error(f"Error deleting chat: {str(e)}", exc_info=True)
-        db.rollback()
+        await db.rollback()
         raise
 
-def add_participant(
-    db: Session, *, chat_id: uuid.UUID, user_id: uuid.UUID, role: str = "member"
+async def add_participant(
+    db: AsyncSession, *, chat_id: uuid.UUID, user_id: uuid.UUID, role: str = "member"
 ) -> None:
     try:
         stmt = chat_participants.insert().values(
@@ -317,71 +464,60 @@ def add_participant(
             user_id=user_id,
             role=role
         )
-        db.execute(stmt)
-        db.commit()
+        await db.execute(stmt)
+        await db.commit()
     except Exception as e:
         logger.error(f"Error adding participant: {str(e)}", exc_info=True)
-        db.rollback()
+        await db.rollback()
         raise
 
-def remove_participant(
-    db: Session, *, chat_id: uuid.UUID, user_id: uuid.UUID
+async def remove_participant(
+    db: AsyncSession, *, chat_id: uuid.UUID, user_id: uuid.UUID
 ) -> None:
     try:
         stmt = chat_participants.delete().where(
             chat_participants.c.chat_id == chat_id,
             chat_participants.c.user_id == user_id
         )
-        db.execute(stmt)
-        db.commit()
+        await db.execute(stmt)
+        await db.commit()
     except Exception as e:
         logger.error(f"Error removing participant: {str(e)}", exc_info=True)
-        db.rollback()
+        await db.rollback()
         raise
 
 async def fix_chat_participant_status(
-    db: Session,
+    db: AsyncSession,
     chat_id: uuid.UUID,
     user_id: uuid.UUID
 ) -> bool:
     """Fix inconsistent chat participant status by adding user as participant if they should be."""
     try:
-        # Check if chat exists and is not deleted
-        chat = db.query(Chat).filter(
-            Chat.id == chat_id,
-            Chat.deleted_at.is_(None)
-        ).first()
-        
-        if not chat:
+        # Check if chat exists, is not deleted and whether user is already a participant
+        access = await get_chat_access(db, chat_id, user_id)
+        if not access or access[0].deleted_at is not None:
             logger.warning(f"Chat {chat_id} not found or deleted")
             return False
-            
-        # Check if user is already a participant
-        participant = db.execute(
-            chat_participants.select().where(
-                chat_participants.c.chat_id == chat_id,
-                chat_participants.c.user_id == user_id
-            )
-        ).first()
+        chat, participant_role = access
         
-        if participant:
+        if participant_role is not None:
             logger.info(f"User {user_id} is already a participant in chat {chat_id}")
             return True
             
         # Add user as participant with appropriate role
         role = "admin" if chat.created_by == user_id else "member"
-        db.execute(
+        await db.execute(
             chat_participants.insert().values(
                 chat_id=chat_id,
                 user_id=user_id,
                 role=role
             )
         )
-        db.commit()
+        await db.commit()
         logger.info(f"Added user {user_id} as {role} to chat {chat_id}")
         return True
         
     except Exception as e:
         logger.error(f"Error fixing chat participant status: {str(e)}")
-        db.rollback()
+        await db.rollback()
         return False 
\ No newline at end of file
@@ -1,34 +1,43 @@
 from typing import List, Optional
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.pagination import keyset_filter, keyset_order
 from app.crud.base import CRUDBase
 from app.models.message import Message
 from app.schemas.chat import MessageCreate, MessageUpdate
 
 class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
-    def get_chat_messages(
-        self, db: Session, *, chat_id: UUID, skip: int = 0, limit: int = 100
+    async def get_chat_messages(
+        self,
+        db: AsyncSession,
+        *,
+        chat_id: UUID,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
     ) -> List[Message]:
-        return (
-            db.query(Message)
-            .filter(Message.chat_id == chat_id)
-            .order_by(Message.created_at.desc())
+        query = select(Message).where(Message.chat_id == chat_id)
+        if cursor:
+            query = query.where(keyset_filter(Message, cursor))
+        result = await db.execute(
+            query.order_by(*keyset_order(Message))
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return result.scalars().all()
 
-    def get_user_messages(
-        self, db: Session, *, user_id: UUID, skip: int = 0, limit: int = 100
+    async def get_user_messages(
+        self, db: AsyncSession, *, user_id: UUID, skip: int = 0, limit: int = 100
     ) -> List[Message]:
-        return (
-            db.query(Message)
-            .filter(Message.sender_id == user_id)
+        result = await db.execute(
+            select(Message)
+            .where(Message.sender_id == user_id)
             .order_by(Message.created_at.desc())
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return result.scalars().all()
 
-message_crud = CRUDMessage(Message) 
\ No newline at end of file
+message_crud = CRUDMessage(Message)
@@ -1,55 +1,117 @@
-from typing import Any, Dict, Optional, Union, List
+from typing import Any, Dict, Iterable, Optional, Union, List
+from datetime import datetime, timedelta
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
+from app.core.cache import principal_cache, token_versions
+from app.core.config import settings
+from app.core.pagination import keyset_filter, keyset_order
+from app.core.security import get_password_hash_async, verify_password_async
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def get(db: Session, id: str) -> Optional[User]:
-    return db.query(User).filter(User.id == id).first()
+TOKEN_BOUND_FIELDS = {"email", "username", "is_active", "hashed_password"}
 
-def get_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
+async def get(db: AsyncSession, id: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.id == id))
+    return result.scalars().first()
 
-def get_by_username(db: Session, username: str) -> Optional[User]:
-    return db.query(User).filter(User.username == username).first()
+async def get_many(db: AsyncSession, ids: Iterable[Any]) -> Dict[Any, User]:
+    """Users by id, in one query; ids without a user are left out."""
+    ids = list(ids)
+    if not ids:
+        return {}
+    result = await db.execute(select(User).where(User.id.in_(ids)))
+    return {user.id: user for user in result.scalars().all()}
 
-def get_multi(db: Session, *, skip: int = 0, limit: int = 100) -> List[User]:
-    return db.query(User).offset(skip).limit(limit).all()
+async def get_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
-def authenticate(db: Session, *, email: str, password: str) -> Optional[User]:
-    user = get_by_email(db, email=email)
+async def get_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
+
+async def get_token_versions(db: AsyncSession) -> Dict[Any, int]:
+    """
+    Token versions of users whose tokens were revoked within the access token
+    lifetime. Tokens revoked earlier have expired anyway, so everyone else can
+    be treated as on version 0.
+    """
+    revoked_since = datetime.utcnow() - timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    result = await db.execute(
+        select(User.id, User.token_version).where(User.token_version_changed_at > revoked_since)
+    )
+    return dict(result.all())
+
+def escape_like(term: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally."""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+async def search_typeahead(db: AsyncSession, *, term: str, limit: int = 10) -> List[Any]:
+    """
+    Active users whose username matches `term`, as (id, username) rows.
+    Prefix matches rank first. Terms shorter than a trigram only match as a
+    prefix, since a substring search on one or two characters matches
+    nearly everyone. Both forms are served by ix_users_username_trgm.
+    """
+    pattern = escape_like(term)
+    prefix_match = User.username.ilike(f"{pattern}%")
+    if len(term) < 3:
+        condition = prefix_match
+    else:
+        condition = User.username.ilike(f"%{pattern}%")
+    result = await db.execute(
+        select(User.id, User.username)
+        .where(condition, User.is_active.is_(True))
+        .order_by(prefix_match.desc(), func.length(User.username), User.username)
+        .limit(limit)
+    )
+    return result.all()
+
+async def get_multi(
+    db: AsyncSession, *, cursor: Optional[str] = None, skip: int = 0, limit: int = 100
+) -> List[User]:
+    query = select(User).order_by(*keyset_order(User, descending=False))
+    if cursor:
+        query = query.where(keyset_filter(User, cursor, descending=False))
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+async def authenticate(db: AsyncSession, *, email: str, password: str) -> Optional[User]:
+    user = await get_by_email(db, email=email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
-def create(db: Session, *, obj_in: UserCreate) -> User:
+async def create(db: AsyncSession, *, obj_in: UserCreate) -> User:
+    hashed_password = await get_password_hash_async(obj_in.password)
     try:
         logger.info(f"Creating user with email: {obj_in.email} and username: {obj_in.username}")
         db_obj = User(
             email=obj_in.email,
                 username=obj_in.username,
-            hashed_password=get_password_hash(obj_in.password),
+            hashed_password=hashed_password,
             is_active=True,
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
         logger.info(f"User created successfully with ID: {db_obj.id}")
         return db_obj
     except Exception as e:
         logger.error(f"Error creating user: {str(e)}", exc_info=True)
-        db.rollback()
+        await db.rollback()
         raise
 
-def update(
-    db: Session, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
+async def update(
+    db: AsyncSession, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
 ) -> User:
     try:
         if isinstance(obj_in, dict):
@@ -57,16 +119,45 @@ def update(
         else:
             update_data = obj_in.dict(exclude_unset=True)
         if update_data.get("password"):
-            hashed_password = get_password_hash(update_data["password"])
+            hashed_password = await get_password_hash_async(update_data["password"])
             del update_data["password"]
             update_data["hashed_password"] = hashed_password
+        # Tokens embed these fields, so changing any of them revokes outstanding tokens
+        revoke = any(
+            field in TOKEN_BOUND_FIELDS and getattr(db_obj, field) != value
+            for field, value in update_data.items()
+        )
         for field in update_data:
             setattr(db_obj, field, update_data[field])
+        if revoke:
+            db_obj.token_version = (db_obj.token_version or 0) + 1
+            db_obj.token_version_changed_at = datetime.utcnow()
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        return db_obj 
+        await db.commit()
+        await db.refresh(db_obj)
+        # Drop cached principals so is_active and profile changes apply immediately
+        principal_cache.invalidate_user(db_obj.id)
+        if revoke:
+            token_versions.set(db_obj.id, db_obj.token_version)
+        return db_obj
     except Exception as e:
         logger.error(f"Error updating user: {str(e)}", exc_info=True)
-        db.rollback()
-        raise 
\ No newline at end of file
+        await db.rollback()
+        raise
+
+async def revoke_tokens(db: AsyncSession, *, db_obj: User) -> User:
+    """Invalidate every access token issued to the user so far."""
+    try:
+        db_obj.token_version = (db_obj.token_version or 0) + 1
+        db_obj.token_version_changed_at = datetime.utcnow()
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        principal_cache.invalidate_user(db_obj.id)
+        token_versions.set(db_obj.id, db_obj.token_version)
+        logger.info(f"Revoked tokens for user {db_obj.id}, now at version {db_obj.token_version}")
+        return db_obj
+    except Exception as e:
+        logger.error(f"Error revoking tokens: {str(e)}", exc_info=True)
+        await db.rollback()
+        raise
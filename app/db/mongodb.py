@@ -0,0 +1,147 @@
+"""
+The process's single MongoDB client.
+
+connect_mongodb() creates it in the app's startup hook, with the pool sizes
+and timeouts from Settings, and close_mongodb() closes it on shutdown.
+Everything else reaches Mongo through get_database(). Every uvicorn worker
+is its own process with its own pool, so a deployment can open up to
+workers x MONGODB_MAX_POOL_SIZE connections.
+
+pool_stats counts checkouts, the time spent waiting for a connection and
+the connections in use. If waits grow while in_use sits at the pool size,
+the pool is too small for the worker's concurrency. If max_in_use stays
+well below the pool size, the pool can shrink.
+"""
+import logging
+import time
+from threading import Lock, local
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class MongoPoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters of the client; events arrive on Motor's worker threads."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._checkout = local()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.open = 0
+            self.in_use = 0
+            self.max_in_use = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "open": self.open,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_ms_total": round(self.wait_seconds * 1000, 2),
+                "wait_ms_max": round(self.max_wait_seconds * 1000, 2),
+            }
+
+    def _waited(self) -> float:
+        # A thread checks out one connection at a time, so its start is thread-local
+        started = getattr(self._checkout, "started", None)
+        self._checkout.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event) -> None:
+        self._checkout.started = time.perf_counter()
+
+    def connection_checked_out(self, event) -> None:
+        waited = self._waited()
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def connection_check_out_failed(self, event) -> None:
+        waited = self._waited()
+        with self._lock:
+            self.checkout_failures += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            self.open -= 1
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+pool_stats = MongoPoolStats()
+
+_client: Optional[AsyncIOMotorClient] = None
+
+def create_client(**options) -> AsyncIOMotorClient:
+    """A client configured from Settings; `options` override or add client options."""
+    options = {
+        "uuidRepresentation": settings.MONGODB_UUID_REPRESENTATION,
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [pool_stats],
+        **options,
+    }
+    return AsyncIOMotorClient(settings.MONGODB_URL, **options)
+
+def connect_mongodb() -> AsyncIOMotorClient:
+    """Create the shared client; a no-op if it already exists."""
+    global _client
+    if _client is None:
+        pool_stats.reset()
+        _client = create_client()
+    return _client
+
+def close_mongodb() -> None:
+    global _client
+    if _client is not None:
+        logger.info(f"Closing MongoDB client, pool stats: {pool_stats.snapshot()}")
+        _client.close()
+        _client = None
+
+def get_client() -> AsyncIOMotorClient:
+    if _client is None:
+        raise RuntimeError("MongoDB client is not connected; call connect_mongodb() first")
+    return _client
+
+def get_database() -> AsyncIOMotorDatabase:
+    return get_client()[settings.MONGODB_DB]
@@ -0,0 +1,111 @@
+"""
+Monthly range partitions of the messages table.
+
+messages is partitioned on created_at with one partition per calendar month,
+named messages_pYYYY_MM. maintain_message_partitions keeps the coming months
+created ahead of time and, when a retention is configured, detaches and drops
+the partitions that fall entirely before it. It runs at startup and can be
+scheduled on its own:
+    python -m app.db.partitions
+"""
+import logging
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = "messages"
+PARTITION_NAME = re.compile(r"^messages_p(\d{4})_(\d{2})$")
+# Serializes maintenance between workers starting at the same time
+MAINTENANCE_LOCK_ID = 0x6D736770
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARTITIONED_TABLE}_p{month:%Y_%m}"
+
+def existing_partitions(connection: Connection) -> List[date]:
+    """Months that currently have an attached partition, oldest first."""
+    names = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = :table"
+    ), {"table": PARTITIONED_TABLE}).scalars()
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+def create_message_partitions(connection: Connection, first: date, last: date) -> List[str]:
+    """Create the monthly partitions from `first` through `last` that don't exist yet."""
+    existing = set(existing_partitions(connection))
+    created = []
+    month = month_start(first)
+    while month <= month_start(last):
+        if month not in existing:
+            connection.execute(text(
+                f"CREATE TABLE {partition_name(month)} PARTITION OF {PARTITIONED_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+def drop_expired_message_partitions(connection: Connection, before: date) -> List[str]:
+    """Detach and drop every partition whose month ends on or before `before`."""
+    dropped = []
+    for month in existing_partitions(connection):
+        if add_months(month, 1) > before:
+            break
+        # Detaching first keeps the DROP from locking the parent for its duration
+        connection.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {partition_name(month)}"))
+        connection.execute(text(f"DROP TABLE {partition_name(month)}"))
+        dropped.append(partition_name(month))
+    return dropped
+
+def maintain_message_partitions(
+    connection: Connection,
+    *,
+    months_ahead: Optional[int] = None,
+    retention_months: Optional[int] = None,
+    today: Optional[date] = None
+) -> None:
+    """
+    Make sure this month and the next `months_ahead` have partitions, then drop
+    those older than `retention_months` (0 keeps everything).
+    """
+    if months_ahead is None:
+        months_ahead = settings.MESSAGE_PARTITIONS_AHEAD
+    if retention_months is None:
+        retention_months = settings.MESSAGE_RETENTION_MONTHS
+    this_month = month_start(today or datetime.utcnow().date())
+
+    connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+    created = create_message_partitions(connection, this_month, add_months(this_month, months_ahead))
+    if created:
+        logger.info(f"Created message partitions: {', '.join(created)}")
+    if retention_months > 0:
+        dropped = drop_expired_message_partitions(connection, add_months(this_month, -retention_months))
+        if dropped:
+            logger.info(f"Dropped expired message partitions: {', '.join(dropped)}")
+
+if __name__ == "__main__":
+    from app.db.session import engine
+
+    logging.basicConfig(level=logging.INFO)
+    with engine.begin() as connection:
+        maintain_message_partitions(connection)
@@ -1,16 +1,70 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import random
+from typing import Any
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.selectable import CompoundSelect, Select
+from app.core.cache import recent_writers
 from app.core.config import settings
 
 engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# MongoDB client
-from motor.motor_asyncio import AsyncIOMotorClient
-from app.core.config import settings
+# asyncpg-backed engine used by the request handlers so queries don't block the event loop
+async_engine = create_async_engine(settings.SQLALCHEMY_ASYNC_DATABASE_URI, pool_pre_ping=True)
+replica_engines = [
+    create_async_engine(uri.replace("postgresql://", "postgresql+asyncpg://", 1), pool_pre_ping=True)
+    for uri in settings.SQLALCHEMY_REPLICA_URIS
+]
+
+class RoutingSession(Session):
+    """
+    Sends plain SELECTs to a random replica and everything else to the primary.
+    Once the session has written, or its user wrote within the
+    read-your-writes window, all statements go to the primary. Sessions
+    pinned with pin_to_primary use the primary throughout, so the reads a
+    later write is based on are never stale.
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not replica_engines or self._use_primary(clause):
+            return async_engine.sync_engine
+        return random.choice(replica_engines).sync_engine
+
+    def _use_primary(self, clause) -> bool:
+        is_read = isinstance(clause, (Select, CompoundSelect)) and clause._for_update_arg is None
+        if self._flushing or not is_read:
+            # Writes, locking reads and raw SQL; later reads must see their effects
+            self.info["wrote"] = True
+            return True
+        if self.info.get("primary") or self.info.get("wrote"):
+            return True
+        user_id = self.info.get("user_id")
+        return user_id is not None and recent_writers.get(user_id) is not None
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_writer(session: Session) -> None:
+    user_id = session.info.get("user_id")
+    if user_id is not None and session.info.get("wrote"):
+        recent_writers.set(user_id, True)
+
+def pin_to_primary(db: AsyncSession) -> None:
+    """Send every statement of the session to the primary, reads included."""
+    db.info["primary"] = True
+
+def track_session_user(db: AsyncSession, user_id: Any) -> None:
+    """Tie the session to the authenticated user for read-your-writes routing."""
+    db.info["user_id"] = str(user_id)
+
+AsyncSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession
+)
 
-mongodb_client = AsyncIOMotorClient(settings.MONGODB_URL)
-mongodb_db = mongodb_client[settings.MONGODB_DB]
+# The MongoDB client is created and closed with the app, see app/db/mongodb.py
 
 # Redis client
 from redis import Redis
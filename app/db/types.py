@@ -0,0 +1,20 @@
+from sqlalchemy.types import UserDefinedType
+
+class LTree(UserDefinedType):
+    """
+    Postgres `ltree` label path (needs the ltree extension). Values are dotted
+    label strings; the comparator exposes the operators a GiST index serves.
+    """
+    cache_ok = True
+
+    def get_col_spec(self, **kw) -> str:
+        return "LTREE"
+
+    class comparator_factory(UserDefinedType.Comparator):
+        def descendant_of(self, other):
+            """`<@`: this path equals `other` or lies below it."""
+            return self.op("<@", is_comparison=True)(other)
+
+        def ancestor_of(self, other):
+            """`@>`: this path equals `other` or lies above it."""
+            return self.op("@>", is_comparison=True)(other)
@@ -1,8 +1,14 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.v1.api import api_router
 from app.core.cache import init_cache
+from app.core.query_stats import QueryStatsMiddleware
+from app.db.mongodb import close_mongodb, connect_mongodb, pool_stats
+from app.db.partitions import maintain_message_partitions
+from app.db.session import async_engine
+from app.services.mongodb.message_service import message_service
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -38,6 +44,7 @@ app.add_middleware(
     expose_headers=["*"],
     max_age=3600
 )
+app.add_middleware(QueryStatsMiddleware)
 
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -45,7 +52,35 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 @app.on_event("startup")
 async def startup_event():
     await init_cache()
+    connect_mongodb()
+    # Creates the upcoming messages partitions; schedule `python -m app.db.partitions` for long-lived deployments
+    async with async_engine.begin() as conn:
+        await conn.run_sync(maintain_message_partitions)
+    # Fails startup if an index is missing or the planner doesn't use it
+    await message_service.ensure_indexes()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await message_service.write_buffer.close()
+    close_mongodb()
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to Chat API with Branching"} 
\ No newline at end of file
+    return {"message": "Welcome to Chat API with Branching"}
+
+@app.get("/health/mongodb")
+async def mongodb_pool():
+    """
+    This worker's MongoDB pool usage, for sizing MONGODB_MAX_POOL_SIZE, and
+    the batches its message write buffer flushed.
+    """
+    return {
+        "pid": os.getpid(),
+        "max_pool_size": settings.MONGODB_MAX_POOL_SIZE,
+        "min_pool_size": settings.MONGODB_MIN_POOL_SIZE,
+        **pool_stats.snapshot(),
+        "write_buffer": {
+            "enabled": settings.MESSAGE_WRITE_BUFFER,
+            **message_service.write_buffer.stats.snapshot()
+        }
+    } 
\ No newline at end of file
@@ -2,13 +2,17 @@ from datetime import datetime
 from typing import List
 from uuid import UUID, uuid4
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String, Text, Table
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, Table, func
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
 from app.models.message import Message
 
+# Length of chats.last_message_preview
+MESSAGE_PREVIEW_LENGTH = 140
+
 # Association table for chat participants
 chat_participants = Table(
     "chat_participants",
@@ -17,6 +21,8 @@ chat_participants = Table(
     Column("user_id", PGUUID(as_uuid=True), ForeignKey("users.id"), primary_key=True),
     Column("role", String(50), nullable=False),  # admin, member
     Column("created_at", DateTime, default=datetime.utcnow),
+    # The primary key leads with chat_id; lookups of a user's chats need user_id first
+    Index("ix_chat_participants_user_id_chat_id", "user_id", "chat_id"),
 )
 
 class Chat(Base):
@@ -30,6 +36,36 @@ class Chat(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
+    # Denormalized from the messages collection by crud.chat.record_message;
+    # app.services.chat_activity repairs any drift
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime, nullable=True)
+    last_message_preview = Column(String(MESSAGE_PREVIEW_LENGTH), nullable=True)
+
+    __table_args__ = (
+        # Chats created by a user that are not soft-deleted (get_user_chats)
+        Index(
+            "ix_chats_created_by_active",
+            "created_by",
+            postgresql_where=deleted_at.is_(None)
+        ),
+        # Inbox ordered by recent activity (get_user_chats(order="activity"))
+        Index(
+            "ix_chats_last_activity_at_id",
+            func.coalesce(last_message_at, created_at).desc(),
+            id.desc(),
+            postgresql_where=deleted_at.is_(None)
+        ),
+    )
+
+    @hybrid_property
+    def last_activity_at(self):
+        """When the chat last had a message, or was created if it never had one."""
+        return self.last_message_at or self.created_at
+
+    @last_activity_at.expression
+    def last_activity_at(cls):
+        return func.coalesce(cls.last_message_at, cls.created_at)
 
     # Relationships
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
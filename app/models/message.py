@@ -1,12 +1,21 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text
+from sqlalchemy import Boolean, Column, String, DateTime, ForeignKey, Index, Integer, Sequence, Text, event, select
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
 from datetime import datetime
 
 from app.db.base_class import Base
+from app.db.types import LTree
+
+# Source of branch path labels; unique, so concurrent replies never share a path
+branch_label_seq = Sequence("message_branch_label_seq", metadata=Base.metadata)
 
 class Message(Base):
+    """
+    Range partitioned by month on created_at (see app.db.partitions), so the
+    table's primary key is (id, created_at) and nothing can hold a foreign key
+    to messages.id; the ORM still identifies rows by id alone.
+    """
     __tablename__ = "messages"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -14,12 +23,47 @@ class Message(Base):
     message_type = Column(String, nullable=False, default="text")  # 'text', 'image', 'file', etc.
     chat_id = Column(UUID(as_uuid=True), ForeignKey("chats.id"), nullable=False)
     sender_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    parent_message_id = Column(UUID(as_uuid=True), ForeignKey("messages.id"), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    parent_message_id = Column(UUID(as_uuid=True), nullable=True)
+    # Materialized path from the thread root down to this message, e.g. '12.40.41'
+    branch_path = Column(LTree(), nullable=True)
+    branch_level = Column(Integer, nullable=False, default=0, server_default="0")
+    is_branch_root = Column(Boolean(), nullable=False, default=False, server_default="false")
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # A chat's history in keyset order (CRUDMessage.get_chat_messages)
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+        # Subtree (<@), ancestor (@>) and lquery (~) lookups on branch paths
+        Index("ix_messages_branch_path", "branch_path", postgresql_using="gist"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    __mapper_args__ = {"primary_key": [id]}
+
     # Relationships
     sender = relationship("User", back_populates="messages")
     chat = relationship("Chat", back_populates="messages")
-    parent_message = relationship("Message", remote_side=[id], backref="replies") 
\ No newline at end of file
+    parent_message = relationship(
+        "Message",
+        primaryjoin="Message.parent_message_id == Message.id",
+        foreign_keys=[parent_message_id],
+        remote_side=[id],
+        backref="replies"
+    )
+
+@event.listens_for(Message, "before_insert")
+def _assign_branch_path(mapper, connection, target: Message) -> None:
+    """Give messages inserted without a branch path one below their parent."""
+    if target.branch_path is not None:
+        return
+    label = connection.scalar(select(branch_label_seq.next_value()))
+    if target.parent_message_id is None:
+        target.branch_path, target.branch_level = str(label), 0
+        return
+    parent_path, parent_level = connection.execute(
+        select(Message.branch_path, Message.branch_level)
+        .where(Message.id == target.parent_message_id)
+    ).one()
+    target.branch_path = f"{parent_path}.{label}"
+    target.branch_level = parent_level + 1
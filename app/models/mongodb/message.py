@@ -1,7 +1,8 @@
 from datetime import datetime
-from typing import Optional, List
+from functools import lru_cache
+from typing import FrozenSet, Optional, List, Type
 from uuid import UUID, uuid4
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
 
 class MongoMessage(BaseModel):
     id: UUID = Field(default_factory=uuid4)
@@ -19,4 +20,27 @@ class MongoMessage(BaseModel):
         json_encoders = {
             UUID: str,
             datetime: lambda dt: dt.isoformat()
-        } 
\ No newline at end of file
+        }
+
+# Returned by every projected read: the id, and the key pages are ordered by
+REQUIRED_FIELDS = frozenset({"id", "created_at"})
+
+@lru_cache(maxsize=None)
+def message_model(fields: FrozenSet[str]) -> Type[BaseModel]:
+    """
+    A MongoMessage cut down to `fields`, for reads that only project those.
+    If thread_messages is kept, the replies in it are cut down the same way.
+    """
+    unknown = fields - set(MongoMessage.model_fields)
+    if unknown:
+        raise ValueError(f"Unknown message fields: {', '.join(sorted(unknown))}")
+    model = create_model(
+        "MongoMessageFields",
+        **{
+            name: (MongoMessage.model_fields[name].annotation, MongoMessage.model_fields[name])
+            for name in sorted(fields - {"thread_messages"})
+        }
+    )
+    if "thread_messages" in fields:
+        model = create_model("MongoMessageFields", __base__=model, thread_messages=(List[model], []))
+    return model
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, String, DateTime
+from sqlalchemy import Boolean, Column, String, DateTime, Index, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -15,9 +15,34 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean(), default=True)
+    # Bumped to revoke every outstanding access token of the user
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # When token_version was last bumped; the tokens it revoked have all expired
+    # ACCESS_TOKEN_EXPIRE_MINUTES later
+    token_version_changed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # Keyset pagination of the user list (read_users, get_multi)
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # Loading the token version map (get_token_versions)
+        Index("ix_users_token_version_changed_at", "token_version_changed_at"),
+        # Substring and prefix ILIKE searches (read_users search, typeahead); needs pg_trgm
+        Index(
+            "ix_users_username_trgm",
+            "username",
+            postgresql_using="gin",
+            postgresql_ops={"username": "gin_trgm_ops"}
+        ),
+        Index(
+            "ix_users_email_trgm",
+            "email",
+            postgresql_using="gin",
+            postgresql_ops={"email": "gin_trgm_ops"}
+        ),
+    )
+
     # Relationships
     messages = relationship("Message", back_populates="sender", cascade="all, delete-orphan")
     chat_participations = relationship(
@@ -1,6 +1,6 @@
 from .token import Token, TokenPayload
 from .chat import Chat, ChatCreate, ChatUpdate, Message, MessageCreate, MessageUpdate
-from .user import User, UserCreate, UserUpdate
+from .user import User, UserCreate, UserSummary, UserUpdate
 
 __all__ = [
     "Token",
@@ -13,5 +13,6 @@ __all__ = [
     "MessageUpdate",
     "User",
     "UserCreate",
+    "UserSummary",
     "UserUpdate",
 ] 
\ No newline at end of file
@@ -1,8 +1,10 @@
 from datetime import datetime
 from typing import Optional, List
-from pydantic import BaseModel, UUID4, EmailStr, validator
+from pydantic import BaseModel, Field, UUID4, EmailStr, validator
 import uuid
 
+from app.core.config import settings
+
 class UserBase(BaseModel):
     email: EmailStr
     username: str
@@ -35,6 +37,9 @@ class ChatInDBBase(ChatBase):
     created_at: datetime
     updated_at: datetime
     deleted_at: Optional[datetime] = None
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -54,6 +59,29 @@ class MessageUpdate(MessageBase):
     content: Optional[str] = None
     message_type: Optional[str] = None
 
+class MessageBatchItem(MessageBase):
+    # Client-chosen ids let replies point at messages earlier in the batch and
+    # make a retried import report the messages it already wrote as duplicates
+    id: Optional[uuid.UUID] = None
+    # Original send time of imported history; defaults to now
+    created_at: Optional[datetime] = None
+
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageBatchItem] = Field(..., min_length=1, max_length=settings.MESSAGE_BATCH_MAX_SIZE)
+    # Ordered stops at the first message that fails; unordered writes every valid one
+    ordered: bool = False
+
+class MessageBatchResult(BaseModel):
+    index: int
+    id: uuid.UUID
+    created: bool
+    error: Optional[str] = None
+
+class MessageBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[MessageBatchResult]
+
 class MessageInDBBase(MessageBase):
     id: uuid.UUID
     chat_id: uuid.UUID
@@ -68,6 +96,9 @@ class MessageInDBBase(MessageBase):
 class Message(MessageInDBBase):
     sender: UserResponse
 
+class MessageTree(Message):
+    thread_messages: List['MessageTree'] = []
+
 class MessageResponse(MessageBase):
     id: UUID4
     chat_id: UUID4
@@ -88,6 +119,9 @@ class ChatResponse(ChatBase):
     created_at: datetime
     updated_at: datetime
     deleted_at: Optional[datetime] = None
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
     messages: List[MessageResponse] = []
     participants: List[UserResponse] = []
 
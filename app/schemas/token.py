@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel
 import uuid
@@ -9,4 +10,11 @@ class Token(BaseModel):
     user: User
 
 class TokenPayload(BaseModel):
-    sub: Optional[uuid.UUID] = None 
\ No newline at end of file
+    sub: Optional[uuid.UUID] = None
+    # Present only on self-contained tokens
+    ver: Optional[int] = None
+    username: Optional[str] = None
+    email: Optional[str] = None
+    is_active: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None 
\ No newline at end of file
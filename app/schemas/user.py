@@ -49,5 +49,12 @@ class UserInDBBase(UserBase):
 class User(UserInDBBase):
     pass
 
+class UserSummary(BaseModel):
+    id: uuid.UUID
+    username: str
+
+    class Config:
+        from_attributes = True
+
 class UserInDB(UserInDBBase):
     hashed_password: str 
\ No newline at end of file
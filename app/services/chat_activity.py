@@ -0,0 +1,100 @@
+"""
+Reconciles the denormalized activity columns of chats (message_count,
+last_message_at, last_message_preview) with the messages collection.
+
+crud.chat.record_message keeps them current as messages are sent, but a
+message written to Mongo whose counter update then failed, and deleted
+messages, leave them drifting. Schedule this to repair them:
+    python -m app.services.chat_activity
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import List, Optional
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.chat import message_preview
+from app.models.chat import Chat
+from app.services.mongodb.message_service import message_service
+
+logger = logging.getLogger(__name__)
+
+# Mongo stores milliseconds; smaller differences are rounding, not drift
+TIMESTAMP_TOLERANCE = timedelta(milliseconds=1)
+
+def _expected(activity: Optional[dict]) -> dict:
+    if not activity:
+        return {"message_count": 0, "last_message_at": None, "last_message_preview": None}
+    return {
+        "message_count": activity["message_count"],
+        "last_message_at": activity["last_message_at"],
+        "last_message_preview": message_preview(activity["last_content"]),
+    }
+
+def _drifted(row, expected: dict) -> bool:
+    if row.message_count != expected["message_count"] or row.last_message_preview != expected["last_message_preview"]:
+        return True
+    if row.last_message_at is None or expected["last_message_at"] is None:
+        return row.last_message_at != expected["last_message_at"]
+    return abs(row.last_message_at - expected["last_message_at"]) >= TIMESTAMP_TOLERANCE
+
+async def reconcile_chat_activity(db: AsyncSession, batch_size: int = 500) -> int:
+    """
+    Rewrite the activity columns of every chat that disagrees with Mongo;
+    returns how many rewrites it issued. A chat that record_message changed
+    after it was read is left alone until the next run, so messages sent
+    while the job runs are not lost and last_message_at never moves back.
+    """
+    chats = Chat.__table__
+    repair = (
+        update(chats)
+        .where(
+            chats.c.id == bindparam("chat_id"),
+            chats.c.message_count == bindparam("read_message_count"),
+            chats.c.last_message_at.is_not_distinct_from(bindparam("read_last_message_at")),
+        )
+        .values(
+            message_count=bindparam("message_count"),
+            last_message_at=bindparam("last_message_at"),
+            last_message_preview=bindparam("last_message_preview"),
+            updated_at=chats.c.updated_at
+        )
+    )
+    repaired, after = 0, None
+    while True:
+        query = select(chats.c.id, chats.c.message_count, chats.c.last_message_at, chats.c.last_message_preview)
+        if after is not None:
+            query = query.where(chats.c.id > after)
+        rows = (await db.execute(query.order_by(chats.c.id).limit(batch_size))).all()
+        if not rows:
+            break
+        activity = await message_service.get_chat_activity([row.id for row in rows])
+        fixes: List[dict] = []
+        for row in rows:
+            expected = _expected(activity.get(row.id))
+            if _drifted(row, expected):
+                fixes.append({
+                    "chat_id": row.id,
+                    "read_message_count": row.message_count,
+                    "read_last_message_at": row.last_message_at,
+                    **expected
+                })
+        if fixes:
+            await db.execute(repair, fixes)
+            await db.commit()
+            repaired += len(fixes)
+        after = rows[-1].id
+    logger.info(f"Reconciled chat activity, repaired {repaired} chats")
+    return repaired
+
+async def main() -> None:
+    from app.db.session import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        await reconcile_chat_activity(db)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
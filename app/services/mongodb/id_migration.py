@@ -0,0 +1,99 @@
+"""
+Online migration moving message ids from the id field onto _id.
+
+Older documents have an ObjectId _id next to the app's id UUID, so they need
+the extra messages_legacy_id index. _id can't be updated in place, so each
+batch is copied under _id = id (with any string UUIDs converted, like
+uuid_backfill) and the originals are deleted. A delete only goes through if
+the original wasn't modified after it was read; otherwise the next pass copies
+it again. MessageService finds both shapes while MONGODB_LEGACY_MESSAGE_IDS is
+on. Between a batch's copy and its delete a message briefly exists twice.
+
+Once nothing is left it drops the retired indexes and reports the index
+sizes from collStats before and after. messages_legacy_id stays until
+MONGODB_LEGACY_MESSAGE_IDS is turned off, since the id lookups use it until
+then; the next startup drops it. Safe to interrupt and rerun:
+    python -m app.services.mongodb.id_migration --batch-size 1000 --pause 0.1
+"""
+import argparse
+import asyncio
+import logging
+from uuid import UUID
+
+from pymongo import ASCENDING, DeleteOne, ReplaceOne
+
+from app.db.mongodb import close_mongodb, connect_mongodb
+from app.services.mongodb.indexes import RETIRED_MESSAGE_INDEXES, drop_indexes
+from app.services.mongodb.message_service import UUID_FIELDS, message_service
+
+logger = logging.getLogger(__name__)
+
+LEGACY = {"id": {"$exists": True}}
+
+def migrated(document: dict) -> dict:
+    """The document as stored under its own id, with every UUID field native."""
+    document = {key: value for key, value in document.items() if key != "_id"}
+    for field in UUID_FIELDS:
+        if isinstance(document.get(field), str):
+            document[field] = UUID(document[field])
+    document["_id"] = document.pop("id")
+    return document
+
+async def index_sizes(collection) -> dict:
+    stats = await collection.database.command("collStats", collection.name)
+    return {"total": stats["totalIndexSize"], **stats["indexSizes"]}
+
+async def migrate_ids(collection, batch_size: int = 1000, pause: float = 0.0) -> int:
+    """Move every legacy document onto its id; returns how many were moved."""
+    moved = 0
+    while True:
+        batch = await collection.find(LEGACY).sort("_id", ASCENDING).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        # Upsert so a copy left behind by an interrupted run is overwritten
+        await collection.bulk_write(
+            [ReplaceOne({"_id": UUID(str(document["id"]))}, migrated(document), upsert=True) for document in batch],
+            ordered=False
+        )
+        result = await collection.bulk_write(
+            [
+                DeleteOne({
+                    "_id": document["_id"],
+                    "updated_at": document.get("updated_at"),
+                    "deleted_at": document.get("deleted_at"),
+                })
+                for document in batch
+            ],
+            ordered=False
+        )
+        moved += result.deleted_count
+        logger.info(f"Moved {moved} messages onto _id so far")
+        if pause:
+            await asyncio.sleep(pause)
+    return moved
+
+async def main(batch_size: int, pause: float) -> None:
+    collection = message_service.collection
+    before = await index_sizes(collection)
+    await message_service.ensure_indexes()
+    moved = await migrate_ids(collection, batch_size, pause)
+    await drop_indexes(collection, RETIRED_MESSAGE_INDEXES)
+    after = await index_sizes(collection)
+    logger.info(f"Moved {moved} messages")
+    for name in sorted(set(before) | set(after)):
+        logger.info(f"{name:<40} {before.get(name, 0):>14,} -> {after.get(name, 0):>14,} bytes")
+    logger.info(f"Index size saved: {before['total'] - after['total']:,} bytes")
+    if not await collection.count_documents(LEGACY, limit=1):
+        logger.info("No legacy ids left: turn off MONGODB_LEGACY_MESSAGE_IDS to drop messages_legacy_id")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move message ids from the id field onto _id")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents per batch")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    connect_mongodb()
+    try:
+        asyncio.run(main(args.batch_size, args.pause))
+    finally:
+        close_mongodb()
@@ -0,0 +1,119 @@
+"""
+Declarative index registry for the Mongo collections.
+
+Each MongoIndex names the query shape it exists for. At startup
+ensure_indexes creates the indexes (a no-op for ones that already exist) and
+then explains each probe query, failing if the winning plan doesn't IXSCAN
+the index meant to serve it.
+"""
+import logging
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+class MongoIndex(NamedTuple):
+    name: str
+    keys: List[Tuple[str, int]]
+    # Extra create_index options (unique, partialFilterExpression, ...)
+    options: dict
+    # A filter and sort the services issue, which this index must serve
+    probe_filter: dict
+    probe_sort: Optional[List[Tuple[str, int]]] = None
+
+class IndexNotUsedError(RuntimeError):
+    """A registered index isn't chosen for the query it was built for."""
+
+# Sample values for the probes; only the query shape matters to the planner
+_PROBE_ID = UUID(int=0)
+
+# Lookups by id use the built-in _id index (see id_migration), plus
+# LEGACY_ID_INDEX while MONGODB_LEGACY_MESSAGE_IDS also matches the old id field
+MESSAGE_INDEXES = [
+    # Root messages of a chat page (parent_message_id None) and the replies of
+    # a message (parent_message_id set), newest or oldest first. Every read
+    # excludes deleted messages, so they are left out of the index.
+    MongoIndex(
+        name="messages_chat_parent_created_id_live",
+        keys=[("chat_id", ASCENDING), ("parent_message_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        options={"partialFilterExpression": {"deleted_at": None}},
+        probe_filter={"chat_id": _PROBE_ID, "parent_message_id": None, "deleted_at": None},
+        probe_sort=[("created_at", DESCENDING), ("_id", DESCENDING)],
+    ),
+]
+
+# Serves the id branch of MessageService._match_id for documents the
+# id_migration hasn't moved; migrated documents have no id field, so they
+# stay out of it. Dropped at startup once MONGODB_LEGACY_MESSAGE_IDS is off.
+LEGACY_ID_INDEX = MongoIndex(
+    name="messages_legacy_id",
+    keys=[("id", ASCENDING)],
+    options={"unique": True, "partialFilterExpression": {"id": {"$exists": True}}},
+    probe_filter={"id": {"$in": [_PROBE_ID], "$exists": True}},
+)
+
+def message_indexes(legacy_ids: bool) -> List[MongoIndex]:
+    return MESSAGE_INDEXES + ([LEGACY_ID_INDEX] if legacy_ids else [])
+
+# Unique on id without a partial filter: it rejects the second document
+# stored without an id field, so it is dropped at startup
+SUPERSEDED_MESSAGE_INDEXES = ["messages_id_unique"]
+
+# Superseded indexes, dropped by id_migration once no document needs them
+RETIRED_MESSAGE_INDEXES = SUPERSEDED_MESSAGE_INDEXES + ["messages_chat_parent_created_live"]
+
+def index_scans(plan: dict) -> Iterator[str]:
+    """Names of the indexes an explain() winning plan scans, at any depth."""
+    if plan.get("stage") == "IXSCAN":
+        yield plan["indexName"]
+    elif plan.get("stage") == "IDHACK":
+        # The fast path for equality on _id
+        yield "_id_"
+    # Classic plans nest through inputStage(s); slot-based ones wrap a queryPlan
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from index_scans(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from index_scans(child)
+
+async def create_indexes(collection, indexes: List[MongoIndex]) -> None:
+    await collection.create_indexes([
+        IndexModel(index.keys, name=index.name, **index.options) for index in indexes
+    ])
+
+async def drop_indexes(collection, names: List[str]) -> None:
+    for name in names:
+        try:
+            await collection.drop_index(name)
+            logger.info(f"{collection.name}: dropped index {name}")
+        except OperationFailure:
+            # Already gone
+            pass
+
+async def verify_query(
+    collection, query: dict, index_names: List[str], sort: Optional[List[Tuple[str, int]]] = None
+) -> None:
+    """Raise IndexNotUsedError unless `query` is planned with a scan of every index in `index_names`."""
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explained = await cursor.explain()
+    used = list(index_scans(explained["queryPlanner"]["winningPlan"]))
+    missing = [name for name in index_names if name not in used]
+    if missing:
+        raise IndexNotUsedError(
+            f"{collection.name}: {query} is planned with {used or 'a collection scan'}, not {', '.join(missing)}"
+        )
+    logger.info(f"{collection.name}: verified IXSCAN on {', '.join(index_names)}")
+
+async def verify_indexes(collection, indexes: List[MongoIndex]) -> None:
+    """Raise IndexNotUsedError unless every probe query is an IXSCAN of its index."""
+    for index in indexes:
+        await verify_query(collection, index.probe_filter, [index.name], index.probe_sort)
+
+async def ensure_indexes(collection, indexes: List[MongoIndex]) -> None:
+    await create_indexes(collection, indexes)
+    await verify_indexes(collection, indexes)
@@ -1,52 +1,156 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import AbstractSet, Any, Dict, List, Optional, Set
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import DESCENDING
+from pydantic import BaseModel
+from pymongo import DESCENDING, WriteConcern
+from pymongo.errors import BulkWriteError
 from bson import Binary
 
 from app.core.config import settings
-from app.models.mongodb.message import MongoMessage
+from app.core.pagination import decode_cursor
+from app.db.mongodb import get_database
+from app.models.mongodb.message import REQUIRED_FIELDS, MongoMessage, message_model
+from app.services.mongodb.indexes import (
+    LEGACY_ID_INDEX,
+    SUPERSEDED_MESSAGE_INDEXES,
+    drop_indexes,
+    ensure_indexes,
+    message_indexes,
+    verify_query,
+)
+from app.services.mongodb.write_buffer import MessageWriteBuffer
 from app.crud.user import get as get_user
 
+# A message's id is its _id; documents from before the id_migration still
+# carry it in an id field next to an ObjectId _id
+UUID_FIELDS = ("id", "chat_id", "sender_id", "parent_message_id")
+
+# Reads take an optional set of MongoMessage fields. Only those are fetched
+# (plus REQUIRED_FIELDS) and returned as a message_model cut down to them;
+# None fetches whole documents as MongoMessage.
+Fields = Optional[AbstractSet[str]]
+
+DUPLICATE_KEY = 11000
+MESSAGE_EXISTS = "Message already exists"
+# A buffered batch is acknowledged once it is in the journal; the wait is shared by the whole batch
+JOURNALED = WriteConcern(j=True)
+
+class MessageTreeTooLarge(ValueError):
+    """A message has more replies below it than a tree may hold."""
+
 class MessageService:
     def __init__(self):
-        self.client = AsyncIOMotorClient(
-            settings.MONGODB_URL,
-            uuidRepresentation="standard"
+        self.write_buffer = MessageWriteBuffer(
+            lambda messages: self.create_messages(messages, write_concern=JOURNALED),
+            max_batch=settings.MESSAGE_WRITE_BUFFER_MAX_BATCH,
+            max_delay=settings.MESSAGE_WRITE_BUFFER_MAX_DELAY_MS / 1000
         )
-        self.db = self.client[settings.MONGODB_DB]
-        self.collection = self.db.messages
 
-    def _serialize_uuid(self, uuid_obj: UUID) -> str:
-        return str(uuid_obj)
+    @property
+    def collection(self):
+        # The shared client only exists between the app's startup and shutdown
+        return get_database().messages
+
+    async def ensure_indexes(self) -> None:
+        """
+        Create the registered indexes of the messages collection and check
+        they are used, including by the id lookups of _match_id.
+        """
+        legacy_ids = settings.MONGODB_LEGACY_MESSAGE_IDS
+        retired = SUPERSEDED_MESSAGE_INDEXES + ([] if legacy_ids else [LEGACY_ID_INDEX.name])
+        await drop_indexes(self.collection, retired)
+        await ensure_indexes(self.collection, message_indexes(legacy_ids))
+        await verify_query(
+            self.collection,
+            self._match_id(UUID(int=0)),
+            ["_id_", LEGACY_ID_INDEX.name] if legacy_ids else ["_id_"]
+        )
+
+    def _match_uuid(self, value: UUID) -> Any:
+        """
+        Filter value for a UUID field. UUIDs are stored as BSON binary
+        subtype 4; until the uuid_backfill has converted older documents,
+        their string form is matched too.
+        """
+        value = UUID(str(value))
+        if settings.MONGODB_UUID_DUAL_READ:
+            return {"$in": [value, str(value)]}
+        return value
+
+    def _match_id(self, message_id: UUID) -> dict:
+        """Filter selecting one message by id, migrated or not."""
+        message_id = UUID(str(message_id))
+        if settings.MONGODB_LEGACY_MESSAGE_IDS:
+            return {"$or": [{"_id": message_id}, {"id": self._match_legacy_ids([message_id])}]}
+        return {"_id": message_id}
+
+    def _match_legacy_ids(self, message_ids: List[UUID]) -> dict:
+        # $exists restates the partial filter of LEGACY_ID_INDEX so the planner can use it
+        return {**self._match_any_uuid(message_ids), "$exists": True}
+
+    def _fields(self, fields: Fields, *extra: str) -> Fields:
+        if fields is None:
+            return None
+        return frozenset(fields) | REQUIRED_FIELDS | set(extra)
+
+    def _projection(self, fields: Fields) -> Optional[dict]:
+        # _id always comes back; thread_messages is assembled here, not stored
+        if fields is None:
+            return None
+        return {field: 1 for field in fields if field != "thread_messages"}
+
+    def _match_any_id(self, message_ids: List[UUID]) -> dict:
+        """Filter selecting the messages with any of these ids, migrated or not."""
+        message_ids = [UUID(str(message_id)) for message_id in message_ids]
+        if settings.MONGODB_LEGACY_MESSAGE_IDS:
+            return {"$or": [{"_id": {"$in": message_ids}}, {"id": self._match_legacy_ids(message_ids)}]}
+        return {"_id": {"$in": message_ids}}
+
+    def _match_any_uuid(self, values: List[UUID]) -> dict:
+        uuids = [UUID(str(value)) for value in values]
+        if settings.MONGODB_UUID_DUAL_READ:
+            return {"$in": uuids + [str(value) for value in uuids]}
+        return {"$in": uuids}
 
     def _serialize_message(self, message: MongoMessage) -> dict:
+        # UUIDs stay UUID objects, which the client encodes as binary subtype 4
         message_dict = message.model_dump()
-        # Convert UUIDs to strings
-        message_dict["id"] = self._serialize_uuid(message_dict["id"])
-        message_dict["chat_id"] = self._serialize_uuid(message_dict["chat_id"])
-        message_dict["sender_id"] = self._serialize_uuid(message_dict["sender_id"])
-        if message_dict.get("parent_message_id"):
-            message_dict["parent_message_id"] = self._serialize_uuid(message_dict["parent_message_id"])
+        message_dict["_id"] = message_dict.pop("id")
         return message_dict
 
-    def _deserialize_message(self, message_dict: dict) -> MongoMessage:
+    def _parse_uuids(self, message_dict: dict) -> dict:
+        """Map _id back to id and convert UUIDs still stored as strings (not yet backfilled)."""
+        document_id = message_dict.pop("_id", None)
+        if isinstance(document_id, UUID):
+            message_dict["id"] = document_id
+        for field in UUID_FIELDS:
+            value = message_dict.get(field)
+            if isinstance(value, str):
+                message_dict[field] = UUID(value)
+        return message_dict
+
+    def _deserialize_message(self, message_dict: dict, fields: Fields = None) -> BaseModel:
+        model = MongoMessage if fields is None else message_model(fields)
         # Ensure updated_at is set to created_at if not present
-        if "updated_at" not in message_dict or message_dict["updated_at"] is None:
+        if "updated_at" in model.model_fields and message_dict.get("updated_at") is None:
             message_dict["updated_at"] = message_dict.get("created_at", datetime.utcnow())
-        return MongoMessage(**message_dict)
+        message_dict = self._parse_uuids(message_dict)
+        if fields is not None:
+            # Legacy documents return the id field even when _id was mapped onto it
+            message_dict = {key: value for key, value in message_dict.items() if key in fields}
+        return model(**message_dict)
+
+    async def create_message(self, message: MongoMessage, buffered: bool = False) -> MongoMessage:
+        """
+        `buffered` lets the write share an insert_many with concurrent ones
+        when MESSAGE_WRITE_BUFFER is on; it still returns only once written.
+        """
+        if buffered and settings.MESSAGE_WRITE_BUFFER:
+            return await self.write_buffer.add(message)
 
-    async def create_message(self, message: MongoMessage) -> MongoMessage:
         message_dict = self._serialize_message(message)
-        # Ensure all UUIDs are properly serialized
-        message_dict["id"] = str(message.id)
-        message_dict["chat_id"] = str(message.chat_id)
-        message_dict["sender_id"] = str(message.sender_id)
-        if message.parent_message_id:
-            message_dict["parent_message_id"] = str(message.parent_message_id)
         
         # Insert the message
         await self.collection.insert_one(message_dict)
@@ -54,79 +158,162 @@ class MessageService:
         # Return the original message object
         return message
 
-    async def get_message(self, message_id: UUID) -> Optional[MongoMessage]:
-        message_dict = await self.collection.find_one({"id": self._serialize_uuid(message_id)})
+    async def create_messages(
+        self,
+        messages: List[MongoMessage],
+        ordered: bool = False,
+        write_concern: Optional[WriteConcern] = None
+    ) -> List[Optional[str]]:
+        """
+        Insert `messages` with one insert_many. Returns an error per message,
+        None for the ones written. An ordered insert stops at the first
+        failure and reports the messages after it as not attempted.
+        """
+        errors: List[Optional[str]] = [None] * len(messages)
+        if not messages:
+            return errors
+        collection = self.collection
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+        try:
+            await collection.insert_many(
+                [self._serialize_message(message) for message in messages], ordered=ordered
+            )
+        except BulkWriteError as e:
+            write_errors = e.details["writeErrors"]
+            for write_error in write_errors:
+                if write_error["code"] == DUPLICATE_KEY:
+                    errors[write_error["index"]] = MESSAGE_EXISTS
+                else:
+                    errors[write_error["index"]] = write_error["errmsg"]
+            if ordered:
+                for index in range(write_errors[0]["index"] + 1, len(messages)):
+                    errors[index] = "Not attempted after an earlier failure"
+        return errors
+
+    async def remove_messages(self, message_ids: List[UUID]) -> None:
+        """Hard delete messages, e.g. to take back part of a batch insert."""
+        if message_ids:
+            await self.collection.delete_many(self._match_any_id(message_ids))
+
+    async def existing_message_ids(self, chat_id: UUID, message_ids: List[UUID]) -> Set[UUID]:
+        """Which of `message_ids` are messages of the chat, in one query."""
+        if not message_ids:
+            return set()
+        cursor = self.collection.find(
+            {"chat_id": self._match_uuid(chat_id), **self._match_any_id(message_ids)},
+            {"id": 1}
+        )
+        return {self._parse_uuids(document)["id"] async for document in cursor}
+
+    async def get_message(self, message_id: UUID, fields: Fields = None) -> Optional[BaseModel]:
+        fields = self._fields(fields)
+        message_dict = await self.collection.find_one(self._match_id(message_id), self._projection(fields))
         if message_dict:
-            return self._deserialize_message(message_dict)
+            return self._deserialize_message(message_dict, fields)
         return None
 
     async def get_chat_messages(
         self, 
         chat_id: UUID, 
+        cursor: Optional[str] = None,
         skip: int = 0, 
-        limit: int = 100
-    ) -> List[MongoMessage]:
+        limit: int = 100,
+        fields: Fields = None
+    ) -> List[BaseModel]:
+        """
+        A page of root messages, newest first, with their replies in
+        thread_messages. The replies are only fetched if thread_messages
+        is among the fields.
+        """
+        # Replies are grouped under their root by parent_message_id
+        with_threads = fields is None or "thread_messages" in fields
+        fields = self._fields(fields, "parent_message_id") if with_threads else self._fields(fields)
         print(f"Getting messages for chat_id: {chat_id}")  # Add logging
         
         # Get root messages (messages without parent)
-        cursor = self.collection.find(
-            {
-                "chat_id": str(chat_id),
-                "parent_message_id": None,
-                "deleted_at": None
-            }
-        ).sort("created_at", DESCENDING).skip(skip).limit(limit)
+        query = {
+            "chat_id": self._match_uuid(chat_id),
+            "parent_message_id": None,
+            "deleted_at": None
+        }
+        if cursor:
+            # Resume after the last message of the previous page in (created_at, id) order
+            created_at, message_id = decode_cursor(cursor)
+            # Unmigrated documents tie-break on their ObjectId _id, which sorts
+            # before every UUID; only their same-instant ties can be misplaced
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": UUID(message_id)}}
+            ]
+        root_cursor = self.collection.find(query, self._projection(fields)).sort(
+            [("created_at", DESCENDING), ("_id", DESCENDING)]
+        ).skip(skip).limit(limit)
         
         messages = []
-        async for message_dict in cursor:
+        async for message_dict in root_cursor:
             try:
-                # Convert string UUIDs back to UUID objects
-                message_dict["id"] = UUID(message_dict["id"])
-                message_dict["chat_id"] = UUID(message_dict["chat_id"])
-                message_dict["sender_id"] = UUID(message_dict["sender_id"])
-                if message_dict.get("parent_message_id"):
-                    message_dict["parent_message_id"] = UUID(message_dict["parent_message_id"])
-                
-                root_message = self._deserialize_message(message_dict)
-                
-                # Get thread messages for this root message
-                thread_cursor = self.collection.find(
-                    {
-                        "chat_id": str(chat_id),
-                        "parent_message_id": str(root_message.id),
-                        "deleted_at": None
-                    }
-                ).sort("created_at", 1)
-                
-                thread_messages = []
-                async for thread_msg in thread_cursor:
-                    try:
-                        # Convert string UUIDs back to UUID objects
-                        thread_msg["id"] = UUID(thread_msg["id"])
-                        thread_msg["chat_id"] = UUID(thread_msg["chat_id"])
-                        thread_msg["sender_id"] = UUID(thread_msg["sender_id"])
-                        if thread_msg.get("parent_message_id"):
-                            thread_msg["parent_message_id"] = UUID(thread_msg["parent_message_id"])
-                        
-                        thread_messages.append(self._deserialize_message(thread_msg))
-                    except Exception as e:
-                        print(f"Error processing thread message: {str(e)}")  # Add logging
-                        continue
-                
-                # Add thread messages to the root message
-                root_message.thread_messages = thread_messages
-                messages.append(root_message)
+                messages.append(self._deserialize_message(message_dict, fields))
             except Exception as e:
                 print(f"Error processing root message: {str(e)}")  # Add logging
                 continue
+
+        # Hydrate every root's thread with one $in query instead of one per root
+        threads = {message.id: [] for message in messages}
+        if threads and with_threads:
+            thread_cursor = self.collection.find(
+                {
+                    "chat_id": self._match_uuid(chat_id),
+                    "parent_message_id": self._match_any_uuid(list(threads)),
+                    "deleted_at": None
+                },
+                self._projection(fields)
+            ).sort("created_at", 1)
+            async for thread_msg in thread_cursor:
+                try:
+                    thread_message = self._deserialize_message(thread_msg, fields)
+                    threads[thread_message.parent_message_id].append(thread_message)
+                except Exception as e:
+                    print(f"Error processing thread message: {str(e)}")  # Add logging
+                    continue
+        if with_threads:
+            for message in messages:
+                message.thread_messages = threads[message.id]
         
         print(f"Found {len(messages)} messages")  # Add logging
         return messages
 
-    async def get_message_with_sender(self, message: MongoMessage, db: Session) -> dict:
+    async def get_chat_activity(self, chat_ids: List[UUID]) -> Dict[UUID, dict]:
+        """
+        Message count, latest created_at and latest content of each chat, from
+        its non-deleted messages. Chats without any are left out.
+        """
+        pipeline = [
+            {"$match": {"chat_id": self._match_any_uuid(chat_ids), "deleted_at": None}},
+            {"$sort": {"chat_id": 1, "created_at": DESCENDING}},
+            {"$group": {
+                "_id": "$chat_id",
+                "message_count": {"$sum": 1},
+                "last_message_at": {"$first": "$created_at"},
+                "last_content": {"$first": "$content"},
+            }},
+        ]
+        activity = {}
+        async for row in self.collection.aggregate(pipeline):
+            chat_id = UUID(str(row.pop("_id")))
+            # A chat half way through the backfill is grouped once per representation
+            seen = activity.get(chat_id)
+            if seen:
+                row["message_count"] += seen["message_count"]
+                if seen["last_message_at"] > row["last_message_at"]:
+                    row["last_message_at"], row["last_content"] = seen["last_message_at"], seen["last_content"]
+            activity[chat_id] = row
+        return activity
+
+    async def get_message_with_sender(self, message: BaseModel, db: AsyncSession) -> dict:
         """Get message with sender information."""
         # Get sender information
-        sender = get_user(db=db, id=message.sender_id)
+        sender = await get_user(db=db, id=message.sender_id)
         if not sender:
             raise ValueError(f"Sender with ID {message.sender_id} not found")
         
@@ -140,8 +327,8 @@ class MessageService:
             "created_at": sender.created_at
         }
         
-        # Process thread messages if any
-        if message.thread_messages:
+        # Process thread messages if any (projected messages may not carry them)
+        if getattr(message, "thread_messages", None):
             message_dict["thread_messages"] = [
                 await self.get_message_with_sender(thread_msg, db)
                 for thread_msg in message.thread_messages
@@ -152,64 +339,142 @@ class MessageService:
     async def get_message_thread(
         self, 
         chat_id: UUID, 
-        message_id: UUID
-    ) -> List[MongoMessage]:
+        message_id: UUID,
+        fields: Fields = None
+    ) -> List[BaseModel]:
+        fields = self._fields(fields)
         # Get the parent message
-        parent_message = await self.get_message(message_id)
+        parent_message = await self.get_message(message_id, fields)
         if not parent_message:
             return []
 
         # Get all replies
         cursor = self.collection.find(
             {
-                "chat_id": self._serialize_uuid(chat_id),
-                "parent_message_id": self._serialize_uuid(message_id),
+                "chat_id": self._match_uuid(chat_id),
+                "parent_message_id": self._match_uuid(message_id),
                 "deleted_at": None
-            }
+            },
+            self._projection(fields)
         ).sort("created_at", 1)
         
         replies = []
         async for message_dict in cursor:
-            replies.append(self._deserialize_message(message_dict))
+            replies.append(self._deserialize_message(message_dict, fields))
         
         return [parent_message] + replies
 
-    async def get_chat_branches(self, chat_id: UUID) -> List[MongoMessage]:
+    async def get_message_tree(
+        self,
+        chat_id: UUID,
+        message_id: UUID,
+        max_depth: int,
+        max_nodes: int,
+        fields: Fields = None
+    ) -> Optional[BaseModel]:
+        """
+        A message with every reply below it, down to `max_depth` levels,
+        nested in thread_messages and oldest first at each level. One
+        aggregation: $graphLookup follows parent_message_id from the message,
+        served by the chat/parent index. Replies are linked by _id, so
+        messages the id_migration hasn't moved yet are not followed.
+
+        Raises MessageTreeTooLarge when more than `max_nodes` replies are
+        found; they are counted but not sent back. That check bounds the
+        response, not the server's work: $graphLookup builds the whole
+        subtree first, bounded only by maxDepth (a tree deeper than
+        `max_nodes` levels is too large anyway) and its 100MB memory limit.
+        """
+        if fields is not None:
+            fields = self._fields(fields, "parent_message_id", "thread_messages")
+        projection = self._projection(fields)
+        descendants: Any = "$descendants"
+        if projection is not None:
+            descendants = {"$map": {
+                "input": "$descendants",
+                "in": {"_id": "$$this._id", **{field: f"$$this.{field}" for field in projection}}
+            }}
+        truncated = {
+            "descendant_count": {"$size": "$descendants"},
+            "descendants": {"$cond": [{"$gt": [{"$size": "$descendants"}, max_nodes]}, [], descendants]},
+        }
+        pipeline = [
+            {"$match": {"chat_id": self._match_uuid(chat_id), **self._match_id(message_id)}},
+            {"$limit": 1},
+            {"$graphLookup": {
+                "from": self.collection.name,
+                "startWith": "$_id",
+                "connectFromField": "_id",
+                "connectToField": "parent_message_id",
+                "as": "descendants",
+                "maxDepth": min(max_depth, max_nodes) - 1,
+                "restrictSearchWithMatch": {"chat_id": self._match_uuid(chat_id), "deleted_at": None},
+            }},
+            {"$project": {**projection, **truncated}} if projection is not None else {"$set": truncated},
+        ]
+        documents = await self.collection.aggregate(pipeline).to_list(length=1)
+        if not documents:
+            return None
+        root_document = documents[0]
+        count = root_document.pop("descendant_count")
+        if count > max_nodes:
+            raise MessageTreeTooLarge(
+                f"Message {message_id} has {count} replies below it, more than {max_nodes}; lower max_depth"
+            )
+
+        # Sorting once puts every level in order; linking is then one pass
+        replies = sorted(
+            (self._deserialize_message(document, fields) for document in root_document.pop("descendants")),
+            key=lambda message: message.created_at
+        )
+        root = self._deserialize_message(root_document, fields)
+        nodes = {root.id: root}
+        nodes.update((message.id, message) for message in replies)
+        for message in replies:
+            nodes[message.parent_message_id].thread_messages.append(message)
+        return root
+
+    async def get_chat_branches(self, chat_id: UUID, fields: Fields = None) -> List[BaseModel]:
+        fields = self._fields(fields)
         cursor = self.collection.find(
             {
-                "chat_id": self._serialize_uuid(chat_id),
+                "chat_id": self._match_uuid(chat_id),
                 "parent_message_id": None,
                 "deleted_at": None
-            }
+            },
+            self._projection(fields)
         ).sort("created_at", DESCENDING)
         
         messages = []
         async for message_dict in cursor:
-            messages.append(self._deserialize_message(message_dict))
+            messages.append(self._deserialize_message(message_dict, fields))
         return messages
 
     async def get_message_branch(
         self, 
         chat_id: UUID, 
-        message_id: UUID
-    ) -> List[MongoMessage]:
+        message_id: UUID,
+        fields: Fields = None
+    ) -> List[BaseModel]:
+        fields = self._fields(fields)
         # Get the parent message
-        parent_message = await self.get_message(message_id)
+        parent_message = await self.get_message(message_id, fields)
         if not parent_message:
             return []
 
         # Get all messages in the branch
         cursor = self.collection.find(
             {
-                "chat_id": self._serialize_uuid(chat_id),
-                "parent_message_id": self._serialize_uuid(message_id),
+                "chat_id": self._match_uuid(chat_id),
+                "parent_message_id": self._match_uuid(message_id),
                 "deleted_at": None
-            }
+            },
+            self._projection(fields)
         ).sort("created_at", 1)
         
         branch_messages = []
         async for message_dict in cursor:
-            branch_messages.append(self._deserialize_message(message_dict))
+            branch_messages.append(self._deserialize_message(message_dict, fields))
         
         return [parent_message] + branch_messages
 
@@ -220,7 +485,7 @@ class MessageService:
     ) -> Optional[MongoMessage]:
         update_data["updated_at"] = datetime.utcnow()
         result = await self.collection.update_one(
-            {"id": self._serialize_uuid(message_id)},
+            self._match_id(message_id),
             {"$set": update_data}
         )
         if result.modified_count:
@@ -229,7 +494,7 @@ class MessageService:
 
     async def delete_message(self, message_id: UUID) -> bool:
         result = await self.collection.update_one(
-            {"id": self._serialize_uuid(message_id)},
+            self._match_id(message_id),
             {"$set": {"deleted_at": datetime.utcnow()}}
         )
         return result.modified_count > 0
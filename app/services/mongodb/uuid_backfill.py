@@ -0,0 +1,76 @@
+"""
+Online backfill converting string UUIDs in the messages collection to BSON
+binary subtype 4.
+
+Documents written before native UUID storage keep id, chat_id, sender_id and
+parent_message_id as 36-character strings. This rewrites them a batch at a
+time, in _id order, with one unordered bulk write per batch and an optional
+pause between batches to limit the load. MessageService reads both forms
+while MONGODB_UUID_DUAL_READ is on, so the app keeps serving throughout;
+turn it off once this reports nothing left to convert. Safe to interrupt
+and rerun:
+    python -m app.services.mongodb.uuid_backfill --batch-size 1000 --pause 0.1
+"""
+import argparse
+import asyncio
+import logging
+from typing import Optional
+from uuid import UUID
+
+from pymongo import ASCENDING, UpdateOne
+
+from app.db.mongodb import close_mongodb, connect_mongodb
+from app.services.mongodb.message_service import UUID_FIELDS, message_service
+
+logger = logging.getLogger(__name__)
+
+# Documents with at least one UUID field still stored as a string
+PENDING = {"$or": [{field: {"$type": "string"}} for field in UUID_FIELDS]}
+
+def conversion(document: dict) -> Optional[UpdateOne]:
+    converted = {
+        field: UUID(document[field])
+        for field in UUID_FIELDS
+        if isinstance(document.get(field), str)
+    }
+    if not converted:
+        return None
+    # Only convert values that are still the strings we read
+    unchanged = {field: document[field] for field in converted}
+    return UpdateOne({"_id": document["_id"], **unchanged}, {"$set": converted})
+
+async def backfill_uuids(collection, batch_size: int = 1000, pause: float = 0.0) -> int:
+    """Convert every pending document; returns how many were rewritten."""
+    converted, last_id = 0, None
+    while True:
+        query = dict(PENDING)
+        if last_id is not None:
+            query = {"$and": [PENDING, {"_id": {"$gt": last_id}}]}
+        batch = await collection.find(
+            query, {field: 1 for field in UUID_FIELDS}
+        ).sort("_id", ASCENDING).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        updates = [update for update in map(conversion, batch) if update]
+        if updates:
+            result = await collection.bulk_write(updates, ordered=False)
+            converted += result.modified_count
+        last_id = batch[-1]["_id"]
+        logger.info(f"Converted {converted} documents so far")
+        if pause:
+            await asyncio.sleep(pause)
+    remaining = await collection.count_documents(PENDING)
+    logger.info(f"Backfill done: {converted} converted, {remaining} still pending")
+    return converted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert string UUIDs in messages to BSON binary")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents per bulk write")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    connect_mongodb()
+    try:
+        asyncio.run(backfill_uuids(message_service.collection, args.batch_size, args.pause))
+    finally:
+        close_mongodb()
@@ -0,0 +1,133 @@
+"""
+Group commit for realtime message inserts.
+
+Websocket senders hand their message to MessageWriteBuffer.add, which parks
+it until the batch reaches MESSAGE_WRITE_BUFFER_MAX_BATCH messages or the
+oldest one has waited MESSAGE_WRITE_BUFFER_MAX_DELAY_MS. The batch is then
+written with one journaled insert_many. Every sender in it is answered when
+that write is acknowledged, so many senders share one journal commit.
+"""
+import asyncio
+import logging
+import time
+from threading import Lock
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from app.models.mongodb.message import MongoMessage
+
+logger = logging.getLogger(__name__)
+
+# Writes a batch and returns an error per message, None for the ones written
+BatchWriter = Callable[[List[MongoMessage]], Awaitable[List[Optional[str]]]]
+
+class MessageWriteError(RuntimeError):
+    """A buffered message was rejected by its batch's insert."""
+
+class FlushStats:
+    """Sizes and latencies of the flushed batches."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.flushes = 0
+        self.messages = 0
+        self.failed = 0
+        self.max_size = 0
+        # From the batch's first message arriving to the flush starting
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        # The insert_many round trip
+        self.write_seconds = 0.0
+        self.max_write_seconds = 0.0
+
+    def record(self, size: int, failed: int, waited: float, wrote: float) -> None:
+        with self._lock:
+            self.flushes += 1
+            self.messages += size
+            self.failed += failed
+            self.max_size = max(self.max_size, size)
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self.write_seconds += wrote
+            self.max_write_seconds = max(self.max_write_seconds, wrote)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            flushes = self.flushes or 1
+            return {
+                "flushes": self.flushes,
+                "messages": self.messages,
+                "failed": self.failed,
+                "batch_size_avg": round(self.messages / flushes, 2),
+                "batch_size_max": self.max_size,
+                "wait_ms_avg": round(self.wait_seconds / flushes * 1000, 2),
+                "wait_ms_max": round(self.max_wait_seconds * 1000, 2),
+                "write_ms_avg": round(self.write_seconds / flushes * 1000, 2),
+                "write_ms_max": round(self.max_write_seconds * 1000, 2),
+            }
+
+class MessageWriteBuffer:
+    """
+    Coalesces concurrent inserts into insert_many batches.
+    **Parameters**
+    * `write`: Writes one batch, e.g. MessageService.create_messages
+    * `max_batch`: Flush as soon as this many messages are waiting
+    * `max_delay`: Flush once the oldest waiting message is this many seconds old
+    """
+    def __init__(self, write: BatchWriter, max_batch: int, max_delay: float):
+        self.write = write
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.stats = FlushStats()
+        self._pending: List[Tuple[MongoMessage, asyncio.Future]] = []
+        self._first_at = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: Set[asyncio.Task] = set()
+
+    async def add(self, message: MongoMessage) -> MongoMessage:
+        """Queue `message` and return it once its batch is written; raises MessageWriteError if it wasn't."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            self._first_at = time.perf_counter()
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        self._pending.append((message, future))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        error = await future
+        if error is not None:
+            raise MessageWriteError(error)
+        return message
+
+    def flush(self) -> None:
+        """Start writing whatever is waiting, without waiting for it."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch, time.perf_counter() - self._first_at))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def close(self) -> None:
+        """Write what is waiting and wait for every write in flight, e.g. on shutdown."""
+        self.flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def _write(self, batch: List[Tuple[MongoMessage, asyncio.Future]], waited: float) -> None:
+        started = time.perf_counter()
+        try:
+            errors = await self.write([message for message, _ in batch])
+        except Exception as e:
+            logger.error(f"Buffered write of {len(batch)} messages failed: {str(e)}")
+            self.stats.record(len(batch), len(batch), waited, time.perf_counter() - started)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.stats.record(len(batch), sum(error is not None for error in errors), waited, time.perf_counter() - started)
+        for (_, future), error in zip(batch, errors):
+            # The sender may have disconnected and cancelled its wait
+            if not future.done():
+                future.set_result(error)
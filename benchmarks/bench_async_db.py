@@ -0,0 +1,81 @@
+"""
+Mixed-load benchmark: sync Session on the event loop vs AsyncSession.
+
+Runs a handful of slow queries (pg_sleep) alongside many fast point queries
+inside one event loop, the way a single uvicorn worker would, and reports the
+latency of the fast queries. With the sync engine every slow query stalls the
+whole loop; with the asyncpg engine the fast queries keep flowing.
+
+Requires the Postgres configured in .env:
+    python -m benchmarks.bench_async_db --slow 5 --fast 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app.db.session import SessionLocal, AsyncSessionLocal, engine, async_engine
+
+SLOW_QUERY = text("SELECT pg_sleep(:seconds)")
+FAST_QUERY = text("SELECT 1")
+
+async def sync_query(statement, params=None) -> float:
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        db.execute(statement, params or {})
+    finally:
+        db.close()
+    return time.perf_counter() - started
+
+async def async_query(statement, params=None) -> float:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        await db.execute(statement, params or {})
+    return time.perf_counter() - started
+
+async def run_mixed_load(query, slow: int, fast: int, slow_seconds: float) -> dict:
+    started = time.perf_counter()
+    slow_tasks = [
+        asyncio.ensure_future(query(SLOW_QUERY, {"seconds": slow_seconds}))
+        for _ in range(slow)
+    ]
+    fast_latencies = []
+    for _ in range(fast):
+        fast_latencies.append(await query(FAST_QUERY))
+        await asyncio.sleep(0)
+    await asyncio.gather(*slow_tasks)
+    fast_latencies.sort()
+    return {
+        "wall_seconds": time.perf_counter() - started,
+        "fast_p50_ms": statistics.median(fast_latencies) * 1000,
+        "fast_p95_ms": fast_latencies[int(len(fast_latencies) * 0.95) - 1] * 1000,
+        "fast_max_ms": fast_latencies[-1] * 1000,
+    }
+
+async def main(slow: int, fast: int, slow_seconds: float) -> None:
+    # Warm both pools so connection setup isn't measured
+    await sync_query(FAST_QUERY)
+    await async_query(FAST_QUERY)
+
+    for name, query in (("sync Session", sync_query), ("AsyncSession", async_query)):
+        result = await run_mixed_load(query, slow, fast, slow_seconds)
+        print(
+            f"{name:>12}: wall {result['wall_seconds']:.2f}s, "
+            f"fast p50 {result['fast_p50_ms']:.1f}ms, "
+            f"p95 {result['fast_p95_ms']:.1f}ms, "
+            f"max {result['fast_max_ms']:.1f}ms"
+        )
+
+    engine.dispose()
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--slow", type=int, default=5, help="Concurrent slow queries")
+    parser.add_argument("--fast", type=int, default=200, help="Fast queries issued meanwhile")
+    parser.add_argument("--slow-seconds", type=float, default=0.5, help="Duration of each slow query")
+    args = parser.parse_args()
+    asyncio.run(main(args.slow, args.fast, args.slow_seconds))
@@ -0,0 +1,132 @@
+"""
+Branch-tree benchmark: ltree GiST lookups vs a recursive walk over parent_message_id.
+
+Seeds one chat with a single reply chain `depth` messages deep (each message
+answering the previous one), then times, from the deepest message, the
+ancestor chain and, from the root, the whole subtree and a 10-level subtree.
+The ltree queries go through app.crud.branch; the baseline is the recursive
+CTE the branch CRUD would otherwise need. The seeded rows are deleted
+afterwards.
+
+Every path is stored whole in the GiST leaf, so a chain is bounded by the
+index row size (~8kB): a few thousand levels with short labels, fewer as the
+sequence grows. Messages past that depth fail to insert rather than degrade.
+
+Requires the Postgres configured in .env, migrated to head:
+    python -m benchmarks.bench_branch_tree --depth 1000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, text
+
+from app.crud import branch as branch_crud
+from app.db.session import AsyncSessionLocal, async_engine
+from app.models import Chat, Message, User
+
+ANCESTORS_CTE = text(
+    "WITH RECURSIVE chain AS ("
+    " SELECT * FROM messages WHERE id = :message_id"
+    " UNION ALL"
+    " SELECT m.* FROM messages m JOIN chain c ON m.id = c.parent_message_id"
+    ") SELECT * FROM chain"
+)
+SUBTREE_CTE = text(
+    "WITH RECURSIVE tree AS ("
+    " SELECT m.*, 0 AS depth FROM messages m WHERE id = :message_id"
+    " UNION ALL"
+    " SELECT m.*, t.depth + 1 FROM messages m JOIN tree t ON m.parent_message_id = t.id"
+    " WHERE t.depth < :max_depth"
+    ") SELECT * FROM tree"
+)
+
+async def seed(depth: int) -> tuple:
+    user_id, chat_id = uuid.uuid4(), uuid.uuid4()
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=user_id, email=f"{user_id}@bench.local", username=f"bench-{user_id}", hashed_password="x"))
+        await db.flush()
+        db.add(Chat(id=chat_id, name="branch benchmark", type="group", created_by=user_id))
+        await db.flush()
+        # Reserve a block of branch labels so the chain's paths are base+1.base+2...
+        last = await db.scalar(
+            text("SELECT setval('message_branch_label_seq', nextval('message_branch_label_seq') + :depth)"),
+            {"depth": depth},
+        )
+        await db.execute(
+            text(
+                "WITH rows AS (SELECT n, gen_random_uuid() AS id FROM generate_series(1, :depth) AS n) "
+                "INSERT INTO messages (id, content, message_type, chat_id, sender_id, parent_message_id, "
+                "    branch_path, branch_level, is_branch_root, created_at, updated_at) "
+                "SELECT r.id, 'message ' || r.n, 'text', :chat_id, :user_id, p.id, "
+                "    (SELECT string_agg((:base + k)::text, '.' ORDER BY k) "
+                "     FROM generate_series(1, r.n) AS k)::ltree, "
+                "    r.n - 1, false, now() - (:depth - r.n) * interval '1 second', now() "
+                "FROM rows r LEFT JOIN rows p ON p.n = r.n - 1"
+            ),
+            {"chat_id": chat_id, "user_id": user_id, "depth": depth, "base": last - depth},
+        )
+        await db.commit()
+        await db.execute(text("ANALYZE messages"))
+        root_id, leaf_id = (await db.execute(
+            text(
+                "SELECT (SELECT id FROM messages WHERE chat_id = :chat_id AND branch_level = 0), "
+                "(SELECT id FROM messages WHERE chat_id = :chat_id AND branch_level = :leaf)"
+            ),
+            {"chat_id": chat_id, "leaf": depth - 1},
+        )).one()
+    return user_id, chat_id, root_id, leaf_id
+
+async def cleanup(user_id: uuid.UUID, chat_id: uuid.UUID) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Message).where(Message.chat_id == chat_id))
+        await db.execute(delete(Chat).where(Chat.id == chat_id))
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+
+async def time_call(repeat: int, call) -> float:
+    timings = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await call(db)
+            timings.append(time.perf_counter() - started)
+            db.expunge_all()
+    return statistics.median(timings) * 1000
+
+async def main(depth: int, repeat: int) -> None:
+    user_id, chat_id, root_id, leaf_id = await seed(depth)
+    cases = [
+        (
+            "ancestors of leaf",
+            lambda db: branch_crud.get_ancestors(db, chat_id, leaf_id),
+            lambda db: db.execute(ANCESTORS_CTE, {"message_id": leaf_id}),
+        ),
+        (
+            "subtree of root",
+            lambda db: branch_crud.get_branch_tree(db, chat_id, root_id),
+            lambda db: db.execute(SUBTREE_CTE, {"message_id": root_id, "max_depth": depth}),
+        ),
+        (
+            "root, 10 levels",
+            lambda db: branch_crud.get_branch_tree(db, chat_id, root_id, max_depth=10),
+            lambda db: db.execute(SUBTREE_CTE, {"message_id": root_id, "max_depth": 10}),
+        ),
+    ]
+    try:
+        for name, ltree_call, cte_call in cases:
+            ltree_ms = await time_call(repeat, ltree_call)
+            cte_ms = await time_call(repeat, cte_call)
+            print(f"{name:<18}: ltree {ltree_ms:9.2f}ms, recursive cte {cte_ms:9.2f}ms")
+    finally:
+        await cleanup(user_id, chat_id)
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--depth", type=int, default=1000, help="Length of the seeded reply chain")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per measurement (median is reported)")
+    args = parser.parse_args()
+    asyncio.run(main(args.depth, args.repeat))
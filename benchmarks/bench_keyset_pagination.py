@@ -0,0 +1,91 @@
+"""
+Deep-page benchmark: OFFSET pagination vs (created_at, id) keyset cursors.
+
+Seeds one chat with `pages * limit` messages, then fetches page 1 and the last
+page of its history both ways through CRUDMessage.get_chat_messages. OFFSET has
+to walk and discard every earlier row, so its latency grows with the page
+number; the cursor seeks straight into ix_messages_chat_id_created_at_id and
+stays flat. The seeded rows are deleted afterwards.
+
+Requires the Postgres configured in .env, migrated to head:
+    python -m benchmarks.bench_keyset_pagination --pages 1000 --limit 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, text
+
+from app.core.pagination import encode_cursor
+from app.crud.crud_message import message_crud
+from app.db.session import AsyncSessionLocal, async_engine
+from app.models import Chat, Message, User
+
+async def seed(rows: int) -> tuple:
+    user_id, chat_id = uuid.uuid4(), uuid.uuid4()
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=user_id, email=f"{user_id}@bench.local", username=f"bench-{user_id}", hashed_password="x"))
+        await db.flush()
+        db.add(Chat(id=chat_id, name="keyset benchmark", type="group", created_by=user_id))
+        await db.flush()
+        # One message per second going back in time
+        await db.execute(
+            text(
+                "INSERT INTO messages (id, content, message_type, chat_id, sender_id, created_at, updated_at) "
+                "SELECT gen_random_uuid(), 'message ' || n, 'text', :chat_id, :user_id, "
+                "now() - n * interval '1 second', now() "
+                "FROM generate_series(1, :rows) AS n"
+            ),
+            {"chat_id": chat_id, "user_id": user_id, "rows": rows},
+        )
+        await db.commit()
+        await db.execute(text("ANALYZE messages"))
+    return user_id, chat_id
+
+async def cleanup(user_id: uuid.UUID, chat_id: uuid.UUID) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Message).where(Message.chat_id == chat_id))
+        await db.execute(delete(Chat).where(Chat.id == chat_id))
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+
+async def cursor_for_page(chat_id: uuid.UUID, page: int, limit: int):
+    """Cursor of the row just before `page`, as a client would have received it."""
+    if page == 1:
+        return None
+    async with AsyncSessionLocal() as db:
+        previous = await message_crud.get_chat_messages(
+            db, chat_id=chat_id, skip=(page - 1) * limit - 1, limit=1
+        )
+    return encode_cursor(previous[0].created_at, previous[0].id)
+
+async def time_fetch(chat_id: uuid.UUID, limit: int, repeat: int, **kwargs) -> float:
+    timings = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await message_crud.get_chat_messages(db, chat_id=chat_id, limit=limit, **kwargs)
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+async def main(pages: int, limit: int, repeat: int) -> None:
+    user_id, chat_id = await seed(pages * limit)
+    try:
+        for page in (1, pages):
+            offset_ms = await time_fetch(chat_id, limit, repeat, skip=(page - 1) * limit)
+            cursor = await cursor_for_page(chat_id, page, limit)
+            cursor_ms = await time_fetch(chat_id, limit, repeat, cursor=cursor)
+            print(f"page {page:>6}: offset {offset_ms:8.2f}ms, cursor {cursor_ms:8.2f}ms")
+    finally:
+        await cleanup(user_id, chat_id)
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=1000, help="Pages of history to seed")
+    parser.add_argument("--limit", type=int, default=100, help="Page size")
+    parser.add_argument("--repeat", type=int, default=20, help="Fetches per measurement (median is reported)")
+    args = parser.parse_args()
+    asyncio.run(main(args.pages, args.limit, args.repeat))
@@ -0,0 +1,131 @@
+"""
+Projection benchmark: whole documents vs the fields the endpoints serialize.
+
+Seeds a Mongo chat with `roots` root messages carrying `replies` replies each,
+every message holding `content_bytes` of content, then calls the
+MessageService reads behind the list, branches and thread endpoints twice:
+as before (fields=None, whole MongoMessage documents) and with the fields the
+endpoints now request (chat.MESSAGE_FIELDS). For each it reports the bytes
+of the find/getMore replies, captured with a command listener, and the
+median time to deserialize them into models. The list page gains most: its
+response has no thread_messages, so the reply query is skipped outright.
+The seeded documents are deleted afterwards.
+
+Requires the MongoDB configured in .env:
+    python -m benchmarks.bench_message_projection --roots 200 --replies 5 --content-bytes 16384
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import bson
+from pymongo import monitoring
+
+from app.api.v1.endpoints.chat import MESSAGE_FIELDS
+from app.core.config import settings
+from app.db.mongodb import close_mongodb, connect_mongodb, create_client
+from app.models.mongodb.message import MongoMessage
+from app.services.mongodb.message_service import MessageService, message_service
+
+class ReplyBytes(monitoring.CommandListener):
+    """Adds up the size of every find and getMore reply."""
+
+    def __init__(self):
+        self.total = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name in ("find", "getMore"):
+            self.total += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+async def seed(roots: int, replies: int, content_bytes: int) -> tuple:
+    chat_id, sender_id = uuid.uuid4(), uuid.uuid4()
+    started = datetime.utcnow()
+    content = "x" * content_bytes
+    messages = []
+    for n in range(roots):
+        root_at = started - timedelta(seconds=n * (replies + 1))
+        root = MongoMessage(
+            chat_id=chat_id, sender_id=sender_id, content=content, message_type="text", created_at=root_at
+        )
+        messages.append(root)
+        for r in range(replies):
+            messages.append(MongoMessage(
+                chat_id=chat_id, sender_id=sender_id, content=content, message_type="text",
+                parent_message_id=root.id, created_at=root_at + timedelta(seconds=r + 1)
+            ))
+    await message_service.collection.insert_many([message_service._serialize_message(m) for m in messages])
+    return chat_id, messages[0].id
+
+async def measure(collection, listener: ReplyBytes, call, repeat: int) -> tuple:
+    """Reply bytes of one call, and the median time of `repeat` calls."""
+    with patch.object(MessageService, "collection", collection):
+        listener.total = 0
+        await call()
+        size = listener.total
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await call()
+            timings.append(time.perf_counter() - started)
+    return size, statistics.median(timings) * 1000
+
+def time_deserialization(documents: list, fields, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for document in documents:
+            message_service._deserialize_message(dict(document), message_service._fields(fields))
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+async def main(roots: int, replies: int, content_bytes: int, limit: int, repeat: int) -> None:
+    listener = ReplyBytes()
+    client = create_client(event_listeners=[listener])
+    collection = client[settings.MONGODB_DB].messages
+    await message_service.ensure_indexes()
+    chat_id, root_id = await seed(roots, replies, content_bytes)
+    calls = {
+        "list page": lambda fields: message_service.get_chat_messages(chat_id, limit=limit, fields=fields),
+        "branches": lambda fields: message_service.get_chat_branches(chat_id, fields=fields),
+        "thread": lambda fields: message_service.get_message_thread(chat_id, root_id, fields=fields),
+    }
+    try:
+        for name, call in calls.items():
+            for label, fields in (("whole", None), ("projected", MESSAGE_FIELDS)):
+                size, total_ms = await measure(collection, listener, lambda: call(fields), repeat)
+                print(f"{name:<10} {label:<10} {size:>12,} bytes  {total_ms:8.2f}ms")
+
+        documents = await message_service.collection.find({"chat_id": chat_id}).to_list(length=None)
+        projected = await message_service.collection.find(
+            {"chat_id": chat_id}, message_service._projection(message_service._fields(MESSAGE_FIELDS))
+        ).to_list(length=None)
+        whole_ms = time_deserialization(documents, None, repeat)
+        projected_ms = time_deserialization(projected, MESSAGE_FIELDS, repeat)
+        print(f"deserializing {len(documents)} messages: whole {whole_ms:8.2f}ms, projected {projected_ms:8.2f}ms")
+    finally:
+        await message_service.collection.delete_many({"chat_id": chat_id})
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--roots", type=int, default=200, help="Root messages to seed")
+    parser.add_argument("--replies", type=int, default=5, help="Replies seeded under each root")
+    parser.add_argument("--content-bytes", type=int, default=16384, help="Content size of every message")
+    parser.add_argument("--limit", type=int, default=100, help="Roots per list page")
+    parser.add_argument("--repeat", type=int, default=20, help="Calls per measurement (median is reported)")
+    args = parser.parse_args()
+    connect_mongodb()
+    try:
+        asyncio.run(main(args.roots, args.replies, args.content_bytes, args.limit, args.repeat))
+    finally:
+        close_mongodb()
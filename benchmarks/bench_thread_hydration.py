@@ -0,0 +1,95 @@
+"""
+Thread hydration benchmark: one $in query per page vs one query per root.
+
+Seeds a Mongo chat with `roots` root messages carrying `replies` replies each,
+then times a page of `limit` roots through MessageService.get_chat_messages
+(roots plus a single $in over their ids) against the previous approach of a
+find() per root, run one after another. The round trips of the per-root
+version grow with the page size; the $in version stays at two. The seeded
+documents are deleted afterwards.
+
+Requires the MongoDB configured in .env:
+    python -m benchmarks.bench_thread_hydration --roots 1000 --replies 5 --limit 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import DESCENDING
+
+from app.db.mongodb import close_mongodb, connect_mongodb
+from app.services.mongodb.message_service import message_service
+
+async def seed(roots: int, replies: int) -> uuid.UUID:
+    chat_id, sender_id = uuid.uuid4(), uuid.uuid4()
+    started = datetime.utcnow()
+    documents = []
+    for n in range(roots):
+        root_id = str(uuid.uuid4())
+        root_at = started - timedelta(seconds=n * (replies + 1))
+        documents.append(document(chat_id, sender_id, root_id, None, root_at))
+        for r in range(replies):
+            documents.append(document(chat_id, sender_id, str(uuid.uuid4()), root_id, root_at + timedelta(seconds=r + 1)))
+    await message_service.collection.insert_many(documents)
+    return chat_id
+
+def document(chat_id, sender_id, id, parent_id, created_at) -> dict:
+    return {
+        "id": id,
+        "chat_id": str(chat_id),
+        "sender_id": str(sender_id),
+        "content": f"message {id}",
+        "message_type": "text",
+        "parent_message_id": parent_id,
+        "created_at": created_at,
+        "updated_at": created_at,
+        "deleted_at": None,
+    }
+
+async def per_root_page(chat_id: uuid.UUID, limit: int) -> int:
+    """The previous implementation's round trips: roots, then one find() per root."""
+    collection = message_service.collection
+    roots = collection.find(
+        {"chat_id": str(chat_id), "parent_message_id": None, "deleted_at": None}
+    ).sort([("created_at", DESCENDING), ("id", DESCENDING)]).limit(limit)
+    fetched = 0
+    async for root in roots:
+        replies = collection.find(
+            {"chat_id": str(chat_id), "parent_message_id": root["id"], "deleted_at": None}
+        ).sort("created_at", 1)
+        fetched += 1 + len(await replies.to_list(length=None))
+    return fetched
+
+async def time_page(call, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+async def main(roots: int, replies: int, limit: int, repeat: int) -> None:
+    await message_service.ensure_indexes()
+    chat_id = await seed(roots, replies)
+    try:
+        single_ms = await time_page(lambda: message_service.get_chat_messages(chat_id, limit=limit), repeat)
+        per_root_ms = await time_page(lambda: per_root_page(chat_id, limit), repeat)
+        print(f"page of {limit} roots x {replies} replies: $in {single_ms:8.2f}ms, per root {per_root_ms:8.2f}ms")
+    finally:
+        await message_service.collection.delete_many({"chat_id": str(chat_id)})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--roots", type=int, default=1000, help="Root messages to seed")
+    parser.add_argument("--replies", type=int, default=5, help="Replies seeded under each root")
+    parser.add_argument("--limit", type=int, default=100, help="Roots per page")
+    parser.add_argument("--repeat", type=int, default=20, help="Pages per measurement (median is reported)")
+    args = parser.parse_args()
+    connect_mongodb()
+    try:
+        asyncio.run(main(args.roots, args.replies, args.limit, args.repeat))
+    finally:
+        close_mongodb()
@@ -0,0 +1,20 @@
+import pytest
+
+from app.core.query_stats import recorders
+
+@pytest.fixture(autouse=True)
+def query_budgets():
+    """
+    Fail any API test in which a request issued more SQL statements than its
+    route declared with deps.query_budget. Yields the stats of every request
+    the test made.
+    """
+    finished = []
+    recorders.append(finished.append)
+    yield finished
+    recorders.remove(finished.append)
+    over = [
+        f"{stats.method} {stats.path}: {stats.count} queries, budget {stats.budget}"
+        for stats in finished if stats.over_budget
+    ]
+    assert not over, "Query budget exceeded:\n" + "\n".join(over)
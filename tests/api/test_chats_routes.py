@@ -0,0 +1,73 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud
+from app.api import deps
+from app.main import app
+
+TEST_USER = SimpleNamespace(id=uuid.uuid4(), username="testuser", is_active=True)
+
+TEST_CHAT = SimpleNamespace(
+    id=uuid.uuid4(),
+    name="Test Chat",
+    type="group",
+    is_active=True,
+    created_by=TEST_USER.id,
+    created_at=datetime.utcnow(),
+    updated_at=datetime.utcnow(),
+    last_message_at=None,
+    deleted_at=None,
+    participants=[]
+)
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def overrides():
+    async def get_db():
+        yield Mock(info={})
+
+    app.dependency_overrides[deps.get_async_db] = get_db
+    app.dependency_overrides[deps.get_current_user] = lambda: TEST_USER
+    yield
+    app.dependency_overrides.clear()
+
+def test_my_chats_is_routed():
+    """/chats/my-chats reaches the chat crud through the crud.chat dict"""
+    get_user_chats = AsyncMock(return_value=[(TEST_CHAT, True)])
+
+    with patch.dict(crud.chat, {"get_user_chats": get_user_chats}):
+        response = client.get("/api/v1/chats/my-chats")
+
+    assert response.status_code == 200
+    assert [chat["id"] for chat in response.json()["created_chats"]] == [str(TEST_CHAT.id)]
+    assert response.json()["participated_chats"] == []
+    assert get_user_chats.await_args.kwargs["load"] == "participants"
+
+def test_delete_chat_takes_a_uuid():
+    """A malformed chat id is rejected before the crud runs"""
+    delete_chat = AsyncMock(return_value=True)
+
+    with patch.dict(crud.chat, {"delete_chat": delete_chat}):
+        assert client.delete("/api/v1/chats/delete-chat/not-a-uuid").status_code == 422
+        assert client.delete(f"/api/v1/chats/delete-chat/{TEST_CHAT.id}").status_code == 204
+
+    delete_chat.assert_awaited_once()
+    assert delete_chat.await_args.kwargs["chat_id"] == TEST_CHAT.id
+
+def test_get_chat_is_not_cached():
+    """Every request reads the chat and serializes only the ChatResponse fields"""
+    get_chat = AsyncMock(return_value=SimpleNamespace(**vars(TEST_CHAT), hashed_password="secret"))
+
+    with patch.dict(crud.chat, {"get_chat": get_chat}):
+        for _ in range(2):
+            response = client.get(f"/api/v1/chats/get-chat/{TEST_CHAT.id}")
+            assert response.status_code == 200
+            assert "hashed_password" not in response.json()
+
+    assert get_chat.await_count == 2
@@ -0,0 +1,126 @@
+import asyncio
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from app import crud
+from app.api import deps
+from app.core import security
+from app.core.cache import principal_cache, token_versions
+
+TEST_USER = SimpleNamespace(
+    id=uuid.uuid4(),
+    email="test@example.com",
+    username="testuser",
+    is_active=True,
+    token_version=2,
+    created_at=datetime.utcnow(),
+    updated_at=datetime.utcnow()
+)
+
+@pytest.fixture(autouse=True)
+def reset_auth_state():
+    principal_cache.clear()
+    token_versions.replace({TEST_USER.id: 2})
+    yield
+    principal_cache.clear()
+    token_versions.replace({})
+
+def test_self_contained_token_skips_user_lookup():
+    """A self-contained token is authorized from its claims alone"""
+    token = security.create_access_token(TEST_USER.id, claims=security.user_claims(TEST_USER))
+    db = MagicMock()
+
+    with patch("app.api.deps.get") as mock_get:
+        user = asyncio.run(deps.get_current_user(db=db, token=token))
+
+    mock_get.assert_not_called()
+    assert user.id == TEST_USER.id
+    assert user.username == TEST_USER.username
+
+def test_self_contained_token_revoked_by_version_bump():
+    """Bumping the user's token version rejects older tokens"""
+    token = security.create_access_token(TEST_USER.id, claims=security.user_claims(TEST_USER))
+    token_versions.set(TEST_USER.id, 3)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(deps.get_current_user(db=MagicMock(), token=token))
+
+    assert exc_info.value.status_code == 403
+    assert exc_info.value.detail == "Token has been revoked"
+
+def test_cached_principal_revoked_by_version_bump():
+    """A revocation that reaches the version map also rejects tokens already in the principal cache"""
+    token = security.create_access_token(TEST_USER.id, claims=security.user_claims(TEST_USER))
+    asyncio.run(deps.get_current_user(db=MagicMock(), token=token))
+    assert principal_cache.get(token) is not None
+
+    # Bumped on another worker: this worker's principal cache was not invalidated
+    token_versions.set(TEST_USER.id, 3)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(deps.get_current_user(db=MagicMock(), token=token))
+
+    assert exc_info.value.detail == "Token has been revoked"
+    assert principal_cache.get(token) is None
+
+def test_stale_version_map_is_refreshed():
+    """The version map is reloaded once its refresh interval has passed"""
+    token = security.create_access_token(TEST_USER.id, claims=security.user_claims(TEST_USER))
+    token_versions._refreshed_at = None
+
+    with patch.dict(crud.user, {"get_token_versions": AsyncMock(return_value={TEST_USER.id: 5})}):
+        with pytest.raises(HTTPException):
+            asyncio.run(deps.get_current_user(db=MagicMock(), token=token))
+
+    assert token_versions.get(TEST_USER.id) == 5
+
+def chat_access_mocks(chat, role):
+    return {
+        "get_chat_access": AsyncMock(return_value=(chat, role) if chat else None),
+        "add_participant": AsyncMock(),
+    }
+
+def test_chat_access_resolves_membership_in_one_query():
+    """A participant is authorized from the single chat + role lookup"""
+    chat = SimpleNamespace(id=uuid.uuid4(), created_by=uuid.uuid4(), deleted_at=None)
+    mocks = chat_access_mocks(chat, "member")
+
+    with patch.dict(crud.chat, mocks):
+        access = asyncio.run(deps.resolve_chat_access(Mock(), chat.id, TEST_USER))
+
+    assert access == (chat, "member")
+    mocks["get_chat_access"].assert_awaited_once()
+    mocks["add_participant"].assert_not_awaited()
+
+@pytest.mark.parametrize("deleted_at, role, created_by, status_code", [
+    (None, None, uuid.uuid4(), 403),
+    (datetime.utcnow(), "admin", TEST_USER.id, 404),
+])
+def test_chat_access_denied(deleted_at, role, created_by, status_code):
+    chat = SimpleNamespace(id=uuid.uuid4(), created_by=created_by, deleted_at=deleted_at)
+
+    with patch.dict(crud.chat, chat_access_mocks(chat, role)):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(deps.resolve_chat_access(Mock(), chat.id, TEST_USER))
+
+    assert exc_info.value.status_code == status_code
+
+def test_chat_access_restores_missing_creator():
+    """A creator without a participant row is re-added as admin instead of being refused"""
+    chat = SimpleNamespace(id=uuid.uuid4(), created_by=TEST_USER.id, deleted_at=None)
+    mocks = chat_access_mocks(chat, None)
+
+    db = Mock(info={})
+
+    with patch.dict(crud.chat, mocks):
+        access = asyncio.run(deps.resolve_chat_access(db, chat.id, TEST_USER))
+
+    assert access.role == "admin"
+    # The missing row is confirmed on the primary before it is restored
+    assert db.info["primary"] is True
+    assert mocks["get_chat_access"].await_count == 2
+    mocks["add_participant"].assert_awaited_once()
@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app import crud
+from app.api.v1.endpoints import chat
+from app.schemas.chat import MessageBatchCreate
+from app.services.mongodb.message_service import MESSAGE_EXISTS
+
+CHAT_ID = uuid.uuid4()
+TEST_USER = SimpleNamespace(
+    id=uuid.uuid4(), username="testuser", email="test@example.com", is_active=True, created_at=datetime.utcnow()
+)
+
+def batch(*parents, ordered=False):
+    """A batch of len(parents) messages; parents[n] is the index of message n's parent, or None."""
+    ids = [uuid.uuid4() for _ in parents]
+    return MessageBatchCreate(ordered=ordered, messages=[
+        {"id": ids[n], "content": str(n), "message_type": "text",
+         "parent_message_id": ids[parent] if parent is not None else None}
+        for n, parent in enumerate(parents)
+    ])
+
+def run_batch(batch_in, insert_errors, existing=frozenset()):
+    service = SimpleNamespace(
+        existing_message_ids=AsyncMock(return_value=set(existing)),
+        create_messages=AsyncMock(side_effect=lambda messages, ordered: insert_errors(messages)),
+        remove_messages=AsyncMock(),
+    )
+    with patch.object(chat, "message_service", service), \
+            patch.object(chat.manager, "broadcast_to_chat", AsyncMock()), \
+            patch.dict(crud.chat, {"record_message": AsyncMock()}):
+        response = asyncio.run(chat.create_messages_batch(
+            db=None, chat_id=CHAT_ID, batch_in=batch_in, current_user=TEST_USER, access=None
+        ))
+    return response, service
+
+def test_replies_to_invalid_batch_messages_fail():
+    """A failed parent fails its replies, and theirs, before anything is written"""
+    batch_in = batch(None, 0, 1, None)
+    batch_in.messages[0].parent_message_id = uuid.uuid4()
+
+    response, service = run_batch(batch_in, lambda messages: [None] * len(messages))
+
+    assert [result.error for result in response.results] == [
+        f"Parent message {batch_in.messages[0].parent_message_id} not found in chat {CHAT_ID}",
+        "Parent failed in this batch",
+        "Parent failed in this batch",
+        None,
+    ]
+    written = service.create_messages.await_args.args[0]
+    assert [message.id for message in written] == [batch_in.messages[3].id]
+
+@pytest.mark.parametrize("insert_error", ["error 121", MESSAGE_EXISTS])
+def test_replies_to_failed_inserts_are_removed(insert_error):
+    """Replies written alongside a parent whose insert failed are taken back out"""
+    batch_in = batch(None, 0, 1, None)
+
+    response, service = run_batch(batch_in, lambda messages: [insert_error, None, None, None])
+
+    assert [result.error for result in response.results] == [
+        insert_error, "Parent failed in this batch", "Parent failed in this batch", None
+    ]
+    assert response.created == 1
+    service.remove_messages.assert_awaited_once_with([batch_in.messages[1].id, batch_in.messages[2].id])
+
+def test_retried_replies_keep_parents_already_in_the_chat():
+    """A parent written by an earlier attempt of the import still counts"""
+    batch_in = batch(None, 0)
+
+    response, service = run_batch(
+        batch_in, lambda messages: [MESSAGE_EXISTS, None], existing={batch_in.messages[0].id}
+    )
+
+    assert [result.error for result in response.results] == [MESSAGE_EXISTS, None]
+    service.existing_message_ids.assert_awaited_with(CHAT_ID, [batch_in.messages[0].id])
+    service.remove_messages.assert_awaited_once_with([])
@@ -0,0 +1,166 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app import crud
+from app import main
+from app.api import deps
+from app.api.v1.endpoints import chat
+from app.core.query_stats import QUERY_COUNT_HEADER, QUERY_TIME_HEADER, QueryStatsMiddleware
+from app.models.mongodb.message import MongoMessage
+
+engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+app = FastAPI()
+app.add_middleware(QueryStatsMiddleware)
+
+@app.get("/queries/{count}", dependencies=[Depends(deps.query_budget(2))])
+def run_queries(count: int):
+    with engine.connect() as conn:
+        for _ in range(count):
+            conn.exec_driver_sql("SELECT 1")
+    return {"ran": count}
+
+client = TestClient(app)
+
+def test_response_reports_query_count_and_time():
+    response = client.get("/queries/2")
+
+    assert response.headers[QUERY_COUNT_HEADER] == "2"
+    assert float(response.headers[QUERY_TIME_HEADER]) >= 0
+
+def test_request_over_budget_is_recorded(query_budgets, caplog):
+    """The fixture sees the overrun; production only gets the warning"""
+    client.get("/queries/3")
+
+    stats, = query_budgets
+    assert (stats.count, stats.budget, stats.over_budget) == (3, 2, True)
+    assert "over its budget of 2" in caplog.text
+    # Expected overrun; don't let the fixture fail this test
+    query_budgets.clear()
+
+def test_queries_outside_requests_are_not_attributed(query_budgets):
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+    client.get("/queries/1")
+
+    assert [stats.count for stats in query_budgets] == [1]
+
+# The real app, with each lookup below standing in for one statement against Postgres
+USER = SimpleNamespace(
+    id=uuid.uuid4(), username="testuser", email="test@example.com", is_active=True, created_at=datetime.utcnow()
+)
+CHAT = SimpleNamespace(
+    id=uuid.uuid4(), name="Budget", type="group", is_active=True, created_by=USER.id,
+    created_at=datetime.utcnow(), updated_at=datetime.utcnow()
+)
+
+def one_query():
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+
+async def authenticate():
+    one_query()
+    return USER
+
+async def resolve_chat_access(current_user=Depends(deps.get_current_user)):
+    one_query()
+    return deps.ChatAccess(CHAT, "admin")
+
+async def get_senders(db, ids):
+    one_query()
+    return {USER.id: USER}
+
+real_client = TestClient(main.app)
+
+@pytest.fixture
+def lookups():
+    async def get_db():
+        yield None
+
+    main.app.dependency_overrides.update({
+        deps.get_async_db: get_db,
+        deps.get_current_user: authenticate,
+        deps.get_chat_access: resolve_chat_access,
+    })
+    yield
+    main.app.dependency_overrides.clear()
+
+def test_routed_chat_is_within_budget(lookups, query_budgets):
+    response = real_client.get(f"/api/v1/chats/{CHAT.id}")
+
+    assert response.status_code == 200
+    stats, = query_budgets
+    assert (stats.path, stats.count, stats.budget) == (f"/api/v1/chats/{CHAT.id}", 2, 2)
+
+def test_routed_tree_over_budget_is_recorded(lookups, query_budgets):
+    """A sender lookup per node instead of one get_many puts the tree over its budget"""
+    root = MongoMessage(chat_id=CHAT.id, sender_id=USER.id, content="hi", message_type="text")
+    reply = MongoMessage(
+        chat_id=CHAT.id, sender_id=USER.id, content="re", message_type="text", parent_message_id=root.id
+    )
+    root.thread_messages = [reply]
+
+    async def get_senders_per_node(db, ids):
+        for _ in range(1 + len(root.thread_messages)):
+            one_query()
+        return {USER.id: USER}
+
+    with patch.object(chat.message_service, "get_message_tree", AsyncMock(return_value=root)):
+        with patch.dict(crud.user, {"get_many": get_senders}):
+            assert real_client.get(f"/api/v1/chats/{CHAT.id}/messages/{root.id}/tree").status_code == 200
+        with patch.dict(crud.user, {"get_many": get_senders_per_node}):
+            assert real_client.get(f"/api/v1/chats/{CHAT.id}/messages/{root.id}/tree").status_code == 200
+
+    within, over = query_budgets
+    assert (within.count, within.budget, within.over_budget) == (3, 3, False)
+    assert (over.count, over.budget, over.over_budget) == (4, 3, True)
+    query_budgets.clear()
+
+def test_routed_message_page_loads_senders_with_one_query(lookups, query_budgets):
+    """A page of messages from several senders stays within the list route's budget"""
+    others = [SimpleNamespace(**{**vars(USER), "id": uuid.uuid4()}) for _ in range(3)]
+    page = [
+        MongoMessage(chat_id=CHAT.id, sender_id=sender.id, content=str(n), message_type="text")
+        for n, sender in enumerate([USER] + others)
+    ]
+    get_many = AsyncMock(side_effect=lambda db, ids: one_query() or {user.id: user for user in [USER] + others})
+
+    with patch.object(chat.message_service, "get_chat_messages", AsyncMock(return_value=page)):
+        with patch.dict(crud.user, {"get_many": get_many}):
+            response = real_client.get(f"/api/v1/chats/{CHAT.id}/messages")
+
+    assert response.status_code == 200
+    assert [message["sender"]["id"] for message in response.json()] == [str(message.sender_id) for message in page]
+    get_many.assert_awaited_once()
+    stats, = query_budgets
+    assert (stats.count, stats.budget) == (3, 3)
+
+def test_routed_send_takes_the_sender_from_the_principal(lookups, query_budgets):
+    """Sending a message doesn't look its sender up again after authentication"""
+    async def record_message(db, **kwargs):
+        one_query()
+
+    get_user = AsyncMock()
+    create_message = AsyncMock(side_effect=lambda message: message)
+    with patch.object(chat.message_service, "create_message", create_message), \
+            patch.object(chat.manager, "broadcast_to_chat", AsyncMock()), \
+            patch.dict(crud.chat, {"record_message": record_message}), \
+            patch.dict(crud.user, {"get": get_user}):
+        response = real_client.post(
+            f"/api/v1/chats/{CHAT.id}/messages",
+            json={"chat_id": str(CHAT.id), "content": "hi", "message_type": "text"}
+        )
+
+    assert response.status_code == 200
+    assert response.json()["sender"]["username"] == USER.username
+    get_user.assert_not_called()
+    stats, = query_budgets
+    assert (stats.count, stats.budget) == (3, 3)
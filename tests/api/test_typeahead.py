@@ -0,0 +1,42 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from app import crud
+from app.api.v1.endpoints.users import search_users_typeahead
+from app.core.cache import typeahead_cache
+from app.crud.user import escape_like
+
+ROWS = [SimpleNamespace(id=uuid.uuid4(), username="alice")]
+
+@pytest.fixture(autouse=True)
+def clear_typeahead_cache():
+    typeahead_cache.clear()
+    yield
+    typeahead_cache.clear()
+
+def search(q):
+    return asyncio.run(search_users_typeahead(q=q, limit=10, db=Mock(), current_user=Mock()))
+
+def test_short_prefixes_are_cached():
+    """Repeated short prefixes are answered from the cache, case-insensitively"""
+    lookup = AsyncMock(return_value=ROWS)
+    with patch.dict(crud.user, {"search_typeahead": lookup}):
+        first = search("Al")
+        second = search("al")
+    assert first == second
+    assert [u.username for u in first] == ["alice"]
+    lookup.assert_awaited_once()
+
+def test_long_terms_are_not_cached():
+    lookup = AsyncMock(return_value=ROWS)
+    with patch.dict(crud.user, {"search_typeahead": lookup}):
+        search("alic")
+        search("alic")
+    assert lookup.await_count == 2
+
+def test_like_wildcards_are_escaped():
+    assert escape_like("50%_off\\") == "50\\%\\_off\\\\"
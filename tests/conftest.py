@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+class LazyLoadError(AssertionError):
+    """A relationship was lazy loaded; give the query a loading profile instead."""
+
+def _forbid_lazy_load(orm_execute_state) -> None:
+    state = orm_execute_state.lazy_loaded_from
+    if state is not None:
+        raise LazyLoadError(
+            f"Lazy load from {state.class_.__name__}: {orm_execute_state.statement}"
+        )
+
+@pytest.fixture(autouse=True)
+def forbid_lazy_loads():
+    """Fail any test in which serializing a response (or anything else) lazy loads a relationship."""
+    event.listen(Session, "do_orm_execute", _forbid_lazy_load)
+    yield
+    event.remove(Session, "do_orm_execute", _forbid_lazy_load)
@@ -0,0 +1,53 @@
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.core.cache import CachedPrincipal, TTLCache, PrincipalCache
+
+def test_ttl_cache_expires_entries():
+    """Entries are dropped once their TTL has elapsed"""
+    cache = TTLCache(maxsize=10, ttl=30)
+    with patch("app.core.cache.monotonic", return_value=100.0):
+        cache.set("key", "value")
+        assert cache.get("key") == "value"
+    with patch("app.core.cache.monotonic", return_value=131.0):
+        assert cache.get("key") is None
+    assert len(cache) == 0
+
+def test_ttl_cache_caps_entry_ttl():
+    """A per-entry TTL can shorten but never extend the cache TTL"""
+    cache = TTLCache(maxsize=10, ttl=30)
+    with patch("app.core.cache.monotonic", return_value=100.0):
+        cache.set("short", 1, ttl=5)
+        cache.set("long", 2, ttl=600)
+        cache.set("expired", 3, ttl=-1)
+    with patch("app.core.cache.monotonic", return_value=110.0):
+        assert cache.get("short") is None
+        assert cache.get("long") == 2
+        assert cache.get("expired") is None
+
+def test_ttl_cache_evicts_least_recently_used():
+    """The least recently used entry is evicted when the cache is full"""
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+def test_principal_cache_invalidates_all_tokens_of_user():
+    """Invalidating a user drops every token cached for that user"""
+    cache = PrincipalCache(maxsize=10, ttl=30)
+    user = SimpleNamespace(id=uuid.uuid4())
+    other = SimpleNamespace(id=uuid.uuid4())
+    cache.set("token-1", CachedPrincipal(user, 0))
+    cache.set("token-2", CachedPrincipal(user, 0))
+    cache.set("token-3", CachedPrincipal(other, None))
+
+    cache.invalidate_user(user.id)
+
+    assert cache.get("token-1") is None
+    assert cache.get("token-2") is None
+    assert cache.get("token-3").principal is other
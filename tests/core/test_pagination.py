@@ -0,0 +1,32 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.core.pagination import decode_cursor, encode_cursor, keyset_filter, next_cursor
+from app.models import Message
+
+def test_cursor_roundtrip():
+    """A cursor decodes back to the (created_at, id) it was built from"""
+    created_at, id = datetime(2026, 1, 2, 3, 4, 5, 678901), uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, id)) == (created_at, str(id))
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(datetime.utcnow(), "nope")])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_next_cursor_only_on_full_pages():
+    """Only a full page can have a successor, and it resumes after the last row"""
+    rows = [SimpleNamespace(created_at=datetime.utcnow(), id=uuid.uuid4()) for _ in range(3)]
+    assert next_cursor(rows, limit=4) is None
+    assert decode_cursor(next_cursor(rows, limit=3)) == (rows[-1].created_at, str(rows[-1].id))
+
+def test_keyset_filter_compares_row_values():
+    cursor = encode_cursor(datetime.utcnow(), uuid.uuid4())
+    sql = str(keyset_filter(Message, cursor).compile(dialect=postgresql.dialect()))
+    assert sql.startswith("(messages.created_at, messages.id) <")
+    sql = str(keyset_filter(Message, cursor, descending=False).compile(dialect=postgresql.dialect()))
+    assert sql.startswith("(messages.created_at, messages.id) >")
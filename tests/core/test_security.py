@@ -0,0 +1,54 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from app.core import security
+
+def test_password_hash_roundtrip_off_loop():
+    """Hashing and verification run in the password pool"""
+    async def roundtrip():
+        hashed = await security.get_password_hash_async("Password123!")
+        return (
+            await security.verify_password_async("Password123!", hashed),
+            await security.verify_password_async("wrong", hashed),
+        )
+
+    assert asyncio.run(roundtrip()) == (True, False)
+
+def test_password_pool_rejects_when_saturated():
+    """Jobs beyond PASSWORD_HASH_MAX_PENDING fail fast instead of queueing"""
+    release = threading.Event()
+
+    def slow_verify(plain_password, hashed_password):
+        release.wait(5)
+        return True
+
+    async def saturate():
+        first = asyncio.ensure_future(security._run_password_job(slow_verify, "a", "b"))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(security.PasswordHasherBusy):
+                await security._run_password_job(slow_verify, "a", "b")
+        finally:
+            release.set()
+        return await first
+
+    with patch.object(security.settings, "PASSWORD_HASH_MAX_PENDING", 1):
+        assert asyncio.run(saturate()) is True
+
+def test_password_job_timeout_keeps_slot_until_done():
+    """A timed out job still holds its slot until the worker finishes"""
+    release = threading.Event()
+
+    async def time_out():
+        with pytest.raises(security.PasswordHasherBusy):
+            await security._run_password_job(release.wait, 5)
+        assert security._pending_password_jobs == 1
+        release.set()
+        await asyncio.sleep(0.1)
+        assert security._pending_password_jobs == 0
+
+    with patch.object(security.settings, "PASSWORD_HASH_TIMEOUT_SECONDS", 0.05):
+        asyncio.run(time_out())
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from app import crud
+from app.crud.chat import message_preview
+from app.models.chat import MESSAGE_PREVIEW_LENGTH
+from app.services import chat_activity
+
+CHAT_ID = uuid.uuid4()
+
+def test_record_message_is_one_atomic_update():
+    """The counter is incremented in SQL, not read and written back"""
+    db = Mock()
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
+
+    asyncio.run(crud.chat["record_message"](db, chat_id=CHAT_ID, created_at=datetime.utcnow(), content="hello"))
+
+    db.execute.assert_awaited_once()
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith("UPDATE chats SET")
+    assert "message_count=(chats.message_count + %(message_count_1)s)" in sql
+    assert "last_message_at=CASE WHEN" in sql
+    assert "updated_at=chats.updated_at" in sql
+
+def test_record_message_counts_a_whole_batch():
+    db = Mock()
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
+
+    asyncio.run(crud.chat["record_message"](
+        db, chat_id=CHAT_ID, created_at=datetime.utcnow(), content="last", count=250
+    ))
+
+    statement = db.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+    assert statement.params["message_count_1"] == 250
+
+def test_message_preview_is_one_bounded_line():
+    assert message_preview("  hello\n\n  world ") == "hello world"
+    preview = message_preview("x" * 500)
+    assert len(preview) == MESSAGE_PREVIEW_LENGTH and preview.endswith("…")
+
+def test_reconcile_repairs_only_drifted_chats():
+    now = datetime.utcnow().replace(microsecond=0)
+    in_sync = SimpleNamespace(id=uuid.uuid4(), message_count=2, last_message_at=now, last_message_preview="hi")
+    drifted = SimpleNamespace(id=uuid.uuid4(), message_count=5, last_message_at=now, last_message_preview="old")
+    emptied = SimpleNamespace(id=uuid.uuid4(), message_count=1, last_message_at=now, last_message_preview="gone")
+    activity = {
+        in_sync.id: {"message_count": 2, "last_message_at": now + timedelta(microseconds=400), "last_content": "hi"},
+        drifted.id: {"message_count": 6, "last_message_at": now + timedelta(seconds=1), "last_content": "new"},
+    }
+    page, done = Mock(), Mock()
+    page.all.return_value = [in_sync, drifted, emptied]
+    done.all.return_value = []
+    db = Mock()
+    db.execute = AsyncMock(side_effect=[page, Mock(), done])
+    db.commit = AsyncMock()
+
+    with patch.object(chat_activity.message_service, "get_chat_activity", AsyncMock(return_value=activity)):
+        repaired = asyncio.run(chat_activity.reconcile_chat_activity(db))
+
+    assert repaired == 2
+    fixes = db.execute.await_args_list[1].args[1]
+    assert [fix["chat_id"] for fix in fixes] == [drifted.id, emptied.id]
+    assert fixes[0]["message_count"] == 6 and fixes[0]["last_message_preview"] == "new"
+    assert fixes[1] == {
+        "chat_id": emptied.id, "read_message_count": 1, "read_last_message_at": now,
+        "message_count": 0, "last_message_at": None, "last_message_preview": None
+    }
+    # Rows record_message changed since they were read are skipped
+    sql = str(db.execute.await_args_list[1].args[0].compile(dialect=postgresql.dialect()))
+    assert "chats.message_count = %(read_message_count)s" in sql
+    assert "chats.last_message_at IS NOT DISTINCT FROM %(read_last_message_at)s" in sql
@@ -0,0 +1,43 @@
+import asyncio
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+from sqlalchemy.dialects import postgresql
+
+from app import crud
+from app.core.pagination import encode_cursor
+
+USER_ID = uuid.uuid4()
+
+def test_get_user_chats_is_one_query():
+    """The inbox is fetched in one paginated round trip with a creator flag"""
+    created, participated = SimpleNamespace(id=uuid.uuid4()), SimpleNamespace(id=uuid.uuid4())
+    result = Mock()
+    result.all.return_value = [(created, True), (participated, False)]
+    db = Mock()
+    db.execute = AsyncMock(return_value=result)
+
+    inbox = asyncio.run(crud.chat["get_user_chats"](db=db, current_user_id=USER_ID, skip=20, limit=10))
+
+    assert inbox == [(created, True), (participated, False)]
+    db.execute.assert_awaited_once()
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "UNION" in sql
+    assert "ORDER BY chats.created_at DESC, chats.id DESC" in sql
+    assert "LIMIT" in sql and "OFFSET" in sql
+
+def test_get_user_chats_by_activity_pages_on_last_activity():
+    """order="activity" sorts and pages on coalesce(last_message_at, created_at)"""
+    result = Mock()
+    result.all.return_value = []
+    db = Mock()
+    db.execute = AsyncMock(return_value=result)
+    cursor = encode_cursor(datetime.utcnow(), uuid.uuid4())
+
+    asyncio.run(crud.chat["get_user_chats"](db=db, current_user_id=USER_ID, cursor=cursor, order="activity"))
+
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "ORDER BY coalesce(chats.last_message_at, chats.created_at) DESC, chats.id DESC" in sql
+    assert "(coalesce(chats.last_message_at, chats.created_at), chats.id) <" in sql
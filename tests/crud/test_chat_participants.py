@@ -0,0 +1,33 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+from sqlalchemy.dialects import postgresql
+
+from app.crud.chat import sync_participants
+
+CREATOR, KEPT, REMOVED, ADDED = (uuid.uuid4() for _ in range(4))
+
+def run_sync(current, wanted):
+    existing = Mock()
+    existing.scalars.return_value.all.return_value = list(current)
+    db = Mock()
+    db.execute = AsyncMock(side_effect=[existing, Mock(), Mock()])
+    chat = SimpleNamespace(id=uuid.uuid4(), created_by=CREATOR)
+    asyncio.run(sync_participants(db, chat, set(wanted)))
+    return [
+        str(call.args[0].compile(dialect=postgresql.dialect()))
+        for call in db.execute.await_args_list[1:]
+    ]
+
+def test_sync_participants_writes_only_the_diff():
+    """One DELETE ... IN for removals and one INSERT ... SELECT for additions"""
+    delete, insert = run_sync(current=[CREATOR, KEPT, REMOVED], wanted=[KEPT, ADDED])
+    assert delete.startswith("DELETE FROM chat_participants")
+    assert "chat_participants.user_id IN" in delete
+    assert insert.startswith("INSERT INTO chat_participants (chat_id, user_id, role, created_at) SELECT")
+
+def test_sync_participants_is_noop_for_unchanged_set():
+    """Existing rows (and their roles) are left alone; the creator is never removed"""
+    assert run_sync(current=[CREATOR, KEPT], wanted=[KEPT]) == []
@@ -0,0 +1,31 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, Mock
+
+from sqlalchemy.dialects import postgresql
+
+from app import crud
+from app.core.config import settings
+
+def test_token_versions_only_loads_recent_revocations():
+    """Users revoked longer ago than a token lives are left out of the version map"""
+    db = Mock()
+    db.execute = AsyncMock(return_value=Mock(all=Mock(return_value=[])))
+
+    started = datetime.utcnow()
+    asyncio.run(crud.user["get_token_versions"](db))
+
+    statement = db.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+    assert "WHERE users.token_version_changed_at > %(token_version_changed_at_1)s" in str(statement)
+    cutoff = statement.params["token_version_changed_at_1"]
+    lifetime = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    assert started - lifetime <= cutoff <= datetime.utcnow() - lifetime
+
+def test_revoke_tokens_stamps_the_change():
+    user = Mock(id="user-id", token_version=1, token_version_changed_at=None)
+    db = Mock(commit=AsyncMock(), refresh=AsyncMock())
+
+    asyncio.run(crud.user["revoke_tokens"](db, db_obj=user))
+
+    assert user.token_version == 2
+    assert user.token_version_changed_at is not None
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.core.config import settings
+from app.db import mongodb
+from app.db.mongodb import MongoPoolStats, close_mongodb, connect_mongodb, get_database
+
+def test_one_client_is_shared_until_closed():
+    with patch.object(settings, "MONGODB_MAX_POOL_SIZE", 7), \
+            patch.object(settings, "MONGODB_MAX_IDLE_TIME_MS", 30000):
+        client = connect_mongodb()
+    try:
+        assert connect_mongodb() is client
+        assert get_database().name == settings.MONGODB_DB
+        pool_options = client.delegate.options.pool_options
+        assert pool_options.max_pool_size == 7
+        assert pool_options.max_idle_time_seconds == 30
+        assert client.delegate.options.server_selection_timeout == settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS / 1000
+    finally:
+        close_mongodb()
+    assert mongodb._client is None
+    with pytest.raises(RuntimeError, match="not connected"):
+        get_database()
+
+def test_pool_stats_count_checkouts_waits_and_connections_in_use():
+    stats = MongoPoolStats()
+    for _ in range(2):
+        stats.connection_created(None)
+        stats.connection_check_out_started(None)
+        stats.connection_checked_out(None)
+    stats.connection_checked_in(None)
+    stats.connection_check_out_started(None)
+    stats.connection_check_out_failed(None)
+
+    snapshot = stats.snapshot()
+    assert snapshot["open"] == 2
+    assert snapshot["in_use"] == 1
+    assert snapshot["max_in_use"] == 2
+    assert snapshot["checkouts"] == 2
+    assert snapshot["checkout_failures"] == 1
+    assert snapshot["wait_ms_max"] >= 0
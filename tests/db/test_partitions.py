@@ -0,0 +1,38 @@
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+from app.db import partitions
+from app.db.partitions import add_months, maintain_message_partitions, partition_name
+
+def executed(connection) -> list:
+    return [str(call.args[0]) for call in connection.execute.call_args_list]
+
+def test_month_arithmetic_wraps_years():
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2026, 3, 1)) == "messages_p2026_03"
+
+def test_maintenance_creates_missing_months_ahead():
+    connection = MagicMock()
+    existing = [date(2026, 10, 1)]
+    with patch.object(partitions, "existing_partitions", return_value=existing):
+        maintain_message_partitions(connection, months_ahead=2, retention_months=0, today=date(2026, 10, 18))
+
+    statements = executed(connection)
+    assert not any("messages_p2026_10 " in sql for sql in statements)
+    assert any(
+        "CREATE TABLE messages_p2026_11 PARTITION OF messages FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')" in sql
+        for sql in statements
+    )
+    assert any("CREATE TABLE messages_p2026_12" in sql for sql in statements)
+    assert not any("DROP TABLE" in sql for sql in statements)
+
+def test_maintenance_detaches_and_drops_expired_months():
+    connection = MagicMock()
+    existing = [date(2026, month, 1) for month in range(6, 13)]
+    with patch.object(partitions, "existing_partitions", return_value=existing):
+        maintain_message_partitions(connection, months_ahead=2, retention_months=3, today=date(2026, 10, 18))
+
+    dropped = [sql for sql in executed(connection) if sql.startswith("DROP TABLE")]
+    assert dropped == ["DROP TABLE messages_p2026_06"]
+    assert "ALTER TABLE messages DETACH PARTITION messages_p2026_06" in executed(connection)
@@ -0,0 +1,73 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+
+from app.api.deps import get_async_db
+from app.core.cache import recent_writers
+from app.db import session as db_session
+from app.db.session import RoutingSession, async_engine
+from app.models import User
+
+REPLICA = SimpleNamespace(sync_engine=object())
+PRIMARY = async_engine.sync_engine
+READ = select(User).where(User.id == uuid.uuid4())
+WRITE = User.__table__.update().values(is_active=False)
+
+@pytest.fixture
+def session():
+    recent_writers.clear()
+    with patch.object(db_session, "replica_engines", [REPLICA]):
+        yield RoutingSession()
+    recent_writers.clear()
+
+def test_reads_go_to_replica_and_writes_to_primary(session):
+    assert session.get_bind(clause=READ) is REPLICA.sync_engine
+    assert session.get_bind(clause=READ.with_for_update()) is PRIMARY
+    assert session.get_bind(clause=WRITE) is PRIMARY
+
+def test_session_sticks_to_primary_after_write(session):
+    """Reads following a write in the same session see it"""
+    session.get_bind(clause=WRITE)
+    assert session.get_bind(clause=READ) is PRIMARY
+
+def test_recent_writer_reads_from_primary(session):
+    """A user who committed a write keeps reading from the primary in later requests"""
+    user_id = str(uuid.uuid4())
+    session.info.update(user_id=user_id, wrote=True)
+    db_session._remember_writer(session)
+
+    later = RoutingSession()
+    later.info["user_id"] = user_id
+    assert later.get_bind(clause=READ) is PRIMARY
+    other = RoutingSession()
+    other.info["user_id"] = str(uuid.uuid4())
+    assert other.get_bind(clause=READ) is REPLICA.sync_engine
+
+def test_primary_only_without_replicas():
+    assert RoutingSession().get_bind(clause=READ) is PRIMARY
+
+def test_pinned_session_reads_from_primary(session):
+    """Reads that a later write in the request depends on must not be stale"""
+    session.info["primary"] = True
+    assert session.get_bind(clause=READ) is PRIMARY
+    assert "wrote" not in session.info
+
+@pytest.mark.parametrize("scope, pinned", [
+    ({"type": "http", "method": "GET"}, False),
+    ({"type": "http", "method": "POST"}, True),
+    ({"type": "http", "method": "PUT"}, True),
+    ({"type": "websocket"}, True),
+])
+def test_requests_that_may_write_are_pinned_to_primary(scope, pinned):
+    async def open_session():
+        sessions = get_async_db(SimpleNamespace(scope=scope))
+        db = await sessions.__anext__()
+        await sessions.aclose()
+        return db
+
+    db = asyncio.run(open_session())
+    assert bool(db.info.get("primary")) is pinned
@@ -0,0 +1,19 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+
+from app.models import Message
+
+def compile_pg(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+def test_ltree_operators_compile_to_gist_operators():
+    subtree = select(Message.id).where(Message.branch_path.descendant_of("1.2"))
+    ancestors = select(Message.id).where(Message.branch_path.ancestor_of("1.2.3"))
+
+    assert "messages.branch_path <@ %(branch_path_1)s" in compile_pg(subtree)
+    assert "messages.branch_path @> %(branch_path_1)s" in compile_pg(ancestors)
+
+def test_depth_limit_uses_nlevel():
+    query = select(Message.id).where(func.nlevel(Message.branch_path) <= 3)
+
+    assert "nlevel(messages.branch_path) <= %(nlevel_1)s" in compile_pg(query)
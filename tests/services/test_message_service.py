@@ -0,0 +1,248 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.models.mongodb.message import MongoMessage, message_model
+from app.services.mongodb.message_service import MessageService, MessageTreeTooLarge, message_service
+from app.services.mongodb.id_migration import migrated
+from app.services.mongodb.uuid_backfill import conversion
+
+CHAT_ID, SENDER_ID = uuid.uuid4(), uuid.uuid4()
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, *args):
+        return self
+
+    def skip(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def __aiter__(self):
+        async def iterate():
+            for document in self.documents:
+                yield dict(document)
+        return iterate()
+
+def stored(parent_id=None, minutes=0) -> dict:
+    created_at = datetime(2026, 10, 18) + timedelta(minutes=minutes)
+    return {
+        "id": str(uuid.uuid4()),
+        "chat_id": str(CHAT_ID),
+        "sender_id": str(SENDER_ID),
+        "content": "hi",
+        "message_type": "text",
+        "parent_message_id": parent_id,
+        "created_at": created_at,
+        "updated_at": created_at,
+        "deleted_at": None,
+    }
+
+def test_threads_are_hydrated_with_one_in_query():
+    """A page is two round trips however many roots it has"""
+    first, second = stored(minutes=10), stored(minutes=5)
+    replies = [stored(first["id"], 11), stored(second["id"], 12), stored(first["id"], 13)]
+    collection = MagicMock()
+    collection.find.side_effect = [FakeCursor([first, second]), FakeCursor(replies)]
+
+    with patch.object(MessageService, "collection", collection):
+        page = asyncio.run(message_service.get_chat_messages(CHAT_ID, limit=2))
+
+    assert collection.find.call_count == 2
+    thread_filter = collection.find.call_args_list[1].args[0]
+    root_ids = [uuid.UUID(first["id"]), uuid.UUID(second["id"])]
+    assert thread_filter["parent_message_id"] == {"$in": root_ids + [first["id"], second["id"]]}
+    assert [str(message.id) for message in page] == [first["id"], second["id"]]
+    assert [str(reply.id) for reply in page[0].thread_messages] == [replies[0]["id"], replies[2]["id"]]
+    assert [str(reply.id) for reply in page[1].thread_messages] == [replies[1]["id"]]
+
+def test_empty_page_skips_the_thread_query():
+    collection = MagicMock()
+    collection.find.return_value = FakeCursor([])
+
+    with patch.object(MessageService, "collection", collection):
+        assert asyncio.run(message_service.get_chat_messages(CHAT_ID)) == []
+    assert collection.find.call_count == 1
+
+def test_projected_page_fetches_only_the_requested_fields():
+    """Without thread_messages among the fields the replies aren't queried"""
+    roots = [stored(minutes=10), stored(minutes=5)]
+    collection = MagicMock()
+    collection.find.return_value = FakeCursor(roots)
+
+    with patch.object(MessageService, "collection", collection):
+        page = asyncio.run(message_service.get_chat_messages(CHAT_ID, limit=2, fields={"content", "sender_id"}))
+
+    assert collection.find.call_count == 1
+    assert collection.find.call_args.args[1] == {"id": 1, "created_at": 1, "content": 1, "sender_id": 1}
+    assert set(type(page[0]).model_fields) == {"id", "created_at", "content", "sender_id"}
+    assert page[1].sender_id == SENDER_ID
+
+def test_projected_threads_keep_their_fields():
+    root = stored()
+    collection = MagicMock()
+    collection.find.side_effect = [FakeCursor([root]), FakeCursor([stored(root["id"], 1)])]
+
+    with patch.object(MessageService, "collection", collection):
+        page = asyncio.run(message_service.get_chat_messages(CHAT_ID, fields={"content", "thread_messages"}))
+
+    assert "thread_messages" not in collection.find.call_args.args[1]
+    assert collection.find.call_args.args[1]["parent_message_id"] == 1
+    assert page[0].thread_messages[0].content == "hi"
+    with pytest.raises(ValueError, match="Unknown message fields: sender"):
+        message_model(frozenset({"id", "sender"}))
+
+def test_native_uuids_are_written_and_read_back():
+    """New documents carry UUID objects (binary subtype 4), not strings"""
+    collection = MagicMock()
+    collection.insert_one = AsyncMock()
+    message = MongoMessage(chat_id=CHAT_ID, sender_id=SENDER_ID, content="hi", message_type="text")
+
+    with patch.object(MessageService, "collection", collection):
+        asyncio.run(message_service.create_message(message))
+
+    document = collection.insert_one.await_args.args[0]
+    assert all(isinstance(document[field], uuid.UUID) for field in ("_id", "chat_id", "sender_id"))
+    assert "id" not in document
+    assert message_service._parse_uuids(dict(document))["id"] == message.id
+
+def test_dual_read_can_be_turned_off():
+    message_id = uuid.uuid4()
+    with patch.object(settings, "MONGODB_UUID_DUAL_READ", False):
+        assert message_service._match_uuid(message_id) == message_id
+    assert message_service._match_uuid(message_id) == {"$in": [message_id, str(message_id)]}
+
+def test_backfill_converts_only_string_fields():
+    document = stored(parent_id=None)
+    document["_id"] = "oid"
+    document["sender_id"] = SENDER_ID
+
+    update = conversion(document)
+
+    assert update._filter == {"_id": "oid", "id": document["id"], "chat_id": str(CHAT_ID)}
+    assert update._doc == {"$set": {"id": uuid.UUID(document["id"]), "chat_id": CHAT_ID}}
+    assert conversion({"_id": "oid", "id": CHAT_ID}) is None
+
+def test_ids_match_the_legacy_field_until_migrated():
+    message_id = uuid.uuid4()
+    with patch.object(settings, "MONGODB_LEGACY_MESSAGE_IDS", False):
+        assert message_service._match_id(message_id) == {"_id": message_id}
+    legacy = message_service._match_id(message_id)
+    assert legacy == {"$or": [{"_id": message_id}, {"id": {"$in": [message_id, str(message_id)], "$exists": True}}]}
+
+def test_id_migration_rekeys_on_the_message_id():
+    document = stored(parent_id=str(uuid.uuid4()))
+    document["_id"] = "oid"
+
+    rekeyed = migrated(document)
+
+    assert rekeyed["_id"] == uuid.UUID(document["id"])
+    assert "id" not in rekeyed
+    assert rekeyed["chat_id"] == CHAT_ID
+    assert rekeyed["parent_message_id"] == uuid.UUID(document["parent_message_id"])
+    assert message_service._parse_uuids(rekeyed)["id"] == uuid.UUID(document["id"])
+
+def bulk_error(*write_errors) -> BulkWriteError:
+    return BulkWriteError({"writeErrors": [
+        {"index": index, "code": code, "errmsg": f"error {code}"} for index, code in write_errors
+    ]})
+
+def test_unordered_batch_reports_each_failed_insert():
+    messages = [MongoMessage(chat_id=CHAT_ID, sender_id=SENDER_ID, content=str(n), message_type="text") for n in range(4)]
+    collection = MagicMock()
+    collection.insert_many = AsyncMock(side_effect=bulk_error((1, 11000), (2, 121)))
+
+    with patch.object(MessageService, "collection", collection):
+        errors = asyncio.run(message_service.create_messages(messages))
+
+    documents = collection.insert_many.await_args.args[0]
+    assert [document["_id"] for document in documents] == [message.id for message in messages]
+    assert collection.insert_many.await_args.kwargs == {"ordered": False}
+    assert errors == [None, "Message already exists", "error 121", None]
+
+def test_ordered_batch_stops_at_the_first_failure():
+    messages = [MongoMessage(chat_id=CHAT_ID, sender_id=SENDER_ID, content=str(n), message_type="text") for n in range(3)]
+    collection = MagicMock()
+    collection.insert_many = AsyncMock(side_effect=bulk_error((0, 11000)))
+
+    with patch.object(MessageService, "collection", collection):
+        errors = asyncio.run(message_service.create_messages(messages, ordered=True))
+
+    assert errors[0] == "Message already exists"
+    assert errors[1:] == ["Not attempted after an earlier failure"] * 2
+
+def test_batch_parents_are_checked_with_one_query():
+    migrated, legacy = uuid.uuid4(), stored()
+    collection = MagicMock()
+    collection.find.return_value = FakeCursor([{"_id": migrated}, {"_id": "oid", "id": legacy["id"]}])
+
+    with patch.object(MessageService, "collection", collection):
+        found = asyncio.run(message_service.existing_message_ids(CHAT_ID, [migrated, uuid.UUID(legacy["id"])]))
+
+    assert found == {migrated, uuid.UUID(legacy["id"])}
+    assert collection.find.call_count == 1
+
+def migrated_document(parent_id=None, minutes=0) -> dict:
+    document = message_service._serialize_message(MongoMessage(
+        chat_id=CHAT_ID, sender_id=SENDER_ID, content="hi", message_type="text", parent_message_id=parent_id,
+        created_at=datetime(2026, 10, 18) + timedelta(minutes=minutes)
+    ))
+    del document["thread_messages"]
+    return document
+
+def aggregating(root: dict, descendants: list) -> MagicMock:
+    collection = MagicMock()
+    collection.name = "messages"
+    result = {**root, "descendant_count": len(descendants), "descendants": descendants}
+    collection.aggregate.return_value.to_list = AsyncMock(return_value=[result])
+    return collection
+
+def test_tree_is_nested_from_one_graph_lookup():
+    root = migrated_document()
+    child = migrated_document(root["_id"], 1)
+    later_child = migrated_document(root["_id"], 5)
+    grandchild = migrated_document(child["_id"], 2)
+    ids = [document["_id"] for document in (root, child, later_child, grandchild)]
+    collection = aggregating(root, [later_child, grandchild, child])
+
+    with patch.object(MessageService, "collection", collection):
+        tree = asyncio.run(message_service.get_message_tree(
+            CHAT_ID, ids[0], max_depth=3, max_nodes=10, fields={"content", "sender_id"}
+        ))
+
+    assert collection.aggregate.call_count == 1
+    graph_lookup = collection.aggregate.call_args.args[0][2]["$graphLookup"]
+    assert graph_lookup["maxDepth"] == 2
+    assert graph_lookup["connectToField"] == "parent_message_id"
+    assert [reply.id for reply in tree.thread_messages] == [ids[1], ids[2]]
+    assert [reply.id for reply in tree.thread_messages[0].thread_messages] == [ids[3]]
+    assert tree.thread_messages[1].thread_messages == []
+
+def test_tree_depth_is_capped_by_its_node_limit():
+    """A chain deeper than max_nodes can't fit, so the lookup doesn't follow it further"""
+    root = migrated_document()
+    collection = aggregating(root, [])
+
+    with patch.object(MessageService, "collection", collection):
+        asyncio.run(message_service.get_message_tree(CHAT_ID, root["_id"], max_depth=50, max_nodes=10))
+
+    assert collection.aggregate.call_count == 1
+    assert collection.aggregate.call_args.args[0][2]["$graphLookup"]["maxDepth"] == 9
+
+def test_oversized_tree_is_refused():
+    root = migrated_document()
+    collection = aggregating(root, [])
+    collection.aggregate.return_value.to_list.return_value[0]["descendant_count"] = 11
+
+    with patch.object(MessageService, "collection", collection):
+        with pytest.raises(MessageTreeTooLarge, match="11 replies"):
+            asyncio.run(message_service.get_message_tree(CHAT_ID, root["_id"], max_depth=3, max_nodes=10))
@@ -0,0 +1,89 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import UUID
+
+import pytest
+
+from app.core.config import settings
+from app.services.mongodb.indexes import (
+    LEGACY_ID_INDEX,
+    MESSAGE_INDEXES,
+    IndexNotUsedError,
+    ensure_indexes,
+    index_scans,
+    message_indexes,
+)
+from app.services.mongodb.message_service import MessageService, message_service
+
+def ixscan(name: str) -> dict:
+    return {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": name}}
+
+def collection_planning(*winning_plans) -> MagicMock:
+    collection = MagicMock()
+    collection.name = "messages"
+    collection.create_indexes = AsyncMock()
+    cursor = collection.find.return_value
+    cursor.sort.return_value = cursor
+    cursor.explain = AsyncMock(side_effect=[{"queryPlanner": {"winningPlan": plan}} for plan in winning_plans])
+    return collection
+
+def test_index_scans_walks_classic_and_slot_based_plans():
+    classic = {"stage": "LIMIT", "inputStage": {"stage": "OR", "inputStages": [ixscan("a"), ixscan("b")]}}
+    slot_based = {"queryPlan": ixscan("c"), "slotBasedPlan": {}}
+    assert list(index_scans(classic)) == ["a", "b"]
+    assert list(index_scans(slot_based)) == ["c"]
+    assert list(index_scans({"stage": "COLLSCAN"})) == []
+
+def test_ensure_indexes_creates_then_verifies_every_index():
+    collection = collection_planning(*(ixscan(index.name) for index in MESSAGE_INDEXES))
+
+    asyncio.run(ensure_indexes(collection, MESSAGE_INDEXES))
+
+    models = collection.create_indexes.await_args.args[0]
+    assert [model.document["name"] for model in models] == [index.name for index in MESSAGE_INDEXES]
+    assert models[0].document["partialFilterExpression"] == {"deleted_at": None}
+    assert collection.find.call_count == len(MESSAGE_INDEXES)
+
+def test_collection_scan_fails_verification():
+    collection = collection_planning({"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}})
+
+    with pytest.raises(IndexNotUsedError, match="messages_chat_parent_created_id_live"):
+        asyncio.run(ensure_indexes(collection, MESSAGE_INDEXES))
+
+def test_id_lookups_are_verified_against_the_legacy_index():
+    legacy_or = {"stage": "FETCH", "inputStage": {"stage": "OR", "inputStages": [
+        {"stage": "IXSCAN", "indexName": "_id_"}, {"stage": "IXSCAN", "indexName": LEGACY_ID_INDEX.name}
+    ]}}
+    indexes = message_indexes(legacy_ids=True)
+    collection = collection_planning(*(ixscan(index.name) for index in indexes), legacy_or)
+    collection.drop_index = AsyncMock()
+
+    with patch.object(MessageService, "collection", collection):
+        asyncio.run(message_service.ensure_indexes())
+
+    collection.drop_index.assert_awaited_once_with("messages_id_unique")
+    models = collection.create_indexes.await_args.args[0]
+    assert models[-1].document["partialFilterExpression"] == {"id": {"$exists": True}}
+    assert collection.find.call_args.args[0] == message_service._match_id(UUID(int=0))
+
+def test_id_lookup_collection_scan_fails_startup():
+    collection = collection_planning(
+        *(ixscan(index.name) for index in message_indexes(legacy_ids=True)),
+        {"stage": "SUBPLAN", "inputStage": {"stage": "COLLSCAN"}}
+    )
+    collection.drop_index = AsyncMock()
+
+    with patch.object(MessageService, "collection", collection):
+        with pytest.raises(IndexNotUsedError, match="messages_legacy_id"):
+            asyncio.run(message_service.ensure_indexes())
+
+def test_without_legacy_ids_the_index_is_dropped_and_id_lookups_use_idhack():
+    collection = collection_planning(*(ixscan(index.name) for index in MESSAGE_INDEXES), {"stage": "IDHACK"})
+    collection.drop_index = AsyncMock()
+
+    with patch.object(settings, "MONGODB_LEGACY_MESSAGE_IDS", False), \
+            patch.object(MessageService, "collection", collection):
+        asyncio.run(message_service.ensure_indexes())
+
+    dropped = [call.args[0] for call in collection.drop_index.await_args_list]
+    assert dropped == ["messages_id_unique", LEGACY_ID_INDEX.name]
@@ -0,0 +1,79 @@
+import asyncio
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.config import settings
+from app.models.mongodb.message import MongoMessage
+from app.services.mongodb.message_service import MessageService, message_service
+from app.services.mongodb.write_buffer import MessageWriteBuffer, MessageWriteError
+
+CHAT_ID, SENDER_ID = uuid.uuid4(), uuid.uuid4()
+
+def message(content: str = "hi") -> MongoMessage:
+    return MongoMessage(chat_id=CHAT_ID, sender_id=SENDER_ID, content=content, message_type="text")
+
+class RecordingWriter:
+    def __init__(self, errors=None):
+        self.batches = []
+        self.errors = errors or {}
+
+    async def __call__(self, messages):
+        self.batches.append([m.content for m in messages])
+        return [self.errors.get(m.content) for m in messages]
+
+def test_concurrent_senders_share_one_write():
+    writer = RecordingWriter()
+    buffer = MessageWriteBuffer(writer, max_batch=100, max_delay=0.005)
+
+    async def burst():
+        return await asyncio.gather(*(buffer.add(message(str(n))) for n in range(10)))
+
+    written = asyncio.run(burst())
+
+    assert writer.batches == [[str(n) for n in range(10)]]
+    assert [m.content for m in written] == [str(n) for n in range(10)]
+    stats = buffer.stats.snapshot()
+    assert stats["flushes"] == 1 and stats["batch_size_max"] == 10
+
+def test_full_batch_flushes_without_waiting_for_the_delay():
+    writer = RecordingWriter()
+    buffer = MessageWriteBuffer(writer, max_batch=3, max_delay=60)
+
+    async def burst():
+        await asyncio.wait_for(asyncio.gather(*(buffer.add(message(str(n))) for n in range(6))), timeout=1)
+
+    asyncio.run(burst())
+
+    assert writer.batches == [["0", "1", "2"], ["3", "4", "5"]]
+
+def test_only_the_rejected_sender_gets_an_error():
+    buffer = MessageWriteBuffer(RecordingWriter({"bad": "Message already exists"}), max_batch=100, max_delay=0.001)
+
+    async def burst():
+        return await asyncio.gather(buffer.add(message("ok")), buffer.add(message("bad")), return_exceptions=True)
+
+    ok, bad = asyncio.run(burst())
+
+    assert ok.content == "ok"
+    assert isinstance(bad, MessageWriteError) and str(bad) == "Message already exists"
+    assert buffer.stats.snapshot()["failed"] == 1
+
+def test_buffering_is_opt_in():
+    collection = MagicMock()
+    collection.insert_one = AsyncMock()
+    add = AsyncMock(side_effect=lambda m: m)
+
+    async def create():
+        await message_service.create_message(message(), buffered=True)
+        with patch.object(settings, "MESSAGE_WRITE_BUFFER", True):
+            await message_service.create_message(message())
+            await message_service.create_message(message(), buffered=True)
+
+    with patch.object(MessageService, "collection", collection), \
+            patch.object(message_service.write_buffer, "add", add):
+        asyncio.run(create())
+
+    assert collection.insert_one.await_count == 2
+    assert add.await_count == 1